@@ -1,11 +1,43 @@
 from django.contrib import admin
+from django.contrib import messages
 from django.contrib.auth.admin import UserAdmin
+from django.db import IntegrityError
 from django.utils.html import format_html
+from . import alteracoes, banco, exportacao, replica, versao
 from .models import Usuario, Departamento, Funcao, Unidade, Funcionario
 
 
+class EscritaSerializadaMixin:
+    """
+    Formulários, exclusões e ações do admin pelo caminho de escrita
+    serializado (ramais.banco), repetidos se o banco estiver ocupado, e com
+    o cookie de aderência à réplica de leitura (ramais.replica)
+    """
+
+    def _escrever(self, view, request, *args, **kwargs):
+        response = banco.executar_escrita(view, request, *args, **kwargs)
+        if replica.configurada() and response.status_code < 400:
+            replica.marcar_escrita(response)
+        return response
+
+    def changeform_view(self, request, *args, **kwargs):
+        if request.method == 'POST':
+            return self._escrever(super().changeform_view, request, *args, **kwargs)
+        return super().changeform_view(request, *args, **kwargs)
+
+    def delete_view(self, request, *args, **kwargs):
+        if request.method == 'POST':
+            return self._escrever(super().delete_view, request, *args, **kwargs)
+        return super().delete_view(request, *args, **kwargs)
+
+    def changelist_view(self, request, *args, **kwargs):
+        if request.method == 'POST':
+            return self._escrever(super().changelist_view, request, *args, **kwargs)
+        return super().changelist_view(request, *args, **kwargs)
+
+
 @admin.register(Usuario)
-class UsuarioAdmin(UserAdmin):
+class UsuarioAdmin(EscritaSerializadaMixin, UserAdmin):
     """
     Admin para modelo Usuario customizado
     """
@@ -34,7 +66,7 @@ class UsuarioAdmin(UserAdmin):
 
 
 @admin.register(Departamento)
-class DepartamentoAdmin(admin.ModelAdmin):
+class DepartamentoAdmin(EscritaSerializadaMixin, admin.ModelAdmin):
     """
     Admin para modelo Departamento
     """
@@ -60,7 +92,7 @@ class DepartamentoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Funcao)
-class FuncaoAdmin(admin.ModelAdmin):
+class FuncaoAdmin(EscritaSerializadaMixin, admin.ModelAdmin):
     """
     Admin para modelo Funcao
     """
@@ -86,7 +118,7 @@ class FuncaoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Unidade)
-class UnidadeAdmin(admin.ModelAdmin):
+class UnidadeAdmin(EscritaSerializadaMixin, admin.ModelAdmin):
     """
     Admin para modelo Unidade
     """
@@ -112,7 +144,7 @@ class UnidadeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Funcionario)
-class FuncionarioAdmin(admin.ModelAdmin):
+class FuncionarioAdmin(EscritaSerializadaMixin, admin.ModelAdmin):
     """
     Admin para modelo Funcionario
     """
@@ -135,6 +167,10 @@ class FuncionarioAdmin(admin.ModelAdmin):
         ('Organização', {
             'fields': ('departamento', 'funcao', 'unidade')
         }),
+        ('Sincronização RH/AD', {
+            'fields': ('id_externo',),
+            'classes': ('collapse',)
+        }),
     )
     
     # Filtros horizontais para seleção múltipla (se necessário)
@@ -188,20 +224,55 @@ class FuncionarioAdmin(admin.ModelAdmin):
         )
     
     # Ações customizadas
-    actions = ['marcar_como_ativo', 'marcar_como_inativo']
+    actions = ['marcar_como_ativo', 'marcar_como_inativo', 'exportar_csv', 'exportar_xlsx']
     
     def marcar_como_ativo(self, request, queryset):
         """Ação para marcar funcionários selecionados como ativos"""
-        updated = queryset.update(ativo=True)
+        ids = list(queryset.values_list('pk', flat=True))
+
+        def reativar():
+            updated = queryset.update(ativo=True)
+            versao.incrementar_versao()
+            alteracoes.registrar(Funcionario, ids, alteracoes.ATUALIZADO)
+            return updated
+
+        try:
+            updated = banco.executar_escrita(reativar)
+        except IntegrityError:
+            self.message_user(
+                request,
+                'Nenhum funcionário foi reativado: algum deles tem ramal ou email '
+                'já usado por outro funcionário ativo.',
+                messages.ERROR,
+            )
+            return
         self.message_user(request, f'{updated} funcionário(s) marcado(s) como ativo(s).')
     marcar_como_ativo.short_description = 'Marcar selecionados como ATIVO'
     
     def marcar_como_inativo(self, request, queryset):
         """Ação para marcar funcionários selecionados como inativos"""
-        updated = queryset.update(ativo=False)
+        ids = list(queryset.values_list('pk', flat=True))
+
+        def desativar():
+            updated = queryset.update(ativo=False)
+            versao.incrementar_versao()
+            alteracoes.registrar(Funcionario, ids, alteracoes.DESATIVADO)
+            return updated
+
+        updated = banco.executar_escrita(desativar)
         self.message_user(request, f'{updated} funcionário(s) marcado(s) como inativo(s).')
     marcar_como_inativo.short_description = 'Marcar selecionados como INATIVO'
 
+    def exportar_csv(self, request, queryset):
+        """Exporta os funcionários selecionados em CSV (streaming)"""
+        return exportacao.resposta(queryset.order_by('nome', 'pk'), 'csv')
+    exportar_csv.short_description = 'Exportar selecionados (CSV)'
+
+    def exportar_xlsx(self, request, queryset):
+        """Exporta os funcionários selecionados em XLSX (streaming)"""
+        return exportacao.resposta(queryset.order_by('nome', 'pk'), 'xlsx')
+    exportar_xlsx.short_description = 'Exportar selecionados (XLSX)'
+
 
 # Customizar o header do admin
 admin.site.site_header = 'Administração do Sistema de Ramais'
@@ -0,0 +1,174 @@
+"""
+Agendas telefônicas geradas a partir do diretório.
+
+Formatos para os telefones IP e softphones da rede: Yealink (Remote Phone
+Book XML), Grandstream (phonebook.xml), MicroSIP (Contacts.xml) e vCard 3.0.
+Os contatos são os funcionários ativos com ramal, agrupados por departamento
+ou unidade. Cada arquivo é gerado uma única vez por versão do diretório e
+mantido no cache ``agenda``.
+"""
+import xml.etree.ElementTree as ET
+from itertools import groupby
+
+from .models import Funcionario
+
+FORMATOS = ('yealink', 'grandstream', 'microsip', 'vcard')
+AGRUPAMENTOS = ('departamento', 'unidade')
+
+CONTENT_TYPES = {
+    'yealink': 'application/xml; charset=utf-8',
+    'grandstream': 'application/xml; charset=utf-8',
+    'microsip': 'application/xml; charset=utf-8',
+    'vcard': 'text/vcard; charset=utf-8',
+}
+NOMES_ARQUIVO = {
+    'yealink': 'ramais-yealink.xml',
+    'grandstream': 'phonebook.xml',
+    'microsip': 'Contacts.xml',
+    'vcard': 'ramais.vcf',
+}
+
+SEM_GRUPO = {'departamento': 'Sem departamento', 'unidade': 'Sem unidade'}
+
+
+def somente_digitos(numero):
+    """Mesma limpeza do microSipHelper do frontend (sip:<dígitos>)"""
+    return ''.join(filter(str.isdigit, numero or ''))
+
+
+def contatos(agrupar='departamento'):
+    """
+    Lista de (grupo, [contatos]) ordenada pelo nome do grupo e do contato.
+
+    Cada contato é um dicionário com id, nome, ramal (só dígitos), email,
+    whatsapp, departamento, funcao e unidade.
+    """
+    linhas = Funcionario.objects.filter(ativo=True).exclude(ramal__isnull=True).exclude(
+        ramal=''
+    ).values_list(
+        'pk', 'nome', 'ramal', 'email', 'whatsapp',
+        'departamento__nome', 'funcao__nome', 'unidade__nome',
+    )
+    registros = []
+    for pk, nome, ramal, email, whatsapp, departamento, funcao, unidade in linhas.iterator():
+        ramal = somente_digitos(ramal)
+        if not ramal:
+            continue
+        registro = {
+            'id': pk, 'nome': nome, 'ramal': ramal, 'email': email or '',
+            'whatsapp': somente_digitos(whatsapp), 'departamento': departamento or '',
+            'funcao': funcao or '', 'unidade': unidade or '',
+        }
+        registro['grupo'] = registro[agrupar] or SEM_GRUPO[agrupar]
+        registros.append(registro)
+
+    registros.sort(key=lambda registro: (registro['grupo'].casefold(), registro['nome'].casefold()))
+    return [
+        (grupo, list(itens))
+        for grupo, itens in groupby(registros, key=lambda registro: registro['grupo'])
+    ]
+
+
+def _xml(raiz):
+    ET.indent(raiz)
+    return ET.tostring(raiz, encoding='utf-8', xml_declaration=True)
+
+
+def gerar_yealink(grupos):
+    raiz = ET.Element('YealinkIPPhoneBook')
+    ET.SubElement(raiz, 'Title').text = 'Ramais Chiaperini'
+    for grupo, itens in grupos:
+        menu = ET.SubElement(raiz, 'Menu', Name=grupo)
+        for contato in itens:
+            ET.SubElement(
+                menu, 'Unit', Name=contato['nome'], Phone1=contato['ramal'],
+                Phone2=contato['whatsapp'], Phone3='', default_photo='Resource:'
+            )
+    return _xml(raiz)
+
+
+def gerar_grandstream(grupos):
+    raiz = ET.Element('AddressBook')
+    ET.SubElement(raiz, 'version').text = '1'
+    for numero, (grupo, _) in enumerate(grupos, start=1):
+        pbgroup = ET.SubElement(raiz, 'pbgroup')
+        ET.SubElement(pbgroup, 'id').text = str(numero)
+        ET.SubElement(pbgroup, 'name').text = grupo
+    for numero, (_, itens) in enumerate(grupos, start=1):
+        for contato in itens:
+            elemento = ET.SubElement(raiz, 'Contact')
+            ET.SubElement(elemento, 'id').text = str(contato['id'])
+            ET.SubElement(elemento, 'FirstName').text = contato['nome']
+            ET.SubElement(elemento, 'LastName').text = ''
+            ET.SubElement(elemento, 'Department').text = contato['departamento']
+            ET.SubElement(elemento, 'Job').text = contato['funcao']
+            telefone = ET.SubElement(elemento, 'Phone', type='Work')
+            ET.SubElement(telefone, 'phonenumber').text = contato['ramal']
+            ET.SubElement(telefone, 'accountindex').text = '1'
+            if contato['whatsapp']:
+                celular = ET.SubElement(elemento, 'Phone', type='Cell')
+                ET.SubElement(celular, 'phonenumber').text = contato['whatsapp']
+                ET.SubElement(celular, 'accountindex').text = '1'
+            ET.SubElement(elemento, 'Group').text = str(numero)
+            ET.SubElement(elemento, 'Primary').text = '0'
+            ET.SubElement(elemento, 'Frequent').text = '0'
+    return _xml(raiz)
+
+
+def gerar_microsip(grupos):
+    raiz = ET.Element('contacts')
+    for grupo, itens in grupos:
+        for contato in itens:
+            ET.SubElement(
+                raiz, 'contact', name=contato['nome'], number=contato['ramal'],
+                firstname='', lastname='', phone='', mobile=contato['whatsapp'],
+                email=contato['email'], address='', city='', state='', zip='',
+                comment=grupo, presence='1', starred='0', info=contato['funcao'],
+            )
+    return _xml(raiz)
+
+
+def _escapar_vcard(valor):
+    return (
+        valor.replace('\\', '\\\\').replace(',', '\\,')
+        .replace(';', '\\;').replace('\n', '\\n')
+    )
+
+
+def gerar_vcard(grupos):
+    cartoes = []
+    for grupo, itens in grupos:
+        for contato in itens:
+            nome = _escapar_vcard(contato['nome'])
+            linhas = [
+                'BEGIN:VCARD',
+                'VERSION:3.0',
+                f'FN:{nome}',
+                f'N:;{nome};;;',
+                f'ORG:{_escapar_vcard(contato["unidade"] or "Chiaperini")};'
+                f'{_escapar_vcard(contato["departamento"])}',
+                f'CATEGORIES:{_escapar_vcard(grupo)}',
+                f'TEL;TYPE=WORK,VOICE:{contato["ramal"]}',
+            ]
+            if contato['funcao']:
+                linhas.append(f'TITLE:{_escapar_vcard(contato["funcao"])}')
+            if contato['whatsapp']:
+                linhas.append(f'TEL;TYPE=CELL:{contato["whatsapp"]}')
+            if contato['email']:
+                linhas.append(f'EMAIL;TYPE=INTERNET:{contato["email"]}')
+            linhas.append('END:VCARD')
+            cartoes.append('\r\n'.join(linhas))
+    return ('\r\n'.join(cartoes) + '\r\n').encode('utf-8')
+
+
+GERADORES = {
+    'yealink': gerar_yealink,
+    'grandstream': gerar_grandstream,
+    'microsip': gerar_microsip,
+    'vcard': gerar_vcard,
+}
+
+
+def gerar(formato, agrupar='departamento'):
+    """Conteúdo (bytes) da agenda no formato pedido"""
+    return GERADORES[formato](contatos(agrupar))
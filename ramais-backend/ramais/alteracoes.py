@@ -0,0 +1,94 @@
+"""
+Registro de alterações do diretório e feed incremental.
+
+Cada criação, atualização, desativação ou exclusão de Funcionario,
+Departamento, Funcao e Unidade gera uma entrada em AlteracaoDiretorio (pelos
+signals ou explicitamente nas operações em massa). O id da entrada é o cursor:
+o cliente guarda o último cursor recebido e pede apenas o que mudou depois.
+
+A compactação remove as entradas mais antigas que a retenção, mantendo sempre
+a última entrada de cada objeto; assim um cursor antigo continua recebendo o
+estado final de tudo que mudou desde então.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from . import eventos
+from .models import AlteracaoDiretorio
+
+CRIADO = AlteracaoDiretorio.CRIADO
+ATUALIZADO = AlteracaoDiretorio.ATUALIZADO
+DESATIVADO = AlteracaoDiretorio.DESATIVADO
+EXCLUIDO = AlteracaoDiretorio.EXCLUIDO
+
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 5000
+
+
+def nome_modelo(model):
+    """Nome usado no registro: funcionario, departamento, funcao ou unidade"""
+    return model._meta.model_name
+
+
+def registrar(model, ids, operacao):
+    """
+    Registra a mesma operação para vários objetos de um modelo e agenda a
+    publicação dos eventos para depois do commit
+    """
+    modelo = nome_modelo(model)
+    entradas = AlteracaoDiretorio.objects.bulk_create([
+        AlteracaoDiretorio(modelo=modelo, objeto_id=pk, operacao=operacao)
+        for pk in ids
+    ])
+    if entradas:
+        eventos.publicar_ao_confirmar(modelo, operacao, entradas)
+
+
+def operacao_ao_salvar(instance, created):
+    """Operação registrada por um save(): inativo conta como desativação"""
+    if created:
+        return CRIADO
+    return ATUALIZADO if instance.ativo else DESATIVADO
+
+
+def alteracoes_desde(cursor, limite=LIMITE_PADRAO, modelos=None):
+    """
+    Entradas posteriores ao cursor, em ordem, mantendo só a última de cada
+    objeto dentro da página.
+
+    Retorna (entradas, proximo_cursor, mais).
+    """
+    queryset = AlteracaoDiretorio.objects.filter(id__gt=cursor).order_by('id')
+    if modelos:
+        queryset = queryset.filter(modelo__in=modelos)
+    pagina = list(queryset[:limite + 1])
+    mais = len(pagina) > limite
+    pagina = pagina[:limite]
+
+    ultimas = {}
+    for entrada in pagina:
+        ultimas[(entrada.modelo, entrada.objeto_id)] = entrada
+    entradas = sorted(ultimas.values(), key=lambda entrada: entrada.id)
+    proximo_cursor = pagina[-1].id if pagina else cursor
+    return entradas, proximo_cursor, mais
+
+
+def compactar(retencao_dias=None):
+    """
+    Remove entradas mais antigas que a retenção, exceto a última de cada
+    objeto. Retorna a quantidade removida.
+    """
+    if retencao_dias is None:
+        retencao_dias = getattr(settings, 'RAMAIS_ALTERACOES_RETENCAO_DIAS', 30)
+    limite = timezone.now() - timedelta(days=retencao_dias)
+
+    ultimas = AlteracaoDiretorio.objects.values('modelo', 'objeto_id').annotate(
+        ultima=Max('id')
+    ).values('ultima')
+    removidas, _ = AlteracaoDiretorio.objects.filter(
+        alterado_em__lt=limite
+    ).exclude(id__in=ultimas).delete()
+    return removidas
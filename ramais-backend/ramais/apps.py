@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RamaisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ramais'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        # Registrar signals (índice de busca)
+        from . import banco, signals  # noqa: F401
+
+        # PRAGMAs do perfil de banco em cada conexão nova
+        connection_created.connect(banco.configurar_conexao, dispatch_uid='ramais_sqlite_pragmas')
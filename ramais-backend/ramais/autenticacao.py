@@ -0,0 +1,76 @@
+"""
+Resolução do usuário da sessão com cache.
+
+Toda requisição autenticada por sessão busca o Usuario pela chave primária
+(AuthenticationMiddleware -> backend.get_user). O BackendUsuarioEmCache
+guarda os campos do usuário no cache por RAMAIS_AUTH_CACHE_TTL segundos; os
+signals de Usuario removem a entrada quando o usuário é alterado ou
+excluído (ver ramais.signals). Usuários desativados (``ativo=False``)
+deixam de ser resolvidos, o que encerra as sessões abertas.
+
+O hash da senha nunca vai para o cache (que fica em disco com
+RAMAIS_CACHE_DIR): guarda-se no lugar dele o hash de sessão
+(``get_session_auth_hash``, um HMAC do hash com a SECRET_KEY), que é o que
+a verificação da sessão usa. No usuário montado a partir do cache a senha
+é um campo adiado, lido do banco só se alguém acessá-la.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+UserModel = get_user_model()
+
+PREFIXO_CHAVE = 'ramais:usuario:'
+
+CAMPOS_FORA_DO_CACHE = {'password'}
+
+
+def chave_usuario(pk):
+    return f'{PREFIXO_CHAVE}{pk}'
+
+
+def invalidar_usuario(pk):
+    cache.delete(chave_usuario(pk))
+
+
+def _para_cache(usuario):
+    """Entrada do cache de um usuário, sem o hash da senha"""
+    return {
+        'db': usuario._state.db,
+        'valores': {
+            campo.attname: getattr(usuario, campo.attname)
+            for campo in UserModel._meta.concrete_fields
+            if campo.attname not in CAMPOS_FORA_DO_CACHE
+        },
+        'hash_sessao': usuario.get_session_auth_hash(),
+    }
+
+
+def _do_cache(entrada):
+    """Usuário montado a partir da entrada do cache (senha adiada)"""
+    valores = entrada['valores']
+    campos = [
+        campo.attname for campo in UserModel._meta.concrete_fields
+        if campo.attname in valores
+    ]
+    usuario = UserModel.from_db(entrada['db'], campos, [valores[campo] for campo in campos])
+    hash_sessao = entrada['hash_sessao']
+    usuario.get_session_auth_hash = lambda: hash_sessao
+    return usuario
+
+
+class BackendUsuarioEmCache(ModelBackend):
+    """ModelBackend com o get_user servido pelo cache"""
+
+    def get_user(self, user_id):
+        chave = chave_usuario(user_id)
+        entrada = cache.get(chave)
+        if entrada is None:
+            usuario = super().get_user(user_id)
+            if usuario is None:
+                return None
+            cache.set(chave, _para_cache(usuario), settings.RAMAIS_AUTH_CACHE_TTL)
+        else:
+            usuario = _do_cache(entrada)
+        return usuario if usuario.ativo else None
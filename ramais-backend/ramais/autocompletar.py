@@ -0,0 +1,225 @@
+"""
+Autocompletar da caixa de busca: trie de prefixos em memória.
+
+Cada funcionário ativo é indexado pelos tokens do nome, do nome do
+departamento (sem acentos e em minúsculas) e pelos dígitos do ramal. Cada nó
+da trie guarda os ids que passam por ele com a melhor categoria do casamento
+(primeiro nome, outro nome, ramal, departamento) e, sob demanda, o top-k já
+ordenado; a consulta de um termo é só a descida na trie.
+
+A trie é montada uma vez por processo e depois atualizada de forma
+incremental a partir do registro de alterações (AlteracaoDiretorio): quando a
+versão do diretório muda, apenas os funcionários alterados desde o último
+cursor aplicado são reindexados. Isso cobre também as operações em massa e as
+alterações feitas em outros processos.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+
+from . import alteracoes, versao
+from .models import AlteracaoDiretorio, Funcionario
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+
+# Acima disso é mais barato remontar a trie do que aplicar as alterações
+MAX_ALTERACOES_INCREMENTAIS = 2000
+
+PRIMEIRO_NOME, NOME, RAMAL, DEPARTAMENTO = range(4)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def dobrar(texto):
+    """Remove acentos e normaliza caixa: "Adenílson" -> "adenilson\""""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def tokens(texto):
+    return _TOKEN_RE.findall(dobrar(texto))
+
+
+class _No:
+    __slots__ = ('filhos', 'ids', 'topo')
+
+    def __init__(self):
+        self.filhos = {}
+        # id -> melhor categoria entre os tokens do id que passam por aqui
+        self.ids = {}
+        # Top LIMITE_MAXIMO ids já ordenados; None quando precisa recalcular
+        self.topo = None
+
+
+class IndiceAutocompletar:
+    """Trie de prefixos dos funcionários ativos"""
+
+    def __init__(self):
+        self.raiz = _No()
+        self.versao = None
+        self.cursor = 0
+        self._contatos = {}
+        self._tokens = {}
+        self._ordem = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._contatos)
+
+    # Manutenção
+
+    def adicionar(self, pk, nome, ramal, departamento):
+        with self._lock:
+            self.remover(pk)
+            termos = {}
+            for posicao, token in enumerate(tokens(nome)):
+                categoria = PRIMEIRO_NOME if posicao == 0 else NOME
+                termos[token] = min(categoria, termos.get(token, categoria))
+            digitos = ''.join(filter(str.isdigit, ramal or ''))
+            if digitos:
+                termos.setdefault(digitos, RAMAL)
+            for token in tokens(departamento):
+                termos.setdefault(token, DEPARTAMENTO)
+
+            for token, categoria in termos.items():
+                no = self.raiz
+                for caractere in token:
+                    no = no.filhos.setdefault(caractere, _No())
+                    atual = no.ids.get(pk)
+                    if atual is None or categoria < atual:
+                        no.ids[pk] = categoria
+                        no.topo = None
+            self._contatos[pk] = {
+                'id': pk, 'nome': nome, 'ramal': ramal, 'departamento': departamento,
+            }
+            self._tokens[pk] = tuple(termos)
+            self._ordem[pk] = (dobrar(nome), pk)
+
+    def remover(self, pk):
+        with self._lock:
+            for token in self._tokens.pop(pk, ()):
+                caminho = [self.raiz]
+                for caractere in token:
+                    no = caminho[-1].filhos.get(caractere)
+                    if no is None:
+                        break
+                    no.ids.pop(pk, None)
+                    no.topo = None
+                    caminho.append(no)
+                # Poda os nós que ficaram vazios
+                for pai, caractere in zip(reversed(caminho[:-1]), reversed(token[:len(caminho) - 1])):
+                    filho = pai.filhos[caractere]
+                    if filho.ids or filho.filhos:
+                        break
+                    del pai.filhos[caractere]
+            self._contatos.pop(pk, None)
+            self._ordem.pop(pk, None)
+
+    def carregar(self, ids=None):
+        """Indexa os funcionários informados (ou todos), removendo os inativos"""
+        queryset = Funcionario.objects.filter(ativo=True)
+        if ids is not None:
+            ids = set(ids)
+            queryset = queryset.filter(pk__in=ids)
+        linhas = queryset.values_list('pk', 'nome', 'ramal', 'departamento__nome')
+        with self._lock:
+            for pk, nome, ramal, departamento in linhas.iterator():
+                self.adicionar(pk, nome, ramal, departamento)
+                if ids is not None:
+                    ids.discard(pk)
+            for pk in ids or ():
+                self.remover(pk)
+
+    # Consulta
+
+    def _chave(self, pk, categoria):
+        return (categoria, self._ordem[pk])
+
+    def _topo(self, no):
+        if no.topo is None:
+            no.topo = heapq.nsmallest(
+                LIMITE_MAXIMO, no.ids, key=lambda pk: self._chave(pk, no.ids[pk])
+            )
+        return no.topo
+
+    def _no(self, prefixo):
+        no = self.raiz
+        for caractere in prefixo:
+            no = no.filhos.get(caractere)
+            if no is None:
+                return None
+        return no
+
+    def buscar(self, texto, limite=LIMITE_PADRAO):
+        """
+        Até ``limite`` contatos cujos tokens começam por todos os termos do
+        texto, ordenados pela categoria do casamento e depois pelo nome
+        """
+        termos = tokens(texto)
+        if not termos:
+            return []
+        with self._lock:
+            nos = [self._no(termo) for termo in termos]
+            if any(no is None for no in nos):
+                return []
+            if len(nos) == 1:
+                ids = self._topo(nos[0])[:limite]
+            else:
+                # Interseção das chaves em C, começando pelo menor conjunto
+                nos.sort(key=lambda no: len(no.ids))
+                comuns = nos[0].ids.keys() & nos[1].ids.keys()
+                for no in nos[2:]:
+                    comuns &= no.ids.keys()
+                candidatos = ((pk, sum(no.ids[pk] for no in nos)) for pk in comuns)
+                ids = [
+                    pk for pk, _ in heapq.nsmallest(
+                        limite, candidatos, key=lambda item: self._chave(*item)
+                    )
+                ]
+            return [self._contatos[pk] for pk in ids]
+
+    # Sincronização com o banco
+
+    def sincronizar(self, versao_dados):
+        """
+        Deixa a trie na versão informada do diretório: na primeira vez monta
+        tudo; depois aplica só os funcionários alterados desde o último cursor
+        """
+        with self._lock:
+            if self.versao == versao_dados:
+                return
+            if self.versao is None or versao_dados[0] < self.versao[0]:
+                # Primeira carga, ou versão voltou (restauração de backup)
+                self._remontar()
+            else:
+                entradas, cursor, mais = alteracoes.alteracoes_desde(
+                    self.cursor, MAX_ALTERACOES_INCREMENTAIS, ['funcionario']
+                )
+                if mais:
+                    self._remontar()
+                else:
+                    self.carregar(entrada.objeto_id for entrada in entradas)
+                    self.cursor = cursor
+            self.versao = versao_dados
+
+    def _remontar(self):
+        # O cursor é lido antes dos dados: uma alteração concorrente é
+        # reaplicada na próxima sincronização em vez de perdida
+        ultimo = AlteracaoDiretorio.objects.order_by('-id').values_list('id', flat=True).first()
+        self.raiz = _No()
+        self._contatos.clear()
+        self._tokens.clear()
+        self._ordem.clear()
+        self.carregar()
+        self.cursor = ultimo or 0
+
+
+indice = IndiceAutocompletar()
+
+
+def obter_indice(versao_dados=None):
+    """Trie sincronizada com a versão atual do diretório"""
+    indice.sincronizar(versao_dados or versao.versao_atual())
+    return indice
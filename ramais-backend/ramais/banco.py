@@ -0,0 +1,82 @@
+"""
+Perfil de produção do SQLite e caminho de escrita serializado.
+
+Com ``RAMAIS_DB_PERFIL=producao`` (ver settings) as conexões ficam abertas
+entre requisições (CONN_MAX_AGE), esperam o lock do banco em vez de falhar
+na hora (timeout do driver) e recebem os PRAGMAs de RAMAIS_SQLITE_PRAGMAS
+ao serem abertas: WAL (leitores não bloqueiam o escritor nem são
+bloqueados por ele), synchronous=NORMAL e mmap.
+
+O SQLite aceita um escritor por vez. As escritas da aplicação passam por
+``executar_escrita``: dentro do processo uma de cada vez (lock), e quando
+outro processo segura o banco além do timeout ("database is locked") a
+transação inteira é repetida com espera exponencial.
+"""
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+_lock_escrita = threading.RLock()
+
+
+def configurar_conexao(sender, connection, **kwargs):
+    """Receptor do connection_created: aplica os PRAGMAs do perfil"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'RAMAIS_SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for nome, valor in pragmas.items():
+                cursor.execute(f'PRAGMA {nome} = {valor}')
+
+
+def pragmas_atuais(using=DEFAULT_DB_ALIAS):
+    """Valores atuais dos PRAGMAs de RAMAIS_SQLITE_PRAGMAS na conexão"""
+    with connections[using].cursor() as cursor:
+        valores = {}
+        for nome in getattr(settings, 'RAMAIS_SQLITE_PRAGMAS', {}):
+            cursor.execute(f'PRAGMA {nome}')
+            valores[nome] = cursor.fetchone()[0]
+        return valores
+
+
+def banco_ocupado(erro):
+    mensagem = str(erro).lower()
+    return 'database is locked' in mensagem or 'database is busy' in mensagem
+
+
+def executar_escrita(funcao, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Executa ``funcao`` numa transação pelo caminho de escrita serializado,
+    repetindo-a enquanto o banco estiver ocupado (até RAMAIS_ESCRITA_TENTATIVAS).
+
+    Dentro de uma transação já aberta não há repetição: só quem abriu a
+    transação externa pode refazê-la.
+    """
+    if connections[using].in_atomic_block:
+        with transaction.atomic(using=using):
+            return funcao(*args, **kwargs)
+
+    tentativas = settings.RAMAIS_ESCRITA_TENTATIVAS
+    espera = settings.RAMAIS_ESCRITA_ESPERA
+    for tentativa in range(1, tentativas + 1):
+        try:
+            with _lock_escrita, transaction.atomic(using=using):
+                return funcao(*args, **kwargs)
+        except OperationalError as erro:
+            if not banco_ocupado(erro) or tentativa == tentativas:
+                raise
+        # Espera exponencial com variação, para os processos não colidirem de novo
+        time.sleep(espera * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5))
+
+
+def escrita_serializada(funcao):
+    """Decorador: a função passa a ser executada por executar_escrita"""
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        return executar_escrita(funcao, *args, **kwargs)
+    return executar
@@ -0,0 +1,880 @@
+"""
+Benchmarks do app ramais.
+
+Executados pelo comando ``python manage.py benchmark_ramais`` sempre em um
+banco de testes descartável (nunca no db.sqlite3 real).
+"""
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from django.db import transaction
+
+from . import search
+from .models import Departamento, Funcao, Unidade, Funcionario, FuncionarioBusca
+
+NOMES = [
+    'Adenílson', 'Marília', 'João Paulo', 'Letícia', 'Grégory', 'Cecília',
+    'Fábio', 'Salomão', 'Téo', 'Laís', 'Leonardo', 'Lucas', 'Rodrigo',
+    'Roberta', 'Daniela', 'Tatiana', 'Caroline', 'Murillo', 'Thaline', 'Davi',
+]
+SOBRENOMES = [
+    'Gomes', 'Pereira', 'Marques', 'Escobar', 'Balbão', 'Turatto', 'Braga',
+    'Lebrão', 'Kawamura', 'Ribeiro', 'Coelho', 'Gaspar', 'Mencucini', 'Lima',
+]
+DEPARTAMENTOS = [
+    'Assistência Técnica', 'Calderaria', 'Comércio Exterior', 'Compras',
+    'Engenharia', 'Expedição', 'Financeiro', 'Logística', 'Marketing',
+    'Produção', 'RH', 'TI-Infra', 'TI-Sistemas', 'Vendas', 'Suppy chain',
+]
+FUNCOES = [
+    'Assistente Técnico', 'Comprador', 'Engenharia', 'Financeiro', 'Vendas',
+    'Supervisor de Vendas', 'T.I Infra', 'Qualidade', 'Logística', 'PCP',
+]
+UNIDADES = ['Chiaperini', 'Techto']
+
+
+def _codigo(numero, tamanho=4):
+    """Código alfabético de tamanho fixo (evita colisões de prefixo nos nomes)"""
+    letras = []
+    for _ in range(tamanho):
+        numero, resto = divmod(numero, 26)
+        letras.append(chr(ord('a') + resto))
+    return ''.join(reversed(letras))
+
+
+def _cadastros(model, nomes):
+    existentes = {obj.nome: obj for obj in model.objects.all()}
+    novos = [model(nome=nome) for nome in nomes if nome not in existentes]
+    model.objects.bulk_create(novos)
+    return list(model.objects.all())
+
+
+def gerar_diretorio(total, seed=42):
+    """Completa o diretório até ``total`` funcionários com dados sintéticos"""
+    rnd = random.Random(seed + Funcionario.objects.count())
+    departamentos = _cadastros(Departamento, DEPARTAMENTOS)
+    funcoes = _cadastros(Funcao, FUNCOES)
+    unidades = _cadastros(Unidade, UNIDADES)
+
+    inicio = Funcionario.objects.count()
+    novos = []
+    for i in range(inicio, total):
+        codigo = _codigo(i)
+        nome = f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {codigo.capitalize()}'
+        usuario = f'{nome.split()[0].lower()}.{codigo}'
+        novos.append(Funcionario(
+            nome=nome,
+            ramal=str(100000 + i),
+            email=f'{usuario}@chiaperini.com.br',
+            whatsapp=f'169{rnd.randint(10000000, 99999999)}' if i % 3 == 0 else None,
+            teams=usuario if i % 4 == 0 else None,
+            departamento=rnd.choice(departamentos),
+            funcao=rnd.choice(funcoes),
+            unidade=rnd.choice(unidades),
+        ))
+    with transaction.atomic():
+        criados = Funcionario.objects.bulk_create(novos, batch_size=2000)
+        search.reindexar([f.pk for f in criados])
+    return total
+
+
+def medir(funcao, repeticoes):
+    """Executa ``funcao`` várias vezes e devolve as latências em ms"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def resumo(tempos):
+    """p50/p99 de uma lista de latências em ms"""
+    ordenados = sorted(tempos)
+    p99 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))]
+    return statistics.median(ordenados), p99
+
+
+def bench_busca(tamanhos, repeticoes, escrever):
+    """Latência do parâmetro ``busca``: índice FTS5 x icontains"""
+    # Termos seletivos (pessoa, ramal, e-mail) como numa busca real
+    termos = ['Adenilson aabc', 'marilia aacd', '100042', 'lucas.aabq', 'Kawamura aacz']
+    base = Funcionario.objects.filter(ativo=True).select_related(
+        'departamento', 'funcao', 'unidade'
+    )
+    escrever(f'{"linhas":>8} {"fts p50":>10} {"fts p99":>10} {"icontains p50":>14}')
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+
+        def via_indice():
+            for termo in termos:
+                queryset, _ = search.aplicar_busca(base, termo)
+                list(queryset.order_by('relevancia', 'nome')[:20])
+
+        def via_icontains():
+            for termo in termos:
+                list(base.filter(search.filtro_icontains(termo)).order_by('nome')[:20])
+
+        fts_p50, fts_p99 = resumo(medir(via_indice, repeticoes))
+        ic_p50, _ = resumo(medir(via_icontains, max(1, repeticoes // 5)))
+        escrever(f'{tamanho:>8} {fts_p50:>9.2f}ms {fts_p99:>9.2f}ms {ic_p50:>13.2f}ms')
+
+
+def gerar_pessoas(total, seed=42, inicio=0):
+    """
+    Pessoas sintéticas no formato de entrada do ImportadorDiretorio; ``inicio``
+    desloca ramais e códigos para gerar pessoas novas
+    """
+    rnd = random.Random(seed)
+    for i in range(inicio, inicio + total):
+        codigo = _codigo(i)
+        yield {
+            'Nome': f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {codigo.capitalize()}',
+            'Ramal': str(100000 + i),
+            'Email': f'{codigo}@chiaperini.com.br',
+            'Whatsapp': None,
+            'Teams': None,
+            'Departamento': rnd.choice(DEPARTAMENTOS),
+            'Funcao': rnd.choice(FUNCOES),
+            'Unidade': rnd.choice(UNIDADES),
+        }
+
+
+def bench_importacao(tamanhos, repeticoes, escrever):
+    """Vazão (linhas/s) do ImportadorDiretorio: carga inicial e reimportação"""
+    from .importers import ImportadorDiretorio
+
+    escrever(f'{"linhas":>8} {"carga inicial":>16} {"reimportação":>16}')
+    for tamanho in tamanhos:
+        Funcionario.objects.all().delete()
+        with transaction.atomic():
+            inicial = ImportadorDiretorio().importar(gerar_pessoas(tamanho))
+        with transaction.atomic():
+            repetida = ImportadorDiretorio().importar(gerar_pessoas(tamanho))
+        escrever(
+            f'{tamanho:>8} {inicial.linhas_por_segundo:>10.0f} lin/s '
+            f'{repetida.linhas_por_segundo:>10.0f} lin/s'
+        )
+
+
+def bench_leitura(tamanhos, repeticoes, escrever):
+    """Leitura em streaming de dump MySQL: vazão e pico de memória"""
+    import os
+    import tempfile
+    import tracemalloc
+
+    from . import leitores
+
+    escrever(f'{"linhas":>8} {"MB":>8} {"linhas/s":>10} {"pico memória":>14}')
+    for tamanho in tamanhos:
+        descritor, caminho = tempfile.mkstemp(suffix='.sql')
+        try:
+            with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(
+                    'INSERT INTO `pessoas` (`Nome`, `Ramal`, `Email`, `Departamento`, `Unidade`) VALUES\n'
+                )
+                for i, pessoa in enumerate(gerar_pessoas(tamanho)):
+                    separador = ',\n' if i else ''
+                    arquivo.write(
+                        f"{separador}('{pessoa['Nome']}', '{pessoa['Ramal']}', '{pessoa['Email']}', "
+                        f"'{pessoa['Departamento']}', '{pessoa['Unidade']}')"
+                    )
+                arquivo.write(';\n')
+
+            inicio = time.perf_counter()
+            lidas = sum(1 for _ in leitores.normalizar(leitores.ler_dump_mysql(caminho)))
+            duracao = time.perf_counter() - inicio
+
+            # Pico de memória medido numa segunda passada (tracemalloc é lento)
+            tracemalloc.start()
+            for _ in leitores.normalizar(leitores.ler_dump_mysql(caminho)):
+                pass
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            megabytes = os.path.getsize(caminho) / 1e6
+            escrever(
+                f'{lidas:>8} {megabytes:>8.1f} {lidas / duracao:>10.0f} '
+                f'{pico / 1e6:>11.2f} MB'
+            )
+        finally:
+            os.remove(caminho)
+
+
+def bench_serializacao(tamanhos, repeticoes, escrever):
+    """Linhas/s da listagem: FuncionarioListSerializer x caminho rápido"""
+    from .serializers import FuncionarioListSerializer, serializar_listagem_rapida
+
+    base = Funcionario.objects.filter(ativo=True).select_related(
+        'departamento', 'funcao', 'unidade'
+    ).order_by('nome')
+    escrever(f'{"linhas":>8} {"serializer":>14} {"rápido":>14} {"ganho":>7}')
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        vezes = max(1, min(repeticoes, 200000 // tamanho))
+        # .all() a cada execução: um queryset avaliado guardaria o resultado
+        drf, _ = resumo(medir(
+            lambda: FuncionarioListSerializer(base.all(), many=True).data, vezes
+        ))
+        rapido, _ = resumo(medir(lambda: serializar_listagem_rapida(base.all()), vezes))
+        escrever(
+            f'{tamanho:>8} {tamanho / drf * 1000:>8.0f} lin/s '
+            f'{tamanho / rapido * 1000:>8.0f} lin/s {drf / rapido:>6.1f}x'
+        )
+
+
+def bench_numeros(tamanhos, repeticoes, escrever):
+    """
+    Identificação de chamadas: tempo de construção do índice em memória e
+    latência da consulta (só o dict e com a leitura da versão)
+    """
+    from . import numeros, versao
+
+    escrever(
+        f'{"linhas":>8} {"construção":>11} {"consulta p50":>13} {"p99":>9} '
+        f'{"c/ versão p50":>14} {"icontains p50":>14}'
+    )
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        inicio = time.perf_counter()
+        indice = numeros.construir_indice()
+        construcao = (time.perf_counter() - inicio) * 1000
+
+        rnd = random.Random(tamanho)
+        amostra = [
+            rnd.choice([f'+55 16 {100000 + i}', str(100000 + i), '(16) 99999-0000'])
+            for i in (rnd.randrange(tamanho) for _ in range(1000))
+        ]
+        # Cada medição faz 1000 consultas: o tempo em ms equivale a µs/consulta
+        p50, p99 = resumo(medir(
+            lambda: [numeros.consultar(indice, numero) for numero in amostra],
+            repeticoes
+        ))
+        completo, _ = resumo(medir(
+            lambda: numeros.consultar(numeros.obter_indice(versao.versao_atual()), amostra[0]),
+            repeticoes
+        ))
+        icontains, _ = resumo(medir(
+            lambda: list(Funcionario.objects.filter(
+                search.filtro_icontains(amostra[0][-6:])
+            )[:5]),
+            max(1, repeticoes // 5)
+        ))
+        escrever(
+            f'{tamanho:>8} {construcao:>9.0f}ms {p50:>10.2f}µs {p99:>7.2f}µs '
+            f'{completo * 1000:>11.0f}µs {icontains:>12.2f}ms'
+        )
+
+
+def bench_autocompletar(tamanhos, repeticoes, escrever):
+    """
+    Autocompletar: construção da trie, consulta por prefixo (1 a 3 letras e
+    dois termos) e atualização incremental após salvar um funcionário
+    """
+    from . import autocompletar, versao
+
+    escrever(
+        f'{"linhas":>8} {"construção":>11} {"consulta p50":>13} {"p99":>9} '
+        f'{"incremental":>12} {"FTS p50":>9}'
+    )
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        indice = autocompletar.IndiceAutocompletar()
+        inicio = time.perf_counter()
+        indice.sincronizar(versao.versao_atual())
+        construcao = (time.perf_counter() - inicio) * 1000
+
+        rnd = random.Random(tamanho)
+        prefixos = [
+            rnd.choice(NOMES)[:rnd.randint(1, 3)] for _ in range(800)
+        ] + [
+            f'{rnd.choice(NOMES)[:2]} {rnd.choice(SOBRENOMES)[:3]}' for _ in range(200)
+        ]
+        latencias = []
+        for _ in range(repeticoes):
+            for prefixo in prefixos:
+                inicio = time.perf_counter()
+                indice.buscar(prefixo)
+                latencias.append((time.perf_counter() - inicio) * 1_000_000)
+        p50, p99 = resumo(latencias)
+
+        funcionario = Funcionario.objects.order_by('?').first()
+
+        sincronizacoes = []
+        for _ in range(max(1, repeticoes)):
+            funcionario.nome = f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}'
+            funcionario.save()
+            inicio = time.perf_counter()
+            indice.sincronizar(versao.versao_atual())
+            indice.buscar(funcionario.nome[:3])
+            sincronizacoes.append((time.perf_counter() - inicio) * 1000)
+        incremental, _ = resumo(sincronizacoes)
+        fts, _ = resumo(medir(
+            lambda: list(search.aplicar_busca(Funcionario.objects.all(), 'leo')[0][:10]),
+            max(1, repeticoes // 5)
+        ))
+        escrever(
+            f'{tamanho:>8} {construcao:>9.0f}ms {p50:>10.1f}µs {p99:>7.0f}µs '
+            f'{incremental:>10.2f}ms {fts:>7.2f}ms'
+        )
+
+
+def _com_erro(texto, rnd):
+    """Introduz um erro de digitação (troca, omissão ou substituição de letra)"""
+    if len(texto) < 4:
+        return texto
+    i = rnd.randrange(1, len(texto) - 2)
+    tipo = rnd.randrange(3)
+    if tipo == 0:
+        return texto[:i] + texto[i + 1] + texto[i] + texto[i + 2:]
+    if tipo == 1:
+        return texto[:i] + texto[i + 1:]
+    return texto[:i] + rnd.choice('aeiourstlmn') + texto[i + 1:]
+
+
+def bench_aproximada(tamanhos, repeticoes, escrever):
+    """
+    Busca aproximada: construção do índice de trigramas e latência por
+    consulta com erros de digitação (nome, nome + sobrenome e departamento)
+    """
+    from . import busca_aproximada
+
+    escrever(
+        f'{"linhas":>8} {"construção":>11} {"termos":>8} {"consulta p50":>13} '
+        f'{"p99":>9} {"acertos":>8} {"FTS p50":>9}'
+    )
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        inicio = time.perf_counter()
+        indice = busca_aproximada.construir_indice()
+        construcao = (time.perf_counter() - inicio) * 1000
+
+        rnd = random.Random(tamanho)
+        consultas = []
+        for _ in range(200):
+            tipo = rnd.randrange(3)
+            if tipo == 0:
+                original = rnd.choice(NOMES)
+            elif tipo == 1:
+                original = f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}'
+            else:
+                original = rnd.choice(DEPARTAMENTOS)
+            consultas.append(' '.join(_com_erro(palavra, rnd) for palavra in original.split()))
+
+        latencias = []
+        acertos = 0
+        for _ in range(repeticoes):
+            acertos = 0
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                resultados = indice.buscar(consulta)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                acertos += bool(resultados)
+        p50, p99 = resumo(latencias)
+        fts, _ = resumo(medir(
+            lambda: list(search.aplicar_busca(
+                Funcionario.objects.all(), rnd.choice(consultas)
+            )[0][:20]),
+            max(1, repeticoes)
+        ))
+        escrever(
+            f'{tamanho:>8} {construcao:>9.0f}ms {len(indice.termos):>8} {p50:>11.2f}ms '
+            f'{p99:>7.2f}ms {acertos * 100 // len(consultas):>7}% {fts:>7.2f}ms'
+        )
+
+
+class ClienteSSE:
+    """
+    Conexão ao stream /api/directory/events/ feita direto na aplicação ASGI,
+    sem servidor nem rede: mede o custo do Django + broadcaster por conexão.
+    """
+
+    def __init__(self, app, cookie, path='/api/directory/events/'):
+        self.app = app
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000),
+            'server': ('localhost', 80),
+        }
+        self.status = None
+        self.pronto = asyncio.Event()
+        # (instante de chegada, dados) de cada evento "diretorio"
+        self.eventos = asyncio.Queue()
+        self._desconectar = asyncio.Event()
+        self._corpo_enviado = False
+        self.tarefa = None
+
+    def conectar(self):
+        self.tarefa = asyncio.create_task(self.app(self.scope, self._receive, self._send))
+        return self
+
+    async def fechar(self):
+        self._desconectar.set()
+        await self.tarefa
+
+    async def _receive(self):
+        if not self._corpo_enviado:
+            self._corpo_enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self._desconectar.wait()
+        return {'type': 'http.disconnect'}
+
+    async def _send(self, mensagem):
+        if mensagem['type'] == 'http.response.start':
+            self.status = mensagem['status']
+            if self.status != 200:
+                self.pronto.set()
+            return
+        chegada = time.perf_counter()
+        for bloco in mensagem.get('body', b'').decode().split('\n\n'):
+            if bloco.startswith('retry:') or 'event: inicio' in bloco:
+                self.pronto.set()
+            elif 'event: diretorio' in bloco:
+                dados = bloco.split('data: ', 1)[1]
+                self.eventos.put_nowait((chegada, json.loads(dados)))
+
+
+# Limite de conexões simultâneas do benchmark de eventos (memória do processo)
+MAX_ASSINANTES_BENCH = 5000
+
+
+def bench_eventos(tamanhos, repeticoes, escrever):
+    """
+    Conexões SSE simultâneas em um worker: tempo de conexão, memória por
+    assinante e latência do commit até o evento chegar a todos
+    """
+    import tracemalloc
+
+    from asgiref.sync import async_to_sync, sync_to_async
+    from django.core.asgi import get_asgi_application
+    from django.test import Client
+
+    from . import eventos
+    from .models import Usuario
+
+    usuario = Usuario.objects.create_user(username='bench-eventos', password='bench')
+    cliente_http = Client()
+    cliente_http.force_login(usuario)
+    cookie = f'sessionid={cliente_http.cookies["sessionid"].value}'
+    app = get_asgi_application()
+    departamento = Departamento.objects.create(nome='Bench Eventos')
+
+    def alterar(numero):
+        with transaction.atomic():
+            Funcionario.objects.create(nome=f'Evento {_codigo(numero)}', departamento=departamento)
+
+    async def conectar(quantidade):
+        clientes = [ClienteSSE(app, cookie).conectar() for _ in range(quantidade)]
+        await asyncio.gather(*(cliente.pronto.wait() for cliente in clientes))
+        return clientes
+
+    async def rodar(quantidade):
+        # Memória medida numa primeira rodada (tracemalloc deixa tudo lento)
+        tracemalloc.start()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        clientes = await conectar(quantidade)
+        memoria = (tracemalloc.get_traced_memory()[0] - memoria_inicial) / quantidade
+        tracemalloc.stop()
+        await asyncio.gather(*(cliente.fechar() for cliente in clientes))
+
+        inicio = time.perf_counter()
+        clientes = await conectar(quantidade)
+        conexao = time.perf_counter() - inicio
+
+        latencias = []
+        for numero in range(min(repeticoes, 20)):
+            inicio = time.perf_counter()
+            await sync_to_async(alterar)(numero)
+            chegadas = await asyncio.gather(*(cliente.eventos.get() for cliente in clientes))
+            latencias.append((max(chegada for chegada, _ in chegadas) - inicio) * 1000)
+
+        await asyncio.gather(*(cliente.fechar() for cliente in clientes))
+        return conexao, memoria, latencias, eventos.broadcaster.quantidade
+
+    escrever(
+        f'{"conexões":>9} {"conectar":>10} {"memória/con":>12} '
+        f'{"entrega p50":>12} {"entrega p99":>12} {"restantes":>10}'
+    )
+    for quantidade in tamanhos:
+        if quantidade > MAX_ASSINANTES_BENCH:
+            escrever(f'{quantidade:>9} ignorado (máximo {MAX_ASSINANTES_BENCH})')
+            continue
+        conexao, memoria, latencias, restantes = async_to_sync(rodar)(quantidade)
+        p50, p99 = resumo(latencias)
+        escrever(
+            f'{quantidade:>9} {conexao * 1000:>8.0f}ms {memoria / 1024:>9.1f} KB '
+            f'{p50:>10.2f}ms {p99:>10.2f}ms {restantes:>10}'
+        )
+    Usuario.objects.filter(pk=usuario.pk).delete()
+
+
+def bench_exportacao(tamanhos, repeticoes, escrever):
+    """
+    Exportação por streaming: linhas/s e pico de memória (tracemalloc) do
+    CSV e do XLSX, comparados a montar o CSV inteiro em memória
+    """
+    import csv
+    import io
+    import tracemalloc
+
+    from . import exportacao
+
+    base = Funcionario.objects.filter(ativo=True).order_by('nome')
+
+    def consumir(gerador):
+        return sum(len(bloco) for bloco in gerador)
+
+    def csv_em_memoria(queryset):
+        saida = io.StringIO()
+        escritor = csv.writer(saida, delimiter=';')
+        escritor.writerows(list(queryset.values_list(*(campo for _, campo in exportacao.COLUNAS))))
+        return len(saida.getvalue().encode())
+
+    def pico(funcao):
+        tracemalloc.start()
+        funcao()
+        maximo = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return maximo / 1024 / 1024
+
+    escrever(
+        f'{"linhas":>8} {"csv":>13} {"xlsx":>13} {"pico csv":>9} {"pico xlsx":>10} '
+        f'{"csv em memória":>15} {"tamanho xlsx":>13}'
+    )
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        vezes = max(1, min(repeticoes, 100000 // tamanho))
+        tempo_csv, _ = resumo(medir(lambda: consumir(exportacao.gerar_csv(base.all())), vezes))
+        tempo_xlsx, _ = resumo(medir(lambda: consumir(exportacao.gerar_xlsx(base.all())), vezes))
+        escrever(
+            f'{tamanho:>8} {tamanho / tempo_csv * 1000:>7.0f} lin/s {tamanho / tempo_xlsx * 1000:>7.0f} lin/s '
+            f'{pico(lambda: consumir(exportacao.gerar_csv(base.all()))):>6.1f} MB '
+            f'{pico(lambda: consumir(exportacao.gerar_xlsx(base.all()))):>7.1f} MB '
+            f'{pico(lambda: csv_em_memoria(base.all())):>12.1f} MB '
+            f'{consumir(exportacao.gerar_xlsx(base.all())) / 1024 / 1024:>10.1f} MB'
+        )
+
+
+def _leitora_concorrencia(parar, resultados):
+    """Processo leitor do bench_concorrencia: página da listagem e contagem em laço"""
+    from django.db import OperationalError, connection
+
+    latencias, erros = [], 0
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            list(
+                Funcionario.objects.filter(ativo=True).order_by('nome', 'id')
+                .values_list('nome', 'ramal', 'departamento__nome')[:20]
+            )
+            Funcionario.objects.filter(ativo=True).count()
+        except OperationalError:
+            erros += 1
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    connection.close()
+    resultados.put((latencias, erros))
+
+
+def bench_concorrencia(tamanhos, repeticoes, escrever):
+    """
+    Leituras durante uma importação em massa (uma transação criando
+    ``tamanho`` funcionários sobre uma base do mesmo tamanho), por perfil de banco: leituras/s, latência e erros de
+    processos leitores (como workers do servidor) e a duração da importação.
+    Roda num banco em arquivo (SUITES_EM_ARQUIVO): o banco de testes em
+    memória não tem locks entre conexões.
+    """
+    import multiprocessing
+
+    from django.conf import settings
+    from django.db import connection, connections
+    from django.test.utils import override_settings
+
+    from . import banco
+    from .importers import ImportadorDiretorio
+
+    perfis = {
+        # journal_mode explícito: o WAL fica gravado no arquivo do banco
+        'padrao': ({'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 5),
+        'producao': (settings.RAMAIS_SQLITE_PRAGMAS_PRODUCAO, 20),
+    }
+    leitoras = 4
+    contexto = multiprocessing.get_context('fork')
+    opcoes = connections.settings[connection.alias].setdefault('OPTIONS', {})
+    timeout_original = opcoes.get('timeout')
+
+    def importar(tamanho, inicio):
+        return ImportadorDiretorio().importar(gerar_pessoas(tamanho, inicio=inicio))
+
+    def limpar():
+        # Sem os signals por linha do delete() do ORM
+        with connection.cursor() as cursor:
+            for modelo in (FuncionarioBusca, Funcionario):
+                cursor.execute(f'DELETE FROM {modelo._meta.db_table}')
+
+    escrever(
+        f'{"perfil":>9} {"linhas":>8} {"importação":>11} {"leituras/s":>11} '
+        f'{"leitura p50":>12} {"p99":>9} {"máx":>9} {"erros":>6}'
+    )
+    try:
+        for perfil, (pragmas, timeout) in perfis.items():
+            with override_settings(RAMAIS_SQLITE_PRAGMAS=pragmas):
+                opcoes['timeout'] = timeout
+                connections.close_all()
+                for tamanho in tamanhos:
+                    # Mesma base para os dois perfis: ``tamanho`` funcionários
+                    banco.executar_escrita(limpar)
+                    banco.executar_escrita(importar, tamanho, 0)
+                    # Os processos filhos abrem as próprias conexões
+                    connections.close_all()
+                    parar, resultados = contexto.Event(), contexto.Queue()
+                    processos = [
+                        contexto.Process(target=_leitora_concorrencia, args=(parar, resultados))
+                        for _ in range(leitoras)
+                    ]
+                    for processo in processos:
+                        processo.start()
+                    time.sleep(0.5)
+                    inicio = time.perf_counter()
+                    banco.executar_escrita(importar, tamanho, tamanho)
+                    duracao = time.perf_counter() - inicio
+                    parar.set()
+                    latencias, erros = [], 0
+                    for _ in processos:
+                        parciais, erros_parciais = resultados.get()
+                        latencias += parciais
+                        erros += erros_parciais
+                    for processo in processos:
+                        processo.join()
+                    p50, p99 = resumo(latencias) if latencias else (0, 0)
+                    escrever(
+                        f'{perfil:>9} {tamanho:>8} {duracao:>10.2f}s '
+                        f'{len(latencias) / (duracao + 0.5):>11.0f} {p50:>10.2f}ms {p99:>7.2f}ms '
+                        f'{max(latencias, default=0):>7.0f}ms {erros:>6}'
+                    )
+    finally:
+        if timeout_original is None:
+            opcoes.pop('timeout', None)
+        else:
+            opcoes['timeout'] = timeout_original
+        connections.close_all()
+
+
+def bench_autenticacao(tamanhos, repeticoes, escrever):
+    """
+    Consultas por requisição autenticada por sessão (sessão + usuário e o
+    total) e latência, com sessões no banco e ModelBackend (configuração
+    anterior) e com ramais.sessoes e BackendUsuarioEmCache
+    """
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    from .models import Usuario
+
+    configuracoes = {
+        'banco': {
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+        },
+        'cache': {},
+    }
+    tabelas_autenticacao = ('django_session', Usuario._meta.db_table)
+    urls = ('/api/auth/me/', '/api/funcionarios/?page_size=20')
+    usuario = Usuario.objects.create_user(username='bench-autenticacao', password='bench')
+
+    def consultas(cliente, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            assert cliente.get(url).status_code == 200
+        autenticacao = sum(
+            1 for consulta in capturadas
+            if any(f'"{tabela}"' in consulta['sql'] for tabela in tabelas_autenticacao)
+        )
+        return autenticacao, len(capturadas)
+
+    escrever(
+        f'{"linhas":>8} {"config":>7} {"url":>32} {"sessão+usuário":>15} '
+        f'{"total":>6} {"p50":>9} {"p99":>9}'
+    )
+    for tamanho in tamanhos:
+        gerar_diretorio(tamanho)
+        for nome, configuracao in configuracoes.items():
+            with override_settings(**configuracao):
+                cache.clear()
+                cliente = Client()
+                cliente.force_login(usuario)
+                for url in urls:
+                    # A primeira requisição preenche os caches
+                    cliente.get(url)
+                    autenticacao, total = consultas(cliente, url)
+                    p50, p99 = resumo(medir(lambda: cliente.get(url), repeticoes))
+                    escrever(
+                        f'{tamanho:>8} {nome:>7} {url:>32} {autenticacao:>15} '
+                        f'{total:>6} {p50:>7.2f}ms {p99:>7.2f}ms'
+                    )
+    usuario.delete()
+
+
+def bench_provisionamento(tamanhos, repeticoes, escrever):
+    """
+    Usuários/s no provisionamento em lote (``tamanho`` usuários) com 1, 2, 4...
+    processos até o número de núcleos, comparado ao UsuarioSerializer.create
+    um a um (caminho do POST /api/usuarios/)
+    """
+    from . import provisionamento
+    from .models import Usuario
+    from .serializers import UsuarioSerializer
+
+    def linhas(tamanho, prefixo):
+        return [
+            {'username': f'{prefixo}{numero}', 'password': f'senha-{numero}', 'email': f'{prefixo}{numero}@bench.local'}
+            for numero in range(tamanho)
+        ]
+
+    def limpar():
+        Usuario.objects.filter(username__startswith='bench-').delete()
+
+    # Um por núcleo, ou RAMAIS_PROVISIONAMENTO_PROCESSOS
+    maximo = provisionamento.processos_padrao()
+    variantes = sorted({1, maximo} | {2 ** i for i in range(1, 8) if 2 ** i < maximo})
+    escrever(f'{"usuários":>9} {"caminho":>16} {"tempo":>9} {"usuários/s":>11} {"ganho":>7}')
+    for tamanho in tamanhos:
+        limpar()
+        inicio = time.perf_counter()
+        for dados in linhas(tamanho, 'bench-um-'):
+            serializer = UsuarioSerializer(data=dados)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        base = time.perf_counter() - inicio
+        escrever(f'{tamanho:>9} {"um a um":>16} {base:>8.2f}s {tamanho / base:>11.1f} {1:>6.1f}x')
+        for processos in variantes:
+            limpar()
+            resultado = provisionamento.provisionar(
+                enumerate(linhas(tamanho, 'bench-lote-'), start=2), processos=processos
+            )
+            assert len(resultado.criados) == tamanho
+            escrever(
+                f'{tamanho:>9} {f"lote {resultado.processos} proc.":>16} {resultado.duracao:>8.2f}s '
+                f'{tamanho / resultado.duracao:>11.1f} {base / resultado.duracao:>6.1f}x'
+            )
+    limpar()
+
+
+def bench_gravacao_lote(tamanhos, repeticoes, escrever):
+    """
+    ``tamanho`` funcionários criados e depois atualizados por N requisições
+    POST/PATCH individuais x uma chamada a POST /api/funcionarios/bulk/,
+    sobre um diretório de 10000: tempo e consultas
+    """
+    import contextlib
+    import io
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    from .models import Usuario
+
+    usuario = Usuario.objects.create_user(username='bench-lote', password='bench', is_admin=True)
+    cliente = APIClient()
+    cliente.force_authenticate(usuario)
+    gerar_diretorio(10000)
+    departamento = Departamento.objects.first()
+
+    def item(numero, prefixo):
+        return {
+            'nome': f'{prefixo} {_codigo(numero).capitalize()}', 'ramal': str(900000 + numero),
+            'email': f'{prefixo.lower()}.{numero}@chiaperini.com.br', 'departamento': departamento.pk,
+        }
+
+    def executar(funcao):
+        # O log de consultas guarda no máximo 9000
+        connection.queries_log.clear()
+        # O create do viewset imprime dados de depuração
+        with CaptureQueriesContext(connection) as capturadas, contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            funcao()
+            duracao = time.perf_counter() - inicio
+        return duracao, len(capturadas)
+
+    def individuais_criar(itens):
+        return [cliente.post('/api/funcionarios/', dados, format='json').json()['id'] for dados in itens]
+
+    def individuais_atualizar(ids):
+        for pk in ids:
+            assert cliente.patch(f'/api/funcionarios/{pk}/', {'whatsapp': '16999990000'}, format='json').status_code == 200
+
+    def lote(itens):
+        response = cliente.post('/api/funcionarios/bulk/', {'itens': itens}, format='json')
+        assert response.status_code == 200, response.content
+        return [resultado['id'] for resultado in response.json()['resultados']]
+
+    def limpar():
+        ids = list(Funcionario.objects.filter(ramal__startswith='9').values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FuncionarioBusca._meta.db_table} WHERE rowid IN ({",".join(map(str, ids)) or "0"})'
+            )
+        Funcionario.objects.filter(pk__in=ids).update(ativo=False, ramal=None, email=None)
+
+    escrever(
+        f'{"itens":>6} {"operação":>10} {"individuais":>12} {"consultas":>10} '
+        f'{"lote":>9} {"consultas":>10} {"ganho":>7}'
+    )
+    for tamanho in tamanhos:
+        ids = []
+        individual, consultas_individual = executar(lambda: ids.extend(individuais_criar(
+            [item(numero, 'Individual') for numero in range(tamanho)]
+        )))
+        limpar()
+        ids_lote = []
+        em_lote, consultas_lote = executar(lambda: ids_lote.extend(lote(
+            [item(numero, 'Lote') for numero in range(tamanho)]
+        )))
+        escrever(
+            f'{tamanho:>6} {"criação":>10} {individual:>11.2f}s {consultas_individual:>10} '
+            f'{em_lote:>8.3f}s {consultas_lote:>10} {individual / em_lote:>6.1f}x'
+        )
+        individual, consultas_individual = executar(lambda: individuais_atualizar(ids_lote))
+        em_lote, consultas_lote = executar(lambda: lote(
+            [{'id': pk, 'whatsapp': '16988880000'} for pk in ids_lote]
+        ))
+        escrever(
+            f'{tamanho:>6} {"atualização":>10} {individual:>11.2f}s {consultas_individual:>10} '
+            f'{em_lote:>8.3f}s {consultas_lote:>10} {individual / em_lote:>6.1f}x'
+        )
+        limpar()
+    usuario.delete()
+
+
+SUITES = {
+    'busca': bench_busca,
+    'importacao': bench_importacao,
+    'leitura': bench_leitura,
+    'serializacao': bench_serializacao,
+    'numeros': bench_numeros,
+    'autocompletar': bench_autocompletar,
+    'aproximada': bench_aproximada,
+    'eventos': bench_eventos,
+    'exportacao': bench_exportacao,
+    'concorrencia': bench_concorrencia,
+    'autenticacao': bench_autenticacao,
+    'provisionamento': bench_provisionamento,
+    'gravacao_lote': bench_gravacao_lote,
+}
+
+# Suítes que precisam de um banco de testes em arquivo (locks entre conexões)
+SUITES_EM_ARQUIVO = {'concorrencia'}
@@ -0,0 +1,209 @@
+"""
+Busca aproximada (tolerante a erros de digitação) dos funcionários.
+
+Os termos distintos (sem acento, minúsculos) do nome, do departamento e da
+função formam um vocabulário com dois índices:
+
+- trigramas: a palavra buscada é comparada aos termos que compartilham
+  trigramas com ela (coeficiente de Dice); tolera vários erros em palavras
+  longas;
+- deleções de uma letra (à la SymSpell): encontra os termos a uma edição de
+  distância (troca, omissão, inserção ou inversão de letras), inclusive nas
+  palavras curtas em que os trigramas quase não se repetem.
+
+Os funcionários recebem a melhor similaridade de cada palavra multiplicada
+pelo peso do campo (nome > departamento > função). Todas as palavras precisam
+casar com algum termo. Não há corte no número de resultados: a busca
+devolve todos os que casam e a paginação e os filtros ficam com a view.
+
+O índice fica em memória e é refeito uma vez por versão do diretório (cache
+``aproximada``), como o índice de números.
+"""
+from collections import Counter
+from operator import itemgetter
+
+from django.db.models import Case, IntegerField, Value, When
+
+from . import snapshots, versao
+from .autocompletar import tokens
+from .models import Funcionario
+
+PESOS_CAMPOS = {'nome': 1.0, 'departamento': 0.7, 'funcao': 0.5}
+
+# Similaridade mínima (Dice sobre trigramas) para um termo contar como casamento
+SIMILARIDADE_MINIMA = 0.5
+
+aproximada_cache = snapshots.registrar_cache('aproximada', max_entradas=1)
+
+
+def trigramas(termo):
+    """Trigramas do termo com bordas: "ana" -> {"$an", "ana", "na$"}"""
+    termo = f'${termo}$'
+    return {termo[i:i + 3] for i in range(len(termo) - 2)}
+
+
+def delecoes(termo):
+    """O termo e as variantes com uma letra a menos"""
+    return {termo, *(termo[:i] + termo[i + 1:] for i in range(len(termo)))}
+
+
+def distancia_edicao(a, b):
+    """Distância de Damerau-Levenshtein restrita (inversão conta como uma edição)"""
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        atual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            atual[j] = min(
+                anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (ca != cb)
+            )
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                atual[j] = min(atual[j], anterior2[j - 2] + 1)
+        anterior2, anterior = anterior, atual
+    return anterior[-1]
+
+
+def _unir(conjuntos):
+    return conjuntos[0] if len(conjuntos) == 1 else set().union(*conjuntos)
+
+
+class IndiceAproximado:
+    """Vocabulário com índice de trigramas e, por termo, os funcionários"""
+
+    def __init__(self, linhas=()):
+        self.termos = []
+        self.tamanhos = []
+        self.gramas = {}
+        self.variantes = {}
+        # Por termo: {campo: {ids}}
+        self.ocorrencias = []
+        posicoes = {}
+        for pk, *valores in linhas:
+            for campo, valor in zip(PESOS_CAMPOS, valores):
+                for termo in set(tokens(valor)):
+                    posicao = posicoes.get(termo)
+                    if posicao is None:
+                        posicao = posicoes[termo] = len(self.termos)
+                        self.termos.append(termo)
+                        self.ocorrencias.append({})
+                        gramas = trigramas(termo)
+                        self.tamanhos.append(len(gramas))
+                        for grama in gramas:
+                            self.gramas.setdefault(grama, []).append(posicao)
+                        for variante in delecoes(termo):
+                            self.variantes.setdefault(variante, []).append(posicao)
+                    self.ocorrencias[posicao].setdefault(campo, set()).add(pk)
+
+    def termos_semelhantes(self, palavra):
+        """Lista de (posição do termo, similaridade) acima do mínimo"""
+        gramas = trigramas(palavra)
+        comuns = Counter()
+        for grama in gramas:
+            postagens = self.gramas.get(grama)
+            if postagens:
+                comuns.update(postagens)
+        total = len(gramas)
+        # Dice >= mínimo exige pelo menos esta quantidade de trigramas comuns
+        minimo = SIMILARIDADE_MINIMA * total / (2 - SIMILARIDADE_MINIMA)
+        semelhantes = {}
+        for posicao, quantidade in comuns.items():
+            if quantidade < minimo:
+                continue
+            similaridade = 2 * quantidade / (total + self.tamanhos[posicao])
+            if similaridade >= SIMILARIDADE_MINIMA:
+                semelhantes[posicao] = similaridade
+
+        # Termos a uma edição de distância compartilham alguma deleção
+        vistos = set()
+        for variante in delecoes(palavra):
+            vistos.update(self.variantes.get(variante, ()))
+        for posicao in vistos:
+            termo = self.termos[posicao]
+            similaridade = 1 - distancia_edicao(palavra, termo) / max(len(palavra), len(termo))
+            if similaridade >= SIMILARIDADE_MINIMA and similaridade > semelhantes.get(posicao, 0):
+                semelhantes[posicao] = similaridade
+        return list(semelhantes.items())
+
+    def niveis(self, palavra):
+        """
+        Funcionários que casam com a palavra agrupados por pontuação:
+        lista de (pontuação, {ids}) com cada id só no seu melhor nível
+        """
+        grupos = sorted(
+            (
+                (similaridade * PESOS_CAMPOS[campo], ids)
+                for posicao, similaridade in self.termos_semelhantes(palavra)
+                for campo, ids in self.ocorrencias[posicao].items()
+            ),
+            key=itemgetter(0), reverse=True
+        )
+        por_valor = {}
+        atribuidos = set()
+        for valor, ids in grupos:
+            # Sem cópia quando não há sobreposição (caso comum); os conjuntos
+            # do índice nunca são alterados
+            novos = ids if atribuidos.isdisjoint(ids) else ids - atribuidos
+            if novos:
+                por_valor.setdefault(valor, []).append(novos)
+                atribuidos.update(novos)
+        return [(valor, _unir(conjuntos)) for valor, conjuntos in por_valor.items()]
+
+    def buscar(self, texto):
+        """
+        Funcionários que casam com o texto agrupados por pontuação: lista de
+        (pontuação, {ids}), da maior para a menor pontuação.
+
+        As pontuações são combinadas por nível (interseções de conjuntos),
+        sem percorrer id a id os milhares de funcionários de um departamento.
+        """
+        combinados = None
+        for palavra in set(tokens(texto)):
+            niveis = self.niveis(palavra)
+            if combinados is None:
+                combinados = niveis
+            else:
+                somados = {}
+                for valor, ids in combinados:
+                    for outro_valor, outros_ids in niveis:
+                        comuns = ids & outros_ids
+                        if comuns:
+                            somados.setdefault(valor + outro_valor, []).append(comuns)
+                combinados = [(valor, _unir(conjuntos)) for valor, conjuntos in somados.items()]
+            if not combinados:
+                return []
+        if not combinados:
+            return []
+        return sorted(combinados, key=itemgetter(0), reverse=True)
+
+
+def construir_indice():
+    linhas = Funcionario.objects.filter(ativo=True).values_list(
+        'pk', 'nome', 'departamento__nome', 'funcao__nome'
+    )
+    return IndiceAproximado(linhas.iterator())
+
+
+def obter_indice(versao_dados=None):
+    return aproximada_cache.obter(
+        'indice', versao_dados or versao.versao_atual(), construir_indice
+    )
+
+
+def aplicar_busca(queryset, busca):
+    """
+    Filtra o queryset pelos funcionários semelhantes à busca, anotando
+    ``relevancia`` com a faixa de pontuação (menor é melhor)
+    """
+    niveis = obter_indice().buscar(busca)
+    if not niveis:
+        return queryset.none().annotate(relevancia=Value(0, output_field=IntegerField()))
+    # Mesma pontuação, mesma faixa: o desempate fica com a ordenação por nome
+    faixas = {}
+    for valor, ids in niveis:
+        faixas.setdefault(round(valor, 6), set()).update(ids)
+    casos = [
+        When(pk__in=ids, then=Value(faixa))
+        for faixa, ids in enumerate(faixas.values())
+    ]
+    return queryset.filter(pk__in=set().union(*faixas.values())).annotate(
+        relevancia=Case(*casos, output_field=IntegerField())
+    )
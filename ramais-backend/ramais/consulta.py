@@ -0,0 +1,159 @@
+"""
+Linguagem de consulta da busca de funcionários.
+
+Além do texto livre, o parâmetro ``busca`` aceita termos por campo::
+
+    ramal:72*  dept:"TI-Infra"  unidade:Chiaperini funcao:Compras  -nome:leo*
+
+- ``campo:valor`` casa o valor inteiro (sem diferenciar maiúsculas/acentos
+  nos cadastros); ``campo:valor*`` casa por prefixo; aspas permitem espaços;
+- no nome, o valor é comparado às palavras (``nome:le*`` encontra "Marcos
+  Leão") e ``nome:"joao paulo"`` procura a sequência de palavras;
+- ``-`` na frente nega o termo (também vale para texto livre);
+- termos sem campo, ou com campo desconhecido, vão para a busca textual.
+
+Cada termo vira um predicado que o banco resolve por índice: faixa
+(``>= valor AND < valor seguinte``) no índice de ramal e no de e-mail em
+minúsculas, filtro de coluna no FTS para o nome e ``*_id IN (...)`` nos
+índices das chaves estrangeiras (os ids dos cadastros são resolvidos antes,
+nas tabelas pequenas de departamentos, funções e unidades).
+"""
+import re
+from collections import namedtuple
+
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact, GreaterThanOrEqual, LessThan
+
+from . import search
+from .autocompletar import dobrar
+from .models import Departamento, Funcao, FuncionarioBusca, Unidade
+
+Termo = namedtuple('Termo', 'campo valor prefixo negado')
+
+# Nome usado na consulta -> campo
+CAMPOS = {
+    'nome': 'nome',
+    'ramal': 'ramal',
+    'ext': 'ramal',
+    'email': 'email',
+    'dept': 'departamento',
+    'depto': 'departamento',
+    'departamento': 'departamento',
+    'funcao': 'funcao',
+    'cargo': 'funcao',
+    'unidade': 'unidade',
+}
+
+CADASTROS = {'departamento': Departamento, 'funcao': Funcao, 'unidade': Unidade}
+
+_TERMO_RE = re.compile(r'(-)?(?:(\w+):)?(?:"([^"]*)"|(\S+))', re.UNICODE)
+_PALAVRA_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def analisar(texto):
+    """Lista de Termo da consulta; campo None indica texto livre"""
+    termos = []
+    for negado, campo, entre_aspas, palavra in _TERMO_RE.findall(texto or ''):
+        valor = entre_aspas if entre_aspas or not palavra else palavra
+        campo_normalizado = CAMPOS.get(dobrar(campo)) if campo else None
+        if campo and campo_normalizado is None:
+            # Campo desconhecido ("10:30", "http://..."): texto livre
+            valor = f'{campo}:{valor}'
+        prefixo = valor.endswith('*')
+        valor = valor.rstrip('*').strip()
+        if not valor:
+            continue
+        termos.append(Termo(campo_normalizado, valor, prefixo, bool(negado)))
+    return termos
+
+
+def proximo_prefixo(valor):
+    """Menor texto maior que todos os que começam por ``valor``"""
+    return valor[:-1] + chr(ord(valor[-1]) + 1)
+
+
+def _faixa(expressao, valor, prefixo):
+    if not prefixo:
+        return Exact(expressao, valor)
+    return GreaterThanOrEqual(expressao, valor) & LessThan(expressao, proximo_prefixo(valor))
+
+
+def _ids_cadastro(campo, valor, prefixo):
+    """Ids dos cadastros cujo nome (sem acento/caixa) é o valor ou começa por ele"""
+    alvo = dobrar(valor)
+    return [
+        pk for pk, nome in CADASTROS[campo].objects.values_list('pk', 'nome')
+        if (dobrar(nome).startswith(alvo) if prefixo else dobrar(nome) == alvo)
+    ]
+
+
+def _expressao_fts(termo):
+    """Termo de nome (ou texto livre) no formato MATCH do FTS5"""
+    palavras = search.montar_consulta(termo.valor)
+    if palavras is None:
+        return None
+    if termo.campo is None:
+        return palavras
+    if termo.prefixo:
+        return f'nome : ({palavras})'
+    frase = ' '.join(_PALAVRA_RE.findall(termo.valor))
+    return f'nome : "{frase}"'
+
+
+def predicado(termo, usar_fts):
+    """Q do termo por campo (sem a negação)"""
+    if termo.campo == 'ramal':
+        return Q(_faixa(F('ramal'), termo.valor, termo.prefixo))
+    if termo.campo == 'email':
+        return Q(_faixa(Lower('email'), termo.valor.lower(), termo.prefixo))
+    if termo.campo in CADASTROS:
+        return Q(**{f'{termo.campo}_id__in': _ids_cadastro(termo.campo, termo.valor, termo.prefixo)})
+    # Nome ou texto livre negado
+    expressao = _expressao_fts(termo) if usar_fts else None
+    if expressao is not None:
+        return Q(pk__in=FuncionarioBusca.objects.filter(
+            documento__match=expressao
+        ).values('funcionario_id'))
+    if termo.campo == 'nome':
+        return Q(nome__istartswith=termo.valor) if termo.prefixo else Q(nome__iexact=termo.valor)
+    return search.filtro_icontains(termo.valor)
+
+
+def aplicar_consulta(queryset, busca, aproximada=False):
+    """
+    Aplica a busca (texto livre e/ou termos por campo) ao queryset.
+
+    Retorna (queryset, ordenado_por_relevancia) como search.aplicar_busca;
+    sem termos por campo nem negação o comportamento é exatamente o dela.
+    """
+    termos = analisar(busca)
+    if all(termo.campo is None and not termo.negado for termo in termos):
+        return search.aplicar_busca(queryset, busca, aproximada=aproximada)
+
+    usar_fts = search.fts_disponivel()
+    livres = [termo for termo in termos if termo.campo is None and not termo.negado]
+    nomes = [termo for termo in termos if termo.campo == 'nome' and not termo.negado]
+    restantes = [termo for termo in termos if termo not in livres]
+
+    por_relevancia = False
+    if usar_fts and not aproximada and (livres or nomes):
+        # Texto livre e nomes num único MATCH (o FTS5 não aceita dois na mesma tabela)
+        partes = [_expressao_fts(termo) for termo in livres + nomes]
+        partes = [parte for parte in partes if parte]
+        if partes:
+            queryset = search.aplicar_match(queryset, ' '.join(partes))
+            por_relevancia = True
+        restantes = [termo for termo in restantes if termo not in nomes]
+    elif livres:
+        texto = ' '.join(termo.valor for termo in livres)
+        queryset, por_relevancia = search.aplicar_busca(queryset, texto, aproximada=aproximada)
+
+    for termo in restantes:
+        condicao = predicado(termo, usar_fts)
+        if termo.negado and termo.campo in ('ramal', 'email'):
+            # NOT (ramal >= … AND ramal < …) é NULL para ramal nulo e o exclude
+            # descartaria a linha; quem não tem o campo não casa com o termo
+            condicao = Q(**{f'{termo.campo}__isnull': False}) & condicao
+        queryset = queryset.exclude(condicao) if termo.negado else queryset.filter(condicao)
+    return queryset, por_relevancia
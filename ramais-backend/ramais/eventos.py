@@ -0,0 +1,175 @@
+"""
+Eventos de alteração do diretório enviados por Server-Sent Events.
+
+O ``broadcaster`` distribui, dentro do processo, os eventos publicados após o
+commit das alterações (ver ``alteracoes.registrar``) para as conexões abertas
+em /api/directory/events/. Cada conexão é só uma fila asyncio no event loop do
+servidor ASGI (uvicorn, daphne...), sem thread por cliente; a publicação feita
+nas threads das views síncronas acorda o loop uma única vez por evento.
+
+Eventos gerados em outros processos (comandos de gerenciamento, outros
+workers) não passam por aqui; o cliente que precisar de garantia usa o cursor
+do evento no feed /api/funcionarios/changes/.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from . import versao
+
+# Acima desta quantidade de objetos em uma operação em massa, publica um
+# único evento resumido em vez de um por objeto
+LIMITE_EVENTOS_INDIVIDUAIS = 50
+
+
+class Assinatura:
+    """Conexão inscrita no broadcaster"""
+
+    __slots__ = ('fila', 'loop', 'perdeu_eventos')
+
+    def __init__(self, loop, tamanho_fila):
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.loop = loop
+        # Fila cheia (cliente lento): o cliente precisa ressincronizar
+        self.perdeu_eventos = False
+
+
+class Broadcaster:
+    """Fan-out em memória de eventos para as assinaturas de cada event loop"""
+
+    def __init__(self, tamanho_fila=None):
+        self.tamanho_fila = tamanho_fila or getattr(
+            settings, 'RAMAIS_EVENTOS_TAMANHO_FILA', 100
+        )
+        self.publicados = 0
+        self._por_loop = {}
+        self._lock = threading.Lock()
+
+    @property
+    def quantidade(self):
+        with self._lock:
+            return sum(len(assinaturas) for assinaturas in self._por_loop.values())
+
+    def assinar(self):
+        """Cria uma assinatura no event loop corrente"""
+        loop = asyncio.get_running_loop()
+        assinatura = Assinatura(loop, self.tamanho_fila)
+        with self._lock:
+            self._por_loop.setdefault(loop, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinaturas = self._por_loop.get(assinatura.loop)
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._por_loop[assinatura.loop]
+
+    def publicar(self, mensagem):
+        """
+        Entrega a mensagem (já no formato SSE, serializada uma única vez) a
+        todas as assinaturas; pode ser chamado de qualquer thread
+        """
+        with self._lock:
+            destinos = [(loop, tuple(assinaturas)) for loop, assinaturas in self._por_loop.items()]
+            self.publicados += 1
+        for loop, assinaturas in destinos:
+            try:
+                loop.call_soon_threadsafe(_entregar, assinaturas, mensagem)
+            except RuntimeError:
+                # Loop encerrado sem cancelar as assinaturas
+                with self._lock:
+                    self._por_loop.pop(loop, None)
+
+
+def _entregar(assinaturas, mensagem):
+    for assinatura in assinaturas:
+        try:
+            assinatura.fila.put_nowait(mensagem)
+        except asyncio.QueueFull:
+            assinatura.perdeu_eventos = True
+
+
+broadcaster = Broadcaster()
+
+
+def montar_eventos(modelo, operacao, entradas, versao_diretorio):
+    """Eventos de uma operação registrada no log de alterações"""
+    if len(entradas) > LIMITE_EVENTOS_INDIVIDUAIS:
+        return [{
+            'entidade': modelo,
+            'id': None,
+            'operacao': operacao,
+            'quantidade': len(entradas),
+            'versao': versao_diretorio,
+            'cursor': entradas[-1].id,
+        }]
+    return [
+        {
+            'entidade': modelo,
+            'id': entrada.objeto_id,
+            'operacao': operacao,
+            'versao': versao_diretorio,
+            'cursor': entrada.id,
+        }
+        for entrada in entradas
+    ]
+
+
+def publicar_ao_confirmar(modelo, operacao, entradas):
+    """Publica os eventos das entradas quando a transação corrente fizer commit"""
+    def publicar():
+        if not broadcaster.quantidade:
+            return
+        # A versão deixada pela transação (toda operação registrada também
+        # incrementa a versão), sem reler o banco a cada commit
+        versao_diretorio = versao.versao_gravada()
+        if versao_diretorio is None:
+            versao_diretorio, _ = versao.versao_atual()
+        for evento in montar_eventos(modelo, operacao, entradas, versao_diretorio):
+            broadcaster.publicar(formatar_sse(evento))
+
+    transaction.on_commit(publicar)
+
+
+def formatar_sse(evento, nome='diretorio'):
+    """Serializa um evento no formato text/event-stream"""
+    linhas = [f'event: {nome}']
+    if evento.get('cursor') is not None:
+        linhas.append(f'id: {evento["cursor"]}')
+    linhas.append(f'data: {json.dumps(evento)}')
+    return '\n'.join(linhas) + '\n\n'
+
+
+async def transmitir(keepalive=None):
+    """
+    Gerador assíncrono do stream SSE de uma conexão.
+
+    Começa com um evento ``inicio`` (versão atual), envia comentários de
+    keepalive quando ocioso e um evento ``reset`` se a fila transbordar. A
+    assinatura é cancelada quando o cliente desconecta.
+    """
+    if keepalive is None:
+        keepalive = getattr(settings, 'RAMAIS_EVENTOS_KEEPALIVE', 15)
+    # Assina antes de ler a versão para não perder eventos entre as duas coisas
+    assinatura = broadcaster.assinar()
+    try:
+        versao_inicial, _ = await sync_to_async(versao.versao_atual)()
+        yield 'retry: 5000\n\n' + formatar_sse({'versao': versao_inicial}, 'inicio')
+        while True:
+            if assinatura.perdeu_eventos:
+                assinatura.perdeu_eventos = False
+                yield formatar_sse({}, 'reset')
+            try:
+                mensagem = await asyncio.wait_for(assinatura.fila.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield mensagem
+    finally:
+        broadcaster.cancelar(assinatura)
@@ -0,0 +1,186 @@
+"""
+Exportação do diretório em CSV e XLSX por streaming.
+
+As linhas saem do banco com ``.iterator(chunk_size=...)`` (cursor no
+servidor, sem carregar o queryset inteiro) e vão para o cliente em blocos
+pelo ``StreamingHttpResponse``: a memória do processo não cresce com o
+número de funcionários exportados.
+
+O XLSX é montado à mão (planilha com strings inline, sem dependências): o
+zip é gravado num buffer que é esvaziado a cada bloco de linhas, e o
+``zipfile`` usa descritores de dados por não poder voltar na saída.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Cabeçalho -> campo do values_list
+COLUNAS = (
+    ('Nome', 'nome'),
+    ('Ramal', 'ramal'),
+    ('E-mail', 'email'),
+    ('WhatsApp', 'whatsapp'),
+    ('Teams', 'teams'),
+    ('Departamento', 'departamento__nome'),
+    ('Função', 'funcao__nome'),
+    ('Unidade', 'unidade__nome'),
+)
+
+FORMATOS = ('csv', 'xlsx')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Linhas lidas do banco por vez e linhas por bloco enviado ao cliente
+TAMANHO_LOTE = 2000
+LINHAS_POR_BLOCO = 500
+
+# Caracteres de controle que o XML 1.0 não aceita
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def linhas(queryset):
+    """Tuplas com os valores das COLUNAS, na ordem do queryset"""
+    campos = [campo for _, campo in COLUNAS]
+    return queryset.values_list(*campos).iterator(chunk_size=TAMANHO_LOTE)
+
+
+class _Buffer:
+    """Saída de escrita sequencial; ``esvaziar`` devolve o que foi escrito"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+class _Texto:
+    """Adapta o _Buffer (bytes) ao csv.writer (texto)"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, texto):
+        return self.buffer.write(texto.encode('utf-8'))
+
+
+def gerar_csv(queryset):
+    """
+    Blocos de bytes do CSV (UTF-8 com BOM e separador ";", que o Excel em
+    português abre direto)
+    """
+    buffer = _Buffer()
+    escritor = csv.writer(_Texto(buffer), delimiter=';')
+    escritor.writerow([cabecalho for cabecalho, _ in COLUNAS])
+    yield '\ufeff'.encode() + buffer.esvaziar()
+    for numero, linha in enumerate(linhas(queryset), start=1):
+        escritor.writerow(['' if valor is None else valor for valor in linha])
+        if numero % LINHAS_POR_BLOCO == 0:
+            yield buffer.esvaziar()
+    yield buffer.esvaziar()
+
+
+ARQUIVOS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Ramais" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+FIM_PLANILHA = '</sheetData></worksheet>'
+
+
+def _linha_xlsx(valores):
+    # Tudo como texto: ramais e telefones mantêm zeros à esquerda
+    celulas = ''.join(
+        '<c t="inlineStr"><is><t xml:space="preserve">'
+        f'{escape(_INVALIDOS_XML.sub("", str(valor)))}</t></is></c>'
+        if valor not in (None, '') else '<c/>'
+        for valor in valores
+    )
+    return f'<row>{celulas}</row>'
+
+
+def gerar_xlsx(queryset):
+    """Blocos de bytes do arquivo XLSX (uma planilha "Ramais")"""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        for nome, conteudo in ARQUIVOS_XLSX.items():
+            arquivo.writestr(nome, conteudo)
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w') as planilha:
+            planilha.write(INICIO_PLANILHA.encode())
+            planilha.write(_linha_xlsx(cabecalho for cabecalho, _ in COLUNAS).encode())
+            bloco = []
+            for linha in linhas(queryset):
+                bloco.append(_linha_xlsx(linha))
+                if len(bloco) == LINHAS_POR_BLOCO:
+                    planilha.write(''.join(bloco).encode())
+                    bloco.clear()
+                    # O deflate só devolve bytes de tempos em tempos
+                    dados = buffer.esvaziar()
+                    if dados:
+                        yield dados
+            planilha.write((''.join(bloco) + FIM_PLANILHA).encode())
+    yield buffer.esvaziar()
+
+
+GERADORES = {'csv': gerar_csv, 'xlsx': gerar_xlsx}
+
+
+def resposta(queryset, formato):
+    """StreamingHttpResponse com o arquivo de exportação do queryset"""
+    nome_arquivo = f'ramais-{timezone.localdate():%Y-%m-%d}.{formato}'
+    response = StreamingHttpResponse(GERADORES[formato](queryset), content_type=CONTENT_TYPES[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
@@ -0,0 +1,287 @@
+"""
+Criação, atualização e desativação de funcionários em lote
+(POST /api/funcionarios/bulk/).
+
+Cada item é um objeto como o do FuncionarioSerializer: sem ``id`` cria o
+funcionário, com ``id`` atualiza só os campos enviados (``"ativo": false``
+desativa). Os cadastros podem vir pelo id (``departamento``) ou pelo nome
+(``departamento_nome``).
+
+A validação é feita para o lote inteiro e não por item: os funcionários
+existentes são lidos com uma consulta, os cadastros com uma por modelo, e
+a unicidade de ramal/e-mail entre os ativos é verificada dentro do lote e
+contra o banco com uma consulta por campo. Se algum item tiver erro nada é
+gravado; senão tudo é gravado com bulk_update/bulk_create. Leitura,
+validação e gravação rodam na mesma transação do caminho de escrita, para
+que nenhuma outra escrita mude os dados validados antes da gravação.
+"""
+from django.db import IntegrityError
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import alteracoes, banco, search, versao
+from .importers import CAMPOS_UNICOS
+from .models import Departamento, Funcao, Unidade, Funcionario
+
+LIMITE_ITENS = 1000
+
+TAMANHO_LOTE = 500
+
+# Campo do item -> modelo do cadastro
+CADASTROS = (
+    ('departamento', Departamento),
+    ('funcao', Funcao),
+    ('unidade', Unidade),
+)
+
+# Campos gravados pelo lote
+CAMPOS = (
+    'nome', 'ramal', 'email', 'whatsapp', 'teams', 'ativo',
+    'departamento_id', 'funcao_id', 'unidade_id',
+)
+
+MENSAGENS_UNICIDADE = {
+    'ramal': 'Já existe um funcionário com este ramal.',
+    'email': 'Já existe um funcionário com este email.',
+}
+
+MENSAGEM_CONCORRENCIA = 'Valor ocupado por outra gravação simultânea; envie o lote novamente.'
+
+
+class ResultadoLote:
+    """Resultado por item (na ordem recebida) de um lote"""
+
+    def __init__(self, total):
+        self.itens = [{'indice': indice} for indice in range(total)]
+        self.erros = {}
+
+    def erro(self, indice, campo, mensagem):
+        self.erros.setdefault(indice, {}).setdefault(campo, []).append(mensagem)
+
+    @property
+    def valido(self):
+        return not self.erros
+
+    def contagem(self):
+        operacoes = [item.get('operacao') for item in self.itens]
+        return {
+            operacao: operacoes.count(operacao)
+            for operacao in ('criado', 'atualizado', 'desativado', 'inalterado')
+        }
+
+
+def _chave(campo, valor):
+    return valor.lower() if campo == 'email' else valor
+
+
+def _validar_itens(itens, resultado):
+    """Validação de campos de cada item, sem consultas; {indice: dados}"""
+    from .serializers import FuncionarioLoteSerializer
+
+    validos = {}
+    vistos = {}
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            resultado.erro(indice, 'non_field_errors', 'O item deve ser um objeto.')
+            continue
+        serializer = FuncionarioLoteSerializer(data=item, partial='id' in item)
+        if not serializer.is_valid():
+            resultado.erros[indice] = serializer.errors
+            continue
+        dados = dict(serializer.validated_data)
+        pk = dados.get('id')
+        if pk is not None and pk in vistos:
+            resultado.erro(indice, 'id', f'Funcionário repetido no lote (item {vistos[pk]}).')
+            continue
+        if pk is not None:
+            vistos[pk] = indice
+        validos[indice] = dados
+    return validos
+
+
+def _resolver_cadastros(validos, resultado):
+    """Troca id/nome dos cadastros por ``<campo>_id``; uma consulta por modelo"""
+    for campo, model in CADASTROS:
+        ids, nomes = set(), set()
+        for dados in validos.values():
+            if dados.get(campo) is not None:
+                ids.add(dados[campo])
+            elif dados.get(f'{campo}_nome'):
+                nomes.add(dados[f'{campo}_nome'])
+        if not ids and not nomes:
+            existentes = []
+        else:
+            existentes = list(
+                model.objects.filter(Q(pk__in=ids) | Q(nome__in=nomes)).values_list('pk', 'nome')
+            )
+        pks = {pk for pk, _ in existentes}
+        por_nome = {nome: pk for pk, nome in existentes}
+
+        for indice, dados in list(validos.items()):
+            nome = dados.pop(f'{campo}_nome', None)
+            if campo in dados:
+                pk = dados.pop(campo)
+                if pk is not None and pk not in pks:
+                    resultado.erro(indice, campo, f'{model._meta.verbose_name} {pk} não existe.')
+                    continue
+                dados[f'{campo}_id'] = pk
+            elif nome is not None:
+                if nome and nome not in por_nome:
+                    resultado.erro(indice, f'{campo}_nome', f'{model._meta.verbose_name} "{nome}" não existe.')
+                    continue
+                dados[f'{campo}_id'] = por_nome[nome] if nome else None
+
+
+def _estados_finais(validos, resultado):
+    """
+    Funcionário como ficará após o item (instância existente alterada em
+    memória ou nova) e os valores anteriores; uma consulta para os existentes
+    """
+    ids = [dados['id'] for dados in validos.values() if 'id' in dados]
+    existentes = Funcionario.objects.in_bulk(ids)
+    finais, anteriores = {}, {}
+    for indice, dados in validos.items():
+        pk = dados.pop('id', None)
+        if pk is None:
+            finais[indice] = Funcionario(**dados)
+            continue
+        funcionario = existentes.get(pk)
+        if funcionario is None:
+            resultado.erro(indice, 'id', f'Funcionário {pk} não existe.')
+            continue
+        anteriores[indice] = {campo: getattr(funcionario, campo) for campo in CAMPOS}
+        for campo, valor in dados.items():
+            setattr(funcionario, campo, valor)
+        finais[indice] = funcionario
+    return finais, anteriores
+
+
+def _verificar_unicidade(finais, resultado):
+    """Ramal e e-mail únicos entre os ativos: no lote e contra o banco"""
+    ativos = [(indice, funcionario) for indice, funcionario in finais.items() if funcionario.ativo]
+    # Os do lote são comparados pelo estado final, não pelo que está no banco
+    ignorar = [funcionario.pk for _, funcionario in finais.items() if funcionario.pk]
+    for campo in CAMPOS_UNICOS:
+        donos = {}
+        for indice, funcionario in ativos:
+            valor = getattr(funcionario, campo)
+            if not valor:
+                continue
+            chave = _chave(campo, valor)
+            if chave in donos:
+                resultado.erro(indice, campo, f'{campo.capitalize()} repetido no lote (item {donos[chave]}).')
+            else:
+                donos[chave] = indice
+        if not donos:
+            continue
+        queryset = Funcionario.objects.filter(ativo=True).exclude(pk__in=ignorar)
+        coluna = campo
+        if campo == 'email':
+            queryset = queryset.annotate(email_minusculo=Lower('email'))
+            coluna = 'email_minusculo'
+        for valor in queryset.filter(**{f'{coluna}__in': donos}).values_list(coluna, flat=True):
+            resultado.erro(donos[valor], campo, MENSAGENS_UNICIDADE[campo])
+
+
+def _planejar(finais, anteriores, resultado):
+    """
+    Separa o lote em novos e alterados (inalterados já vão para o
+    resultado) e calcula o que precisa ser liberado antes da gravação
+    """
+    plano = {
+        'novos': [], 'alterados': [], 'campos': set(), 'desativados': [],
+        'liberar': {campo: [] for campo in CAMPOS_UNICOS},
+    }
+    for indice, funcionario in finais.items():
+        if funcionario.pk is None:
+            plano['novos'].append((indice, funcionario))
+            continue
+        antes = anteriores[indice]
+        mudados = {campo for campo in CAMPOS if getattr(funcionario, campo) != antes[campo]}
+        if not mudados:
+            resultado.itens[indice].update(id=funcionario.pk, operacao='inalterado')
+            continue
+        plano['campos'] |= mudados
+        plano['alterados'].append((indice, funcionario))
+        if antes['ativo'] and not funcionario.ativo:
+            plano['desativados'].append(funcionario.pk)
+        for campo in CAMPOS_UNICOS:
+            if campo in mudados and antes[campo]:
+                plano['liberar'][campo].append(funcionario.pk)
+    return plano
+
+
+def _gravar(plano):
+    """Grava o lote já validado"""
+    novos = [funcionario for _, funcionario in plano['novos']]
+    alterados = [funcionario for _, funcionario in plano['alterados']]
+
+    # As restrições de unicidade são verificadas linha a linha: primeiro
+    # liberam-se os ramais/e-mails que mudam de dono, depois os valores finais
+    if plano['desativados']:
+        Funcionario.objects.filter(pk__in=plano['desativados']).update(ativo=False)
+    for campo, pks in plano['liberar'].items():
+        if pks:
+            Funcionario.objects.filter(pk__in=pks).update(**{campo: None})
+    if alterados:
+        Funcionario.objects.bulk_update(alterados, sorted(plano['campos']), batch_size=TAMANHO_LOTE)
+    criados = Funcionario.objects.bulk_create(novos, batch_size=TAMANHO_LOTE)
+
+    operacoes = {}
+    for funcionario in alterados:
+        operacao = alteracoes.operacao_ao_salvar(funcionario, created=False)
+        operacoes.setdefault(operacao, []).append(funcionario.pk)
+
+    # bulk_create/bulk_update/update não disparam signals
+    search.reindexar([funcionario.pk for funcionario in [*criados, *alterados]])
+    alteracoes.registrar(Funcionario, [funcionario.pk for funcionario in criados], alteracoes.CRIADO)
+    for operacao, pks in operacoes.items():
+        alteracoes.registrar(Funcionario, pks, operacao)
+    if criados or alterados:
+        versao.incrementar_versao()
+
+
+def _validar_e_gravar(itens):
+    """
+    Valida, planeja e grava o lote (dentro de executar_escrita, que pode
+    repeti-la: tudo é refeito a partir dos itens)
+    """
+    resultado = ResultadoLote(len(itens))
+    validos = _validar_itens(itens, resultado)
+    _resolver_cadastros(validos, resultado)
+    for indice in resultado.erros:
+        validos.pop(indice, None)
+    finais, anteriores = _estados_finais(validos, resultado)
+    _verificar_unicidade(finais, resultado)
+    if not resultado.valido:
+        return resultado
+
+    plano = _planejar(finais, anteriores, resultado)
+    _gravar(plano)
+    for indice, funcionario in plano['novos']:
+        resultado.itens[indice].update(id=funcionario.pk, operacao='criado')
+    for indice, funcionario in plano['alterados']:
+        resultado.itens[indice].update(
+            id=funcionario.pk, operacao='atualizado' if funcionario.ativo else 'desativado'
+        )
+    return resultado
+
+
+def aplicar(itens):
+    """
+    Valida e grava o lote. Retorna o ResultadoLote: com erros, nada foi
+    gravado e ``erros`` tem as mensagens por índice do item.
+    """
+    try:
+        return banco.executar_escrita(_validar_e_gravar, itens)
+    except IntegrityError:
+        # Salvaguarda: a restrição de unicidade barrou um ramal/e-mail que
+        # a validação viu livre. Nada foi gravado; o cliente pode reenviar
+        resultado = ResultadoLote(len(itens))
+        for indice, item in enumerate(itens):
+            for campo in CAMPOS_UNICOS:
+                if isinstance(item, dict) and item.get(campo):
+                    resultado.erro(indice, campo, MENSAGEM_CONCORRENCIA)
+        if resultado.valido:
+            raise
+        return resultado
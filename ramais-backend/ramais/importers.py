@@ -0,0 +1,474 @@
+"""
+Motor de importação em lote do diretório de funcionários.
+
+Recebe um iterável de pessoas no formato produzido pelo comando
+``import_initial_data`` (chaves ``Nome``, ``Ramal``, ``Email``, ``Whatsapp``,
+``Teams``, ``Departamento``, ``Funcao`` e ``Unidade``) e grava tudo com
+operações em conjunto: os nomes de departamentos, funções e unidades são
+resolvidos uma vez em mapas em memória, os cadastros que faltam são criados com
+``bulk_create`` e os funcionários são inseridos/atualizados em lotes.
+"""
+import hashlib
+import time
+from itertools import islice
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import alteracoes, search, versao
+from .models import Departamento, Funcao, Unidade, Funcionario
+
+# Campos do funcionário comparados/gravados pela importação
+CAMPOS_FUNCIONARIO = (
+    'ramal', 'email', 'whatsapp', 'teams',
+    'departamento_id', 'funcao_id', 'unidade_id', 'ativo',
+)
+
+# Únicos entre os funcionários ativos (restrições do banco)
+CAMPOS_UNICOS = ('ramal', 'email')
+
+MAX_ERROS_REGISTRADOS = 20
+
+# Chave do dicionário de entrada -> modelo do cadastro
+CADASTROS = (
+    ('Departamento', Departamento),
+    ('Funcao', Funcao),
+    ('Unidade', Unidade),
+)
+
+
+class ResultadoImportacao:
+    """Contadores de uma importação"""
+
+    def __init__(self):
+        self.lidos = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.inalterados = 0
+        self.duplicados = 0
+        self.desativados = 0
+        self.vinculados = 0
+        self.invalidos = 0
+        self.cadastros_criados = 0
+        self.conflitos = 0
+        # Primeiros erros de validação: (número da linha, mensagem)
+        self.erros = []
+        # Primeiros conflitos de ramal/e-mail: (nome, mensagem)
+        self.avisos = []
+        # Primeiras alterações aplicadas: (operação, nome)
+        self.alteracoes = []
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def registrar_invalido(self, linha, mensagem):
+        self.invalidos += 1
+        if len(self.erros) < MAX_ERROS_REGISTRADOS:
+            self.erros.append((linha, mensagem))
+
+    def registrar_conflito(self, nome, mensagem):
+        self.conflitos += 1
+        if len(self.avisos) < MAX_ERROS_REGISTRADOS:
+            self.avisos.append((nome, mensagem))
+
+    def registrar_alteracao(self, operacao, nome):
+        if len(self.alteracoes) < MAX_ERROS_REGISTRADOS:
+            self.alteracoes.append((operacao, nome))
+
+    def finalizar(self):
+        self.fim = time.perf_counter()
+
+    @property
+    def duracao(self):
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidos / self.duracao if self.duracao else 0.0
+
+
+def lotes(iteravel, tamanho):
+    """Agrupa um iterável em listas de até ``tamanho`` itens"""
+    iterador = iter(iteravel)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+class ImportadorDiretorio:
+    """
+    Importa pessoas para o diretório usando operações em lote.
+
+    O funcionário é identificado pelo nome, como no comando original. Deve ser
+    executado dentro de uma transação; o rollback do dry-run fica a cargo de
+    quem chama.
+    """
+
+    def __init__(self, batch_size=500, progresso=None):
+        self.batch_size = batch_size
+        self.progresso = progresso
+        self.resultado = ResultadoImportacao()
+        # nome -> id, por modelo de cadastro
+        self._mapas = {model: {} for _, model in CADASTROS}
+
+    def importar(self, pessoas):
+        """Processa todas as pessoas e retorna o ResultadoImportacao"""
+        for lote in lotes(pessoas, self.batch_size):
+            self._importar_lote(lote)
+            if self.progresso:
+                self.progresso(self.resultado)
+
+        self.resultado.finalizar()
+        return self.resultado
+
+    def _resolver_cadastros(self, lote):
+        """Garante que todos os cadastros citados no lote existem nos mapas"""
+        for chave, model in CADASTROS:
+            mapa = self._mapas[model]
+            nomes = {p[chave] for p in lote if p.get(chave)} - mapa.keys()
+            if not nomes:
+                continue
+            mapa.update(
+                model.objects.filter(nome__in=nomes).values_list('nome', 'id')
+            )
+            faltando = nomes - mapa.keys()
+            if faltando:
+                model.objects.bulk_create(
+                    [model(nome=nome, ativo=True) for nome in sorted(faltando)]
+                )
+                versao.incrementar_versao()
+                mapa.update(
+                    model.objects.filter(nome__in=faltando).values_list('nome', 'id')
+                )
+                alteracoes.registrar(
+                    model, [mapa[nome] for nome in sorted(faltando)], alteracoes.CRIADO
+                )
+                self.resultado.cadastros_criados += len(faltando)
+
+    def _valores(self, pessoa):
+        """Valores do funcionário para uma pessoa da entrada"""
+        def cadastro_id(chave, model):
+            nome = pessoa.get(chave)
+            return self._mapas[model][nome] if nome else None
+
+        return {
+            'ramal': pessoa.get('Ramal') or None,
+            'email': pessoa.get('Email') or None,
+            'whatsapp': pessoa.get('Whatsapp'),
+            'teams': pessoa.get('Teams'),
+            'departamento_id': cadastro_id('Departamento', Departamento),
+            'funcao_id': cadastro_id('Funcao', Funcao),
+            'unidade_id': cadastro_id('Unidade', Unidade),
+            'ativo': True,
+        }
+
+    def _resolver_conflitos(self, itens):
+        """
+        Limpa ramal/e-mail que já pertencem a outro funcionário ativo (no banco
+        ou antes no mesmo lote), registrando o conflito em vez de deixar a
+        restrição de unicidade abortar a importação inteira.
+
+        ``itens`` é uma lista de (pk ou None, nome, valores); os valores são
+        alterados no lugar. Funcionários já existentes têm preferência sobre
+        os novos. Retorna o conjunto de posições dos itens alterados.
+        """
+        pks = {pk for pk, _, _ in itens if pk}
+        ordem = sorted(range(len(itens)), key=lambda posicao: itens[posicao][0] is None)
+        alterados = set()
+        for campo in CAMPOS_UNICOS:
+            def chave(valor):
+                return valor.lower() if campo == 'email' else valor
+
+            pedidos = {
+                chave(valores[campo]) for _, _, valores in itens
+                if valores['ativo'] and valores[campo]
+            }
+            if not pedidos:
+                continue
+            ocupados = dict(self._ocupados(campo, pedidos, pks))
+            for posicao in ordem:
+                _, nome, valores = itens[posicao]
+                valor = valores[campo]
+                if not valores['ativo'] or not valor:
+                    continue
+                dono = ocupados.setdefault(chave(valor), nome)
+                if dono != nome:
+                    valores[campo] = None
+                    alterados.add(posicao)
+                    self.resultado.registrar_conflito(
+                        nome, f'{campo} {valor} já pertence a {dono}; campo deixado em branco'
+                    )
+        return alterados
+
+    @staticmethod
+    def _ocupados(campo, valores, ignorar):
+        """(valor, nome) dos funcionários ativos fora do lote que já usam os valores"""
+        queryset = Funcionario.objects.filter(ativo=True).exclude(pk__in=ignorar)
+        if campo == 'email':
+            queryset = queryset.annotate(email_minusculo=Lower('email'))
+            campo = 'email_minusculo'
+        return queryset.filter(**{f'{campo}__in': valores}).values_list(campo, 'nome')
+
+    def _importar_lote(self, lote):
+        self.resultado.lidos += len(lote)
+
+        # Nome repetido dentro do lote: a última linha prevalece
+        por_nome = {p['Nome']: p for p in lote}
+        self.resultado.duplicados += len(lote) - len(por_nome)
+        lote = list(por_nome.values())
+        self._resolver_cadastros(lote)
+
+        # Lotes anteriores já estão gravados (na mesma transação), então a
+        # consulta também encontra os funcionários criados por eles
+        existentes = {}
+        nomes = {p['Nome'] for p in lote}
+        for funcionario in Funcionario.objects.filter(nome__in=nomes).order_by('pk'):
+            existentes.setdefault(funcionario.nome, funcionario)
+
+        itens = []
+        for pessoa in lote:
+            funcionario = existentes.get(pessoa['Nome'])
+            itens.append((funcionario and funcionario.pk, pessoa['Nome'], self._valores(pessoa)))
+        self._resolver_conflitos(itens)
+
+        novos = []
+        alterados = {}
+        for _, nome, valores in itens:
+            funcionario = existentes.get(nome)
+
+            if funcionario is None:
+                novos.append(Funcionario(nome=nome, **valores))
+                self.resultado.criados += 1
+                continue
+
+            if all(getattr(funcionario, campo) == valor for campo, valor in valores.items()):
+                self.resultado.inalterados += 1
+                continue
+
+            for campo, valor in valores.items():
+                setattr(funcionario, campo, valor)
+            alterados[funcionario.pk] = funcionario
+            self.resultado.atualizados += 1
+
+        criados = Funcionario.objects.bulk_create(novos, batch_size=self.batch_size)
+        Funcionario.objects.bulk_update(
+            alterados.values(), CAMPOS_FUNCIONARIO, batch_size=self.batch_size
+        )
+
+        # bulk_create/bulk_update não disparam signals
+        search.reindexar([f.pk for f in [*criados, *alterados.values()]])
+        alteracoes.registrar(Funcionario, [f.pk for f in criados], alteracoes.CRIADO)
+        alteracoes.registrar(Funcionario, alterados, alteracoes.ATUALIZADO)
+        if criados or alterados:
+            versao.incrementar_versao()
+
+
+# Campos da entrada que compõem a assinatura de uma pessoa
+CAMPOS_ASSINATURA = (
+    'Nome', 'Ramal', 'Email', 'Whatsapp', 'Teams',
+    'Departamento', 'Funcao', 'Unidade',
+)
+
+
+def calcular_assinatura(pessoa):
+    """Hash SHA-256 do conteúdo de uma pessoa da exportação"""
+    conteudo = '\x1f'.join(pessoa.get(campo) or '' for campo in CAMPOS_ASSINATURA)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def conflitos_unicidade(funcionarios):
+    """
+    Ramais/e-mails repetidos entre os ativos de ``funcionarios`` (queryset,
+    também de um model histórico de migration): lista de
+    (campo, valor, [(pk, nome), ...]), o cadastro mais antigo primeiro
+    """
+    conflitos = []
+    for campo in CAMPOS_UNICOS:
+        donos = {}
+        linhas = funcionarios.filter(
+            ativo=True, **{f'{campo}__isnull': False}
+        ).exclude(**{campo: ''}).order_by('pk').values_list('pk', 'nome', campo)
+        for pk, nome, valor in linhas:
+            chave = valor.lower() if campo == 'email' else valor
+            donos.setdefault(chave, (valor, []))[1].append((pk, nome))
+        conflitos.extend(
+            (campo, valor, cadastros) for valor, cadastros in donos.values() if len(cadastros) > 1
+        )
+    return conflitos
+
+
+def formatar_conflito(campo, valor, cadastros):
+    nomes = ', '.join(f'{nome} (id {pk})' for pk, nome in cadastros)
+    return f'  {campo} {valor}: {nomes}'
+
+
+class SincronizadorDiretorio(ImportadorDiretorio):
+    """
+    Sincronização incremental a partir da exportação do RH/AD.
+
+    A pessoa é identificada pelo ``id_externo`` e cada linha gera uma
+    assinatura (hash do conteúdo). Só são gravados os funcionários cuja
+    assinatura mudou; quem não aparece na exportação é desativado
+    (``ativo=False``). Uma sincronização sem mudanças não faz nenhuma escrita.
+
+    Funcionários ativos ainda sem ``id_externo`` (do ``import_initial_data``
+    ou cadastrados à mão) são vinculados à pessoa da exportação com o mesmo
+    e-mail ou, na falta dele, o mesmo nome, em vez de duplicados.
+    """
+
+    def __init__(self, batch_size=500, progresso=None, desativar_ausentes=True):
+        super().__init__(batch_size=batch_size, progresso=progresso)
+        self.desativar_ausentes = desativar_ausentes
+        self._vistos = set()
+
+    def importar(self, pessoas):
+        for lote in lotes(pessoas, self.batch_size):
+            self._sincronizar_lote(lote)
+            if self.progresso:
+                self.progresso(self.resultado)
+
+        if self.desativar_ausentes:
+            if not self._vistos:
+                raise ValueError(
+                    'A exportação não tem nenhuma pessoa válida; '
+                    'nada foi desativado por segurança.'
+                )
+            self._desativar_ausentes()
+
+        self.resultado.finalizar()
+        return self.resultado
+
+    def _sincronizar_lote(self, lote):
+        self.resultado.lidos += len(lote)
+
+        por_id = {p['IdExterno']: p for p in lote}
+        self.resultado.duplicados += len(lote) - len(por_id)
+        self._vistos.update(por_id)
+
+        existentes = {
+            id_externo: (pk, assinatura, ativo)
+            for id_externo, pk, assinatura, ativo in Funcionario.objects.filter(
+                id_externo__in=por_id
+            ).values_list('id_externo', 'pk', 'assinatura', 'ativo')
+        }
+        vinculados = self._vincular_sem_id(
+            [pessoa for id_externo, pessoa in por_id.items() if id_externo not in existentes]
+        )
+        existentes.update(vinculados)
+
+        pendentes = []
+        for id_externo, pessoa in por_id.items():
+            assinatura = calcular_assinatura(pessoa)
+            existente = existentes.get(id_externo)
+            if existente and existente[1] == assinatura and existente[2]:
+                self.resultado.inalterados += 1
+            else:
+                pendentes.append((pessoa, assinatura, existente))
+
+        if not pendentes:
+            return
+
+        self._resolver_cadastros([pessoa for pessoa, _, _ in pendentes])
+        itens = [
+            (existente[0] if existente else None, pessoa['Nome'], self._valores(pessoa))
+            for pessoa, _, existente in pendentes
+        ]
+        conflitantes = self._resolver_conflitos(itens)
+
+        novos = []
+        alterados = []
+        for posicao, (pessoa, assinatura, existente) in enumerate(pendentes):
+            funcionario = Funcionario(
+                pk=existente[0] if existente else None,
+                id_externo=pessoa['IdExterno'],
+                nome=pessoa['Nome'],
+                # Com conflito a linha é reaplicada na próxima sincronização
+                assinatura='' if posicao in conflitantes else assinatura,
+                **itens[posicao][2]
+            )
+            if funcionario.id_externo in vinculados:
+                alterados.append(funcionario)
+                self.resultado.atualizados += 1
+                self.resultado.vinculados += 1
+                self.resultado.registrar_alteracao('vinculado', funcionario.nome)
+            elif existente:
+                alterados.append(funcionario)
+                self.resultado.atualizados += 1
+                self.resultado.registrar_alteracao('atualizado', funcionario.nome)
+            else:
+                novos.append(funcionario)
+                self.resultado.criados += 1
+                self.resultado.registrar_alteracao('criado', funcionario.nome)
+
+        criados = Funcionario.objects.bulk_create(novos, batch_size=self.batch_size)
+        Funcionario.objects.bulk_update(
+            alterados, ('id_externo', 'nome', 'assinatura', *CAMPOS_FUNCIONARIO),
+            batch_size=self.batch_size
+        )
+        search.reindexar([f.pk for f in [*criados, *alterados]])
+        alteracoes.registrar(Funcionario, [f.pk for f in criados], alteracoes.CRIADO)
+        alteracoes.registrar(Funcionario, [f.pk for f in alterados], alteracoes.ATUALIZADO)
+        versao.incrementar_versao()
+
+    def _vincular_sem_id(self, pessoas):
+        """
+        Funcionários ativos sem ``id_externo`` que correspondem a pessoas ainda
+        não vinculadas: primeiro pelo e-mail (sem diferenciar maiúsculas),
+        depois pelo nome exato, desde que os dois lados não tenham e-mails
+        diferentes. Retorna {id_externo: (pk, assinatura, ativo)} como os
+        existentes, com assinatura vazia para que a linha seja regravada.
+        """
+        if not pessoas:
+            return {}
+        emails = {pessoa['Email'].lower() for pessoa in pessoas if pessoa.get('Email')}
+        candidatos = list(
+            Funcionario.objects.filter(ativo=True, id_externo__isnull=True)
+            .annotate(email_minusculo=Lower('email'))
+            .filter(Q(email_minusculo__in=emails) | Q(nome__in={pessoa['Nome'] for pessoa in pessoas}))
+            .order_by('pk')
+            .values_list('pk', 'nome', 'email_minusculo')
+        )
+        if not candidatos:
+            return {}
+
+        por_email = {email: pk for pk, _, email in reversed(candidatos) if email}
+        por_nome = {}
+        for pk, nome, email in candidatos:
+            por_nome.setdefault(nome, []).append((pk, email))
+
+        vinculados = {}
+        usados = set()
+        for pessoa in pessoas:
+            email = (pessoa.get('Email') or '').lower()
+            pk = por_email.get(email) if email else None
+            if pk in usados:
+                pk = None
+            if pk is None:
+                pk = next((
+                    candidato for candidato, email_candidato in por_nome.get(pessoa['Nome'], ())
+                    if candidato not in usados and not (email and email_candidato and email_candidato != email)
+                ), None)
+            if pk is not None:
+                usados.add(pk)
+                vinculados[pessoa['IdExterno']] = (pk, '', True)
+        return vinculados
+
+    def _desativar_ausentes(self):
+        """Desativa funcionários sincronizados que sumiram da exportação"""
+        ausentes = [
+            (pk, nome)
+            for pk, nome, id_externo in Funcionario.objects.filter(
+                ativo=True, id_externo__isnull=False
+            ).values_list('pk', 'nome', 'id_externo').iterator()
+            if id_externo not in self._vistos
+        ]
+        for parte in lotes(ausentes, self.batch_size):
+            ids = [pk for pk, _ in parte]
+            Funcionario.objects.filter(pk__in=ids).update(ativo=False)
+            alteracoes.registrar(Funcionario, ids, alteracoes.DESATIVADO)
+            for _, nome in parte:
+                self.resultado.registrar_alteracao('desativado', nome)
+        self.resultado.desativados = len(ausentes)
+        if ausentes:
+            versao.incrementar_versao()
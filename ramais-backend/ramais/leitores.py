@@ -0,0 +1,390 @@
+"""
+Leitores em streaming para importação do diretório.
+
+Cada leitor é um gerador que devolve uma pessoa por vez (dicionário com as
+chaves usadas pelo ImportadorDiretorio), sem carregar o arquivo inteiro em
+memória. O pipeline completo é::
+
+    ler_arquivo(caminho) -> normalizar -> validar -> ImportadorDiretorio
+"""
+import base64
+import csv
+import os
+import re
+import unicodedata
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from .models import Funcionario
+
+FORMATOS = ('csv', 'xlsx', 'sql', 'ldif')
+
+# Nome de coluna (sem acento, minúsculo) -> chave da pessoa
+COLUNAS = {
+    'nome': 'Nome',
+    'ramal': 'Ramal',
+    'email': 'Email',
+    'e-mail': 'Email',
+    'whatsapp': 'Whatsapp',
+    'celular': 'Whatsapp',
+    'teams': 'Teams',
+    'skype': 'Teams',
+    'departamento': 'Departamento',
+    'funcao': 'Funcao',
+    'cargo': 'Funcao',
+    'unidade': 'Unidade',
+    'id': 'IdExterno',
+    'id_externo': 'IdExterno',
+    'matricula': 'IdExterno',
+}
+
+# Tamanho máximo de cada campo, conforme o modelo Funcionario
+TAMANHOS = {
+    'Nome': Funcionario._meta.get_field('nome').max_length,
+    'Ramal': Funcionario._meta.get_field('ramal').max_length,
+    'Email': Funcionario._meta.get_field('email').max_length,
+    'Whatsapp': Funcionario._meta.get_field('whatsapp').max_length,
+    'Teams': Funcionario._meta.get_field('teams').max_length,
+    'Departamento': 100,
+    'Funcao': 100,
+    'Unidade': 100,
+    'IdExterno': Funcionario._meta.get_field('id_externo').max_length,
+}
+
+# Atributos do Active Directory -> coluna equivalente, em ordem de preferência
+ATRIBUTOS_LDAP = {
+    'nome': ('displayname', 'cn'),
+    'ramal': ('ipphone', 'telephonenumber'),
+    'email': ('mail',),
+    'whatsapp': ('mobile',),
+    'teams': ('userprincipalname',),
+    'departamento': ('department',),
+    'funcao': ('title',),
+    'unidade': ('company', 'physicaldeliveryofficename'),
+    'id_externo': ('objectguid', 'employeeid', 'samaccountname', 'dn'),
+}
+
+# Textos UTF-8 lidos como latin-1 (mojibake) -> caractere correto
+SUBSTITUICOES_ENCODING = {
+    'Ã¡': 'á', 'Ã£': 'ã', 'Ã§': 'ç', 'Ã©': 'é', 'Ã­': 'í',
+    'Ã³': 'ó', 'Ãº': 'ú', 'Ã ': 'à', 'Ãª': 'ê', 'Ã´': 'ô'
+}
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def corrigir_encoding(texto):
+    """Corrige problemas de encoding (mojibake) em um texto"""
+    if not texto:
+        return None
+    if 'Ã' not in texto:
+        return texto
+    for antigo, novo in SUBSTITUICOES_ENCODING.items():
+        texto = texto.replace(antigo, novo)
+    return texto
+
+
+def _chave_coluna(nome):
+    """Nome de coluna normalizado (sem acentos, minúsculo, sem espaços)"""
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    return nome.strip().strip('`"').lower()
+
+
+def detectar_formato(caminho):
+    """Formato do arquivo a partir da extensão"""
+    extensao = os.path.splitext(caminho)[1].lower().lstrip('.')
+    if extensao == 'xls':
+        raise ValueError('Arquivos .xls não são suportados; salve como .xlsx ou .csv')
+    if extensao not in FORMATOS:
+        raise ValueError(f'Formato não reconhecido: {caminho} (use {", ".join(FORMATOS)})')
+    return extensao
+
+
+def ler_csv(caminho):
+    """Lê um CSV (separador detectado automaticamente) linha a linha"""
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        amostra = arquivo.read(TAMANHO_BLOCO)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t|')
+        except csv.Error:
+            dialeto = csv.excel
+        yield from csv.DictReader(arquivo, dialect=dialeto)
+
+
+def ler_xlsx(caminho):
+    """Lê a primeira planilha de um XLSX em modo read-only (streaming)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('A leitura de XLSX requer o pacote openpyxl (pip install openpyxl)')
+
+    planilha = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if not cabecalho:
+            return
+        for linha in linhas:
+            if not any(valor is not None for valor in linha):
+                continue
+            yield {
+                coluna: '' if valor is None else str(valor)
+                for coluna, valor in zip(cabecalho, linha)
+            }
+    finally:
+        planilha.close()
+
+
+_TOKEN_SQL = re.compile(r"""
+      (?P<espaco>\s+)
+    | (?P<comentario>--[^\n]*\n|\#[^\n]*\n|/\*.*?\*/)
+    | '(?P<str>(?:[^'\\]|\\.|'')*)'
+    | `(?P<id>[^`]*)`
+    | "(?P<id_aspas>[^"]*)"
+    | (?P<simbolo>[(),;])
+    | (?P<palavra>[^\s(),;'"`]+)
+""", re.VERBOSE | re.DOTALL)
+
+_ESCAPE_SQL = re.compile(r"\\(.)|''", re.DOTALL)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', 'Z': '\x1a'}
+
+
+def _desescapar(texto):
+    """Remove os escapes de um literal de string do MySQL"""
+    if '\\' not in texto and "''" not in texto:
+        return texto
+
+    def substituir(match):
+        if match.group(1) is None:
+            return "'"
+        return _ESCAPES.get(match.group(1), match.group(1))
+
+    return _ESCAPE_SQL.sub(substituir, texto)
+
+
+def _tokens_sql(arquivo):
+    """
+    Tokenizador mínimo de SQL para dumps MySQL, lendo o arquivo em blocos.
+
+    Gera tuplas (tipo, valor) com tipo 'str' (literal entre aspas simples),
+    'id' (identificador entre crases/aspas), 'palavra' (palavras-chave,
+    números, NULL) ou 'simbolo' (parênteses, vírgula, ponto e vírgula).
+    Espaços e comentários são ignorados.
+    """
+    buffer = ''
+    posicao = 0
+    fim_arquivo = False
+
+    while True:
+        match = _TOKEN_SQL.match(buffer, posicao)
+        # Token incompleto no fim do bloco: ler mais antes de decidir
+        if (match is None or match.end() == len(buffer)) and not fim_arquivo:
+            bloco = arquivo.read(TAMANHO_BLOCO)
+            fim_arquivo = not bloco
+            buffer = buffer[posicao:] + bloco
+            posicao = 0
+            continue
+        if match is None:
+            if posicao >= len(buffer):
+                return
+            posicao += 1  # caractere inesperado (ex.: aspa sem fechamento)
+            continue
+
+        posicao = match.end()
+        tipo = match.lastgroup
+        if tipo in ('espaco', 'comentario'):
+            continue
+        if tipo == 'str':
+            yield 'str', _desescapar(match.group('str'))
+        elif tipo == 'id_aspas':
+            yield 'id', match.group('id_aspas')
+        else:
+            yield tipo, match.group(tipo)
+
+
+def ler_dump_mysql_stream(arquivo, tabela='pessoas'):
+    """
+    Lê os INSERTs de uma tabela a partir de um dump MySQL já aberto.
+
+    Guarda em memória apenas a tupla atual; INSERTs de outras tabelas e demais
+    comandos do dump são ignorados.
+    """
+    tokens = _tokens_sql(arquivo)
+    for tipo, valor in tokens:
+        if tipo != 'palavra' or valor.upper() != 'INSERT':
+            continue
+        tipo, valor = next(tokens, (None, None))
+        if tipo == 'palavra' and valor.upper() == 'INTO':
+            tipo, valor = next(tokens, (None, None))
+        if valor != tabela:
+            continue
+
+        # Lista de colunas opcional seguida de VALUES
+        colunas = []
+        for tipo, valor in tokens:
+            if tipo == 'palavra' and valor.upper() == 'VALUES':
+                break
+            if tipo in ('id', 'palavra'):
+                colunas.append(valor)
+
+        # Tuplas até o ponto e vírgula
+        tupla = None
+        for tipo, valor in tokens:
+            if (tipo, valor) == ('simbolo', ';'):
+                break
+            if (tipo, valor) == ('simbolo', '('):
+                tupla = []
+            elif (tipo, valor) == ('simbolo', ')'):
+                if tupla is not None:
+                    yield dict(zip(colunas, tupla)) if colunas else dict(enumerate(tupla))
+                tupla = None
+            elif tupla is not None and tipo != 'simbolo':
+                if tipo == 'palavra' and valor.upper() == 'NULL':
+                    valor = None
+                tupla.append(valor)
+
+
+def ler_dump_mysql(caminho, tabela='pessoas'):
+    """Lê os INSERTs da tabela informada de um arquivo de dump MySQL"""
+    with open(caminho, encoding='utf-8', errors='replace') as arquivo:
+        yield from ler_dump_mysql_stream(arquivo, tabela)
+
+
+def _registros_ldif(arquivo):
+    """Agrupa as linhas de um LDIF em registros {atributo: [valores]}"""
+    registro = {}
+    anterior = None
+
+    def adicionar(linha):
+        if ':' not in linha:
+            return
+        atributo, valor = linha.split(':', 1)
+        if valor.startswith(':'):
+            # Valor em base64 (atributo:: valor)
+            valor = base64.b64decode(valor[1:].strip())
+            if atributo.lower() != 'objectguid':
+                valor = valor.decode('utf-8', errors='replace')
+        else:
+            valor = valor.strip()
+        registro.setdefault(atributo.lower(), []).append(valor)
+
+    for linha in arquivo:
+        linha = linha.rstrip('\r\n')
+        if linha.startswith(' ') and anterior is not None:
+            anterior += linha[1:]  # continuação da linha anterior
+            continue
+        if anterior is not None:
+            adicionar(anterior)
+            anterior = None
+        if not linha:
+            if registro:
+                yield registro
+            registro = {}
+        elif not linha.startswith('#'):
+            anterior = linha
+
+    if anterior is not None:
+        adicionar(anterior)
+    if registro:
+        yield registro
+
+
+def ler_ldif(caminho):
+    """
+    Lê pessoas de uma exportação LDIF do Active Directory.
+
+    Apenas registros com objectClass user/person são considerados. O
+    objectGUID (binário) é convertido para o formato textual de UUID.
+    """
+    with open(caminho, encoding='utf-8', errors='replace') as arquivo:
+        for registro in _registros_ldif(arquivo):
+            classes = {str(c).lower() for c in registro.get('objectclass', [])}
+            if classes and not classes & {'user', 'person', 'inetorgperson'}:
+                continue
+
+            linha = {}
+            for coluna, atributos in ATRIBUTOS_LDAP.items():
+                for atributo in atributos:
+                    valores = registro.get(atributo)
+                    if not valores:
+                        continue
+                    valor = valores[0]
+                    if isinstance(valor, bytes):
+                        valor = str(uuid.UUID(bytes_le=valor)) if len(valor) == 16 else valor.hex()
+                    linha[coluna] = valor
+                    break
+                else:
+                    linha[coluna] = None
+            yield linha
+
+
+def ler_arquivo(caminho, formato=None, tabela='pessoas'):
+    """Escolhe o leitor conforme o formato (ou a extensão do arquivo)"""
+    formato = formato or detectar_formato(caminho)
+    if formato == 'sql':
+        return ler_dump_mysql(caminho, tabela)
+    leitores = {'csv': ler_csv, 'xlsx': ler_xlsx, 'ldif': ler_ldif}
+    return leitores[formato](caminho)
+
+
+def normalizar(linhas):
+    """Mapeia as colunas para as chaves da pessoa e corrige o encoding"""
+    mapas = {}
+    for linha in linhas:
+        colunas = tuple(linha)
+        mapa = mapas.get(colunas)
+        if mapa is None:
+            mapa = mapas[colunas] = {
+                coluna: COLUNAS[_chave_coluna(coluna)]
+                for coluna in colunas
+                if _chave_coluna(coluna) in COLUNAS
+            }
+        pessoa = dict.fromkeys(TAMANHOS)
+        for coluna, chave in mapa.items():
+            valor = linha.get(coluna)
+            valor = corrigir_encoding(str(valor).strip()) if valor is not None else None
+            pessoa[chave] = valor or None
+        yield pessoa
+
+
+def validar(pessoas, resultado, exigir_id_externo=False):
+    """
+    Descarta linhas inválidas, contando-as em ``resultado.invalidos``.
+
+    E-mails malformados são descartados (o funcionário é importado sem e-mail).
+    """
+    for numero, pessoa in enumerate(pessoas, start=1):
+        erro = None
+        if not pessoa.get('Nome'):
+            erro = 'nome vazio'
+        elif exigir_id_externo and not pessoa.get('IdExterno'):
+            erro = 'sem identificador externo'
+        else:
+            for chave, tamanho in TAMANHOS.items():
+                if pessoa.get(chave) and len(pessoa[chave]) > tamanho:
+                    erro = f'{chave} maior que {tamanho} caracteres'
+                    break
+
+        if erro:
+            resultado.registrar_invalido(numero, erro)
+            continue
+
+        if pessoa.get('Email'):
+            try:
+                validate_email(pessoa['Email'])
+            except ValidationError:
+                pessoa['Email'] = None
+        yield pessoa
+
+
+def com_progresso(iteravel, a_cada, callback):
+    """Chama ``callback(n)`` a cada ``a_cada`` itens consumidos"""
+    total = 0
+    for item in iteravel:
+        total += 1
+        if a_cada and total % a_cada == 0:
+            callback(total)
+        yield item
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ramais import replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia o banco principal para a réplica de leitura (RAMAIS_DB_REPLICA) '
+        'com a API de backup do SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=0,
+            help='Repete a cada N segundos (0: copia uma vez e termina)',
+        )
+        parser.add_argument(
+            '--forcar',
+            action='store_true',
+            help='Copia mesmo que a réplica já esteja na versão do principal',
+        )
+
+    def handle(self, *args, **options):
+        if not replica.configurada():
+            raise CommandError('Réplica não configurada: defina RAMAIS_DB_REPLICA.')
+        for alias in ('default', replica.ALIAS_REPLICA):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'O banco "{alias}" não é SQLite; use a replicação do próprio banco.')
+
+        while True:
+            copiou, versao, segundos = replica.atualizar_replica(forcar=options['forcar'])
+            if copiou:
+                self.stdout.write(
+                    f'Réplica atualizada para a versão {versao} em {segundos:.2f}s '
+                    f'({settings.DATABASES[replica.ALIAS_REPLICA]["NAME"]})'
+                )
+            elif options['verbosity'] > 1 or not options['intervalo']:
+                self.stdout.write(f'Réplica já está na versão {versao}.')
+            if not options['intervalo']:
+                break
+            # Conexões não ficam abertas entre as cópias
+            connections.close_all()
+            time.sleep(options['intervalo'])
@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ramais import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Executa benchmarks do diretório em um banco de testes descartável'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suites',
+            nargs='*',
+            help=f'Suítes a executar ({", ".join(benchmarks.SUITES)}). Padrão: todas',
+        )
+        parser.add_argument(
+            '--tamanhos',
+            default='100,1000,10000,100000',
+            help='Quantidades de funcionários, separadas por vírgula',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=50,
+            help='Repetições por medição',
+        )
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or list(benchmarks.SUITES)
+        desconhecidas = set(suites) - set(benchmarks.SUITES)
+        if desconhecidas:
+            raise CommandError(f'Suíte(s) desconhecida(s): {", ".join(sorted(desconhecidas))}')
+
+        try:
+            tamanhos = sorted(int(t) for t in options['tamanhos'].split(','))
+        except ValueError:
+            raise CommandError('--tamanhos deve ser uma lista de inteiros')
+
+        # Nunca rodar sobre o banco real: criar um banco de testes temporário
+        nome_original = connection.settings_dict['NAME']
+        diretorio = None
+        if connection.vendor == 'sqlite' and benchmarks.SUITES_EM_ARQUIVO & set(suites):
+            # Em arquivo, para haver concorrência real entre conexões
+            diretorio = tempfile.TemporaryDirectory()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(diretorio.name, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for nome in suites:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {nome} =='))
+                benchmarks.SUITES[nome](
+                    tamanhos, options['repeticoes'], self.stdout.write
+                )
+                self._limpar()
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            if diretorio is not None:
+                diretorio.cleanup()
+
+    def _limpar(self):
+        """Cada suíte começa com o diretório vazio"""
+        from ramais import search
+        from ramais.models import Departamento, Funcao, Unidade, Funcionario
+
+        Funcionario.objects.all().delete()
+        Departamento.objects.all().delete()
+        Funcao.objects.all().delete()
+        Unidade.objects.all().delete()
+        search.reindexar()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ramais import alteracoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta o registro de alterações do diretório: remove entradas mais '
+        'antigas que a retenção, mantendo a última de cada objeto'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=getattr(settings, 'RAMAIS_ALTERACOES_RETENCAO_DIAS', 30),
+            help='Retenção em dias (padrão: RAMAIS_ALTERACOES_RETENCAO_DIAS)',
+        )
+
+    def handle(self, *args, **options):
+        removidas = alteracoes.compactar(options['dias'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{removidas} entradas antigas removidas do registro de alterações')
+        )
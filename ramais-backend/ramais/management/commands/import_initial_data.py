@@ -1,11 +1,16 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from ramais import banco, leitores
+from ramais.importers import ImportadorDiretorio
 from ramais.models import Funcionario, Departamento, Funcao, Unidade
-import re
+import io
 
 
 class Command(BaseCommand):
-    help = 'Importa dados iniciais da tabela pessoas do SQL fornecido'
+    help = (
+        'Importa dados iniciais da tabela pessoas do SQL fornecido, ou de um '
+        'arquivo CSV, XLSX ou dump MySQL informado em --arquivo'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,31 +18,91 @@ class Command(BaseCommand):
             action='store_true',
             help='Limpa todos os dados antes de importar',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Quantidade de funcionários gravados por lote (padrão: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Executa a importação e desfaz tudo ao final, apenas reportando',
+        )
+        parser.add_argument(
+            '--arquivo',
+            help='Arquivo CSV, XLSX ou dump MySQL (.sql) a importar, lido em streaming',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=leitores.FORMATOS,
+            help='Formato do arquivo (padrão: detectado pela extensão)',
+        )
+        parser.add_argument(
+            '--tabela',
+            default='pessoas',
+            help='Tabela lida dos INSERTs de um dump MySQL (padrão: pessoas)',
+        )
+        parser.add_argument(
+            '--progresso',
+            type=int,
+            default=10000,
+            help='Informa o progresso a cada N linhas lidas (0 desativa)',
+        )
 
     def handle(self, *args, **options):
-        if options['clear']:
-            self.stdout.write('Limpando dados existentes...')
-            Funcionario.objects.all().delete()
-            Departamento.objects.all().delete()
-            Funcao.objects.all().delete()
-            Unidade.objects.all().delete()
-
         self.stdout.write('Iniciando importação dos dados...')
-        
-        # Dados automáticos extraídos do SQL
-        dados_pessoas = self._get_sql_data()
+
+        def importar():
+            # Refeita do zero (arquivo relido) se o banco estiver ocupado
+            importador = ImportadorDiretorio(batch_size=options['batch_size'])
+            if options['arquivo']:
+                dados_pessoas = self._ler_arquivo(options, importador.resultado)
+            else:
+                # Dados automáticos extraídos do SQL
+                dados_pessoas = self._get_sql_data()
+
+            if options['clear']:
+                self.stdout.write('Limpando dados existentes...')
+                Funcionario.objects.all().delete()
+                Departamento.objects.all().delete()
+                Funcao.objects.all().delete()
+                Unidade.objects.all().delete()
+
+            resultado = self._import_data(dados_pessoas, importador)
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            return resultado
 
         try:
-            with transaction.atomic():
-                self._import_data(dados_pessoas)
-            self.stdout.write(
-                self.style.SUCCESS('Importação concluída com sucesso!')
-            )
+            self._relatorio(banco.executar_escrita(importar))
+
+            if options['dry_run']:
+                self.stdout.write(
+                    self.style.WARNING('Dry-run: nenhuma alteração foi gravada.')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS('Importação concluída com sucesso!')
+                )
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Erro durante a importação: {str(e)}')
             )
 
+    def _ler_arquivo(self, options, resultado):
+        """Pipeline em streaming: leitura -> normalização -> validação"""
+        formato = options['formato'] or leitores.detectar_formato(options['arquivo'])
+        self.stdout.write(f'Lendo {options["arquivo"]} ({formato})...')
+
+        linhas = leitores.ler_arquivo(options['arquivo'], formato, options['tabela'])
+        linhas = leitores.com_progresso(
+            linhas, options['progresso'],
+            lambda total: self.stdout.write(f'  {total} linhas lidas...')
+        )
+        return leitores.validar(leitores.normalizar(linhas), resultado)
+
     def _get_sql_data(self):
         
         sql_data = """INSERT INTO `pessoas` (`id`, `Ramal`, `Email`, `Nome`, `Funcao`, `Whatsapp`, `Departamento`, `Unidade`, `Skype`, `created_at`, `updated_at`) VALUES
@@ -255,92 +320,30 @@ class Command(BaseCommand):
 
     def _parse_sql_inserts(self, sql_data):
         """Converte os INSERTs SQL em dados Python automaticamente"""
-        pessoas = []
-        
-        # Regex para extrair os VALUES
-        pattern = r'\((\d+),\s*\'([^\']*)\',\s*(?:\'([^\']*)\'\s*|NULL),\s*\'([^\']*)\',\s*(?:\'([^\']*)\'\s*|NULL),\s*(?:\'([^\']*)\'\s*|NULL),\s*\'([^\']*)\',\s*\'([^\']*)\',\s*(?:\'([^\']*)\'\s*|NULL)'
-        
-        matches = re.findall(pattern, sql_data)
-        
-        for match in matches:
-            pessoa = {
-                'Ramal': match[1] if match[1] else None,
-                'Email': match[2] if match[2] and match[2] != 'NULL' else None,
-                'Nome': self._clean_encoding(match[3]),
-                'Funcao': self._clean_encoding(match[4]) if match[4] else None,
-                'Whatsapp': match[5] if match[5] else None,
-                'Departamento': self._clean_encoding(match[6]),
-                'Unidade': match[7],
-                'Teams': match[8] if match[8] else None,  # Skype vira Teams
-            }
-            pessoas.append(pessoa)
-        
-        return pessoas
+        linhas = leitores.ler_dump_mysql_stream(io.StringIO(sql_data), 'pessoas')
+        return list(leitores.normalizar(linhas))
 
-    def _clean_encoding(self, text):
-        """Limpa problemas de encoding"""
-        if not text:
-            return None
-        
-        replacements = {
-            'Ã¡': 'á', 'Ã£': 'ã', 'Ã§': 'ç', 'Ã©': 'é', 'Ã­': 'í', 
-            'Ã³': 'ó', 'Ãº': 'ú', 'Ã ': 'à', 'Ãª': 'ê', 'Ã´': 'ô'
-        }
-        
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        
-        return text
+    def _import_data(self, dados_pessoas, importador=None):
+        """Importa os dados para o banco em lotes"""
+        importador = importador or ImportadorDiretorio()
+        return importador.importar(dados_pessoas)
 
-    def _import_data(self, dados_pessoas):
-        """Importa os dados para o banco"""
-        contador_criados = 0
-        contador_atualizados = 0
-        
-        for pessoa_data in dados_pessoas:
-            # Criar/obter departamento
-            departamento = None
-            if pessoa_data['Departamento']:
-                departamento, created = Departamento.objects.get_or_create(
-                    nome=pessoa_data['Departamento'],
-                    defaults={'ativo': True}
-                )
-            
-            # Criar/obter função
-            funcao = None
-            if pessoa_data['Funcao']:
-                funcao, created = Funcao.objects.get_or_create(
-                    nome=pessoa_data['Funcao'],
-                    defaults={'ativo': True}
-                )
-            
-            # Criar/obter unidade
-            unidade = None
-            if pessoa_data['Unidade']:
-                unidade, created = Unidade.objects.get_or_create(
-                    nome=pessoa_data['Unidade'],
-                    defaults={'ativo': True}
-                )
-            
-            # Criar/atualizar funcionário
-            funcionario, created = Funcionario.objects.update_or_create(
-                nome=pessoa_data['Nome'],
-                defaults={
-                    'ramal': pessoa_data['Ramal'],
-                    'email': pessoa_data['Email'],
-                    'whatsapp': pessoa_data['Whatsapp'],
-                    'teams': pessoa_data['Teams'],
-                    'departamento': departamento,
-                    'funcao': funcao,
-                    'unidade': unidade,
-                    'ativo': True
-                }
-            )
-            
-            if created:
-                contador_criados += 1
-            else:
-                contador_atualizados += 1
-        
-        self.stdout.write(f'Funcionários criados: {contador_criados}')
-        self.stdout.write(f'Funcionários atualizados: {contador_atualizados}')
\ No newline at end of file
+    def _relatorio(self, resultado):
+        self.stdout.write(f'Cadastros criados (departamentos/funções/unidades): {resultado.cadastros_criados}')
+        self.stdout.write(f'Funcionários criados: {resultado.criados}')
+        self.stdout.write(f'Funcionários atualizados: {resultado.atualizados}')
+        self.stdout.write(f'Funcionários inalterados: {resultado.inalterados}')
+        if resultado.duplicados:
+            self.stdout.write(f'Linhas com nome repetido (vale a última): {resultado.duplicados}')
+        if resultado.invalidos:
+            self.stdout.write(self.style.WARNING(f'Linhas inválidas ignoradas: {resultado.invalidos}'))
+            for linha, mensagem in resultado.erros:
+                self.stdout.write(f'  linha {linha}: {mensagem}')
+        if resultado.conflitos:
+            self.stdout.write(self.style.WARNING(f'Ramais/e-mails em conflito deixados em branco: {resultado.conflitos}'))
+            for nome, mensagem in resultado.avisos:
+                self.stdout.write(f'  {nome}: {mensagem}')
+        self.stdout.write(
+            f'{resultado.lidos} linhas em {resultado.duracao:.2f}s '
+            f'({resultado.linhas_por_segundo:.0f} linhas/s)'
+        )
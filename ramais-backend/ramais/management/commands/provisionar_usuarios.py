@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ramais import provisionamento
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria usuários em lote a partir de um CSV (username, password, email, '
+        'first_name, last_name, is_admin, can_edit, ativo), com os hashes de '
+        'senha calculados em paralelo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV de usuários (UTF-8, separador detectado)')
+        parser.add_argument(
+            '--processos',
+            type=int,
+            help='Processos para os hashes de senha (padrão: um por núcleo)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Valida e calcula tudo, mas desfaz a gravação ao final',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = provisionamento.provisionar(
+                    provisionamento.ler_csv(arquivo),
+                    processos=options['processos'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f'Não foi possível ler {options["arquivo"]}: {e}')
+
+        self.stdout.write(f'Linhas lidas: {resultado.lidos}')
+        self.stdout.write(f'Usuários criados: {len(resultado.criados)}')
+        self.stdout.write(f'Linhas com erro: {len(resultado.erros)}')
+        for linha, erros in resultado.erros:
+            mensagens = '; '.join(
+                f'{campo}: {" ".join(str(mensagem) for mensagem in lista)}'
+                for campo, lista in erros.items()
+            )
+            self.stdout.write(self.style.WARNING(f'  linha {linha}: {mensagens}'))
+        self.stdout.write(
+            f'Tempo: {resultado.duracao:.2f}s ({resultado.processos} processo(s) para os hashes)'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry-run: nenhuma alteração foi gravada.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Provisionamento concluído.'))
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ramais import banco, leitores
+from ramais.importers import SincronizadorDiretorio
+
+
+class Command(BaseCommand):
+    help = (
+        'Sincroniza o diretório com a exportação do RH/Active Directory (CSV, '
+        'XLSX ou LDIF), gravando apenas as pessoas que mudaram'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'arquivo',
+            help='Arquivo exportado do RH/AD',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=leitores.FORMATOS,
+            help='Formato do arquivo (padrão: detectado pela extensão)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Quantidade de pessoas processadas por lote (padrão: 500)',
+        )
+        parser.add_argument(
+            '--sem-desativar',
+            action='store_true',
+            help='Não desativa quem estiver ausente da exportação',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Calcula as mudanças e desfaz tudo ao final, apenas reportando',
+        )
+
+    def handle(self, *args, **options):
+        def sincronizar():
+            # Refeita do zero (arquivo relido) se o banco estiver ocupado
+            sincronizador = SincronizadorDiretorio(
+                batch_size=options['batch_size'],
+                desativar_ausentes=not options['sem_desativar'],
+            )
+            linhas = leitores.ler_arquivo(options['arquivo'], options['formato'])
+            pessoas = leitores.validar(
+                leitores.normalizar(linhas), sincronizador.resultado, exigir_id_externo=True
+            )
+            resultado = sincronizador.importar(pessoas)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            return resultado
+
+        try:
+            resultado = banco.executar_escrita(sincronizar)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Erro durante a sincronização: {e}')
+
+        self.stdout.write(f'Pessoas lidas: {resultado.lidos}')
+        self.stdout.write(f'Criados: {resultado.criados}')
+        self.stdout.write(f'Atualizados: {resultado.atualizados}')
+        self.stdout.write(f'Desativados: {resultado.desativados}')
+        self.stdout.write(f'Inalterados: {resultado.inalterados}')
+        if resultado.vinculados:
+            self.stdout.write(f'Vinculados a cadastros sem ID externo: {resultado.vinculados}')
+        if resultado.duplicados:
+            self.stdout.write(f'IDs repetidos (vale a última linha): {resultado.duplicados}')
+        if resultado.invalidos:
+            self.stdout.write(self.style.WARNING(f'Linhas inválidas ignoradas: {resultado.invalidos}'))
+            for linha, mensagem in resultado.erros:
+                self.stdout.write(f'  linha {linha}: {mensagem}')
+        if resultado.conflitos:
+            self.stdout.write(self.style.WARNING(f'Ramais/e-mails em conflito deixados em branco: {resultado.conflitos}'))
+            for nome, mensagem in resultado.avisos:
+                self.stdout.write(f'  {nome}: {mensagem}')
+        for operacao, nome in resultado.alteracoes:
+            self.stdout.write(f'  {operacao}: {nome}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry-run: nenhuma alteração foi gravada.'))
+        elif resultado.criados or resultado.atualizados or resultado.desativados:
+            self.stdout.write(self.style.SUCCESS('Sincronização concluída.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Nenhuma mudança: diretório já sincronizado.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ramais.importers import conflitos_unicidade, formatar_conflito
+from ramais.models import Funcionario
+
+
+class Command(BaseCommand):
+    help = (
+        'Lista funcionários ativos com ramal ou e-mail repetido, que impedem '
+        'as restrições de unicidade (rode antes de aplicar as migrations)'
+    )
+
+    def handle(self, *args, **options):
+        conflitos = conflitos_unicidade(Funcionario.objects.all())
+        if not conflitos:
+            self.stdout.write(self.style.SUCCESS('Nenhum ramal ou e-mail repetido entre os ativos.'))
+            return
+        for conflito in conflitos:
+            self.stdout.write(formatar_conflito(*conflito))
+        raise CommandError(
+            f'{len(conflitos)} ramais/e-mails repetidos entre funcionários ativos; '
+            'corrija ou desative os cadastros listados.'
+        )
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+import ramais.models
+from ramais import search
+
+
+def criar_indice_busca(apps, schema_editor):
+    """Cria o índice FTS5 e indexa os funcionários existentes (apenas SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.criar_indice(schema_editor)
+
+    Funcionario = apps.get_model('ramais', 'Funcionario')
+    linhas = Funcionario.objects.using(schema_editor.connection.alias).values_list(
+        'id', 'nome', 'ramal', 'email', 'whatsapp', 'teams',
+        'departamento__nome', 'funcao__nome', 'unidade__nome'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {search.FTS_TABLE} (rowid, nome, contatos, organizacao) '
+            'VALUES (%s, %s, %s, %s)',
+            [(linha[0], *search.montar_documento(*linha[1:])) for linha in linhas]
+        )
+
+
+def remover_indice_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.remover_indice(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0003_funcionario_teams'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+        migrations.CreateModel(
+            name='FuncionarioBusca',
+            fields=[
+                ('funcionario', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_busca', serialize=False, to='ramais.funcionario')),
+                ('nome', models.TextField()),
+                ('contatos', models.TextField()),
+                ('organizacao', models.TextField()),
+                ('documento', ramais.models.FTSMatchField(db_column='ramais_funcionario_busca')),
+            ],
+            options={
+                'db_table': 'ramais_funcionario_busca',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0004_funcionario_busca_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionario',
+            name='assinatura',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash do conteúdo da última sincronização', max_length=64, verbose_name='Assinatura'),
+        ),
+        migrations.AddField(
+            model_name='funcionario',
+            name='id_externo',
+            field=models.CharField(blank=True, help_text='Identificador estável da pessoa no RH/AD', max_length=100, null=True, unique=True, verbose_name='ID Externo'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0005_funcionario_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoDados',
+            fields=[
+                ('escopo', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Escopo')),
+                ('versao', models.BigIntegerField(default=0, verbose_name='Versão')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Versão dos Dados',
+                'verbose_name_plural': 'Versões dos Dados',
+            },
+        ),
+    ]
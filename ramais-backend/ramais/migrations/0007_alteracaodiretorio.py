@@ -0,0 +1,44 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+def registrar_estado_inicial(apps, schema_editor):
+    """Uma entrada 'criado' por registro existente, para o feed partir do zero"""
+    AlteracaoDiretorio = apps.get_model('ramais', 'AlteracaoDiretorio')
+    alias = schema_editor.connection.alias
+    for nome in ('departamento', 'funcao', 'unidade', 'funcionario'):
+        model = apps.get_model('ramais', nome)
+        AlteracaoDiretorio.objects.using(alias).bulk_create(
+            [
+                AlteracaoDiretorio(modelo=nome, objeto_id=pk, operacao='criado')
+                for pk in model.objects.using(alias).order_by('pk').values_list('pk', flat=True)
+            ],
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0006_versaodados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoDiretorio',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(max_length=20, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='ID do Objeto')),
+                ('operacao', models.CharField(choices=[('criado', 'Criado'), ('atualizado', 'Atualizado'), ('desativado', 'Desativado'), ('excluido', 'Excluído')], max_length=20, verbose_name='Operação')),
+                ('alterado_em', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Alterado em')),
+            ],
+            options={
+                'verbose_name': 'Alteração do Diretório',
+                'verbose_name_plural': 'Alterações do Diretório',
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='ramais_alt_modelo_obj_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_estado_inicial, migrations.RunPython.noop),
+    ]
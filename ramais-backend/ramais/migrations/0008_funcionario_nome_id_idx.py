@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0007_alteracaodiretorio'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['nome', 'id'], name='ramais_func_ativo_nome_idx'),
+        ),
+    ]
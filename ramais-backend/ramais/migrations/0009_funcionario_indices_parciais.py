@@ -0,0 +1,60 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:02
+
+import django.db.models.functions.text
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+from ramais.importers import CAMPOS_UNICOS, conflitos_unicidade, formatar_conflito
+
+
+def verificar_ramal_email(apps, schema_editor):
+    """
+    Prepara as restrições de unicidade: ramal/e-mail vazios viram NULL (como a
+    API já grava) e, se houver funcionários ativos com o
+    mesmo ramal ou e-mail, a migration para e lista os conflitos. Nenhum
+    contato é apagado aqui: quem resolve é o operador (ver o comando
+    verificar_unicidade).
+    """
+    Funcionario = apps.get_model('ramais', 'Funcionario')
+    funcionarios = Funcionario.objects.using(schema_editor.connection.alias)
+    for campo in CAMPOS_UNICOS:
+        funcionarios.filter(**{campo: ''}).update(**{campo: None})
+
+    conflitos = conflitos_unicidade(funcionarios)
+    if conflitos:
+        raise CommandError(
+            'Há funcionários ativos com ramal/e-mail repetido. Corrija ou '
+            'desative os cadastros abaixo e rode a migration de novo:\n'
+            + '\n'.join(formatar_conflito(*conflito) for conflito in conflitos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ramais', '0008_funcionario_nome_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_ramal_email, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['departamento', 'nome'], name='ramais_func_ativo_depto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['funcao', 'nome'], name='ramais_func_ativo_funcao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['unidade', 'nome'], name='ramais_func_ativo_unidade_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='funcionario',
+            constraint=models.UniqueConstraint(condition=models.Q(('ativo', True)), fields=('ramal',), name='ramais_func_ramal_ativo_uniq', violation_error_message='Já existe um funcionário com este ramal.'),
+        ),
+        migrations.AddConstraint(
+            model_name='funcionario',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('ativo', True)), name='ramais_func_email_ativo_uniq', violation_error_message='Já existe um funcionário com este email.'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 
 
@@ -77,6 +78,24 @@ class Funcionario(models.Model):
     teams = models.CharField(max_length=100, blank=True, null=True, verbose_name='Teams')
     ativo = models.BooleanField(default=True, verbose_name='Ativo')
     
+    # Sincronização com a exportação do RH/Active Directory
+    id_externo = models.CharField(
+        max_length=100,
+        unique=True,
+        blank=True,
+        null=True,
+        verbose_name='ID Externo',
+        help_text='Identificador estável da pessoa no RH/AD'
+    )
+    assinatura = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Assinatura',
+        help_text='Hash do conteúdo da última sincronização'
+    )
+    
     # Relacionamentos com chaves estrangeiras
     departamento = models.ForeignKey(
         Departamento, 
@@ -107,6 +126,42 @@ class Funcionario(models.Model):
         verbose_name = 'Funcionário'
         verbose_name_plural = 'Funcionários'
         ordering = ['nome']
+        # O diretório só lista ativos: índices parciais (WHERE ativo) ficam
+        # menores e já entregam as linhas na ordem do nome
+        indexes = [
+            # Listagem e paginação por cursor (keyset) por (nome, id)
+            models.Index(
+                fields=['nome', 'id'], name='ramais_func_ativo_nome_idx',
+                condition=models.Q(ativo=True),
+            ),
+            # Filtros por cadastro e funcionarios_count
+            models.Index(
+                fields=['departamento', 'nome'], name='ramais_func_ativo_depto_idx',
+                condition=models.Q(ativo=True),
+            ),
+            models.Index(
+                fields=['funcao', 'nome'], name='ramais_func_ativo_funcao_idx',
+                condition=models.Q(ativo=True),
+            ),
+            models.Index(
+                fields=['unidade', 'nome'], name='ramais_func_ativo_unidade_idx',
+                condition=models.Q(ativo=True),
+            ),
+        ]
+        # Ramal e e-mail não se repetem entre funcionários ativos; os índices
+        # únicos também atendem a validação e a busca (ramal:72*, email:...)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ramal'], name='ramais_func_ramal_ativo_uniq',
+                condition=models.Q(ativo=True),
+                violation_error_message='Já existe um funcionário com este ramal.',
+            ),
+            models.UniqueConstraint(
+                Lower('email'), name='ramais_func_email_ativo_uniq',
+                condition=models.Q(ativo=True),
+                violation_error_message='Já existe um funcionário com este email.',
+            ),
+        ]
     
     def __str__(self):
         return self.nome
@@ -126,3 +181,95 @@ class Funcionario(models.Model):
         """Retorna o nome da unidade ou None"""
         return self.unidade.nome if self.unidade else None
 
+
+
+class FTSMatchField(models.TextField):
+    """Coluna oculta de uma tabela FTS5, usada apenas para o lookup ``match``"""
+
+
+@FTSMatchField.register_lookup
+class FTSMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class FuncionarioBusca(models.Model):
+    """
+    Índice de busca textual dos funcionários (tabela virtual FTS5 do SQLite).
+
+    A tabela é criada pela migration e mantida pelos signals em ramais.search,
+    por isso o modelo não é gerenciado pelo Django.
+    """
+    funcionario = models.OneToOneField(
+        Funcionario,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='indice_busca'
+    )
+    nome = models.TextField()
+    contatos = models.TextField()
+    organizacao = models.TextField()
+    documento = FTSMatchField(db_column='ramais_funcionario_busca')
+
+    class Meta:
+        managed = False
+        db_table = 'ramais_funcionario_busca'
+
+
+class VersaoDados(models.Model):
+    """
+    Contador de versão dos dados, incrementado a cada alteração.
+
+    Caches, ETags e índices em memória comparam a versão atual (uma leitura
+    por chave primária) para saber se precisam ser refeitos.
+    """
+    escopo = models.CharField(max_length=50, primary_key=True, verbose_name='Escopo')
+    versao = models.BigIntegerField(default=0, verbose_name='Versão')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Versão dos Dados'
+        verbose_name_plural = 'Versões dos Dados'
+
+    def __str__(self):
+        return f'{self.escopo} v{self.versao}'
+
+
+class AlteracaoDiretorio(models.Model):
+    """
+    Registro (somente inclusão) das alterações no diretório.
+
+    O id é o cursor do feed de alterações (/api/funcionarios/changes/). A
+    exclusão definitiva de um registro gera uma entrada ``excluido`` (tombstone).
+    """
+    CRIADO = 'criado'
+    ATUALIZADO = 'atualizado'
+    DESATIVADO = 'desativado'
+    EXCLUIDO = 'excluido'
+    OPERACOES = [
+        (CRIADO, 'Criado'),
+        (ATUALIZADO, 'Atualizado'),
+        (DESATIVADO, 'Desativado'),
+        (EXCLUIDO, 'Excluído'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    modelo = models.CharField(max_length=20, verbose_name='Modelo')
+    objeto_id = models.BigIntegerField(verbose_name='ID do Objeto')
+    operacao = models.CharField(max_length=20, choices=OPERACOES, verbose_name='Operação')
+    alterado_em = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Alterado em')
+
+    class Meta:
+        verbose_name = 'Alteração do Diretório'
+        verbose_name_plural = 'Alterações do Diretório'
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id'], name='ramais_alt_modelo_obj_idx'),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} {self.modelo} {self.objeto_id} {self.operacao}'
@@ -0,0 +1,124 @@
+"""
+Identificação de chamadas (caller ID): número -> funcionário.
+
+Os números de ``ramal`` e ``whatsapp`` são normalizados (só dígitos, sem
+prefixo internacional, código do país, zero de longa distância/operadora e
+DDD) e guardados em dicionários em memória. O índice é refeito quando a versão
+do diretório muda (cache ``numeros``); a consulta em si é um acesso a dict.
+"""
+from . import snapshots
+from .models import Funcionario
+
+CODIGO_PAIS = '55'
+
+numeros_cache = snapshots.registrar_cache('numeros', max_entradas=1)
+
+
+def _sem_prefixos(digitos):
+    """Dígitos sem prefixo internacional, código do país e zero de longa distância"""
+    if len(digitos) < 8:
+        return digitos
+    if digitos.startswith('00'):
+        # Discagem internacional: 00 + operadora (2 dígitos) + país
+        digitos = digitos[4:] if digitos[4:6] == CODIGO_PAIS else digitos[2:]
+    if digitos.startswith(CODIGO_PAIS) and len(digitos) in (12, 13):
+        digitos = digitos[2:]
+    if digitos.startswith('0'):
+        # Longa distância: 0 + DDD ou 0 + operadora + DDD
+        digitos = digitos[3:] if len(digitos) in (13, 14) else digitos[1:]
+    return digitos
+
+
+def normalizar_numero(numero):
+    """
+    Reduz um número de telefone à parte local.
+
+    "+55 (16) 98118-1872", "016 98118-1872", "16981181872" e "981181872"
+    viram todos "981181872". Ramais (até 7 dígitos) ficam como estão.
+    """
+    digitos = _sem_prefixos(''.join(filter(str.isdigit, numero or '')))
+    if len(digitos) in (10, 11):
+        # DDD + número fixo (8 dígitos) ou celular (9 dígitos)
+        digitos = digitos[2:]
+    return digitos
+
+
+def celular(numero):
+    """
+    Se o número é com certeza um celular: DDD + 9 dígitos começando por 9.
+    Sem o DDD um número de 9 dígitos não é distinguível de outros formatos.
+    """
+    digitos = _sem_prefixos(''.join(filter(str.isdigit, numero or '')))
+    return len(digitos) == 11 and digitos[2] == '9'
+
+
+def apelido(numero):
+    """
+    Parte local sem o nono dígito, só para celulares (o PBX pode entregá-los
+    sem ele); None para os demais, cujos 8 dígitos se confundiriam com um
+    fixo ou número antigo
+    """
+    return normalizar_numero(numero)[1:] if celular(numero) else None
+
+
+def construir_indice():
+    """
+    Dois dicionários número -> tupla de contatos: os números exatos e os
+    apelidos (celulares sem o nono dígito)
+    """
+    exatos, apelidos = {}, {}
+
+    def adicionar(indice, chave, contato):
+        atuais = indice.get(chave, ())
+        if all(existente['id'] != contato['id'] for existente in atuais):
+            indice[chave] = atuais + (contato,)
+
+    linhas = Funcionario.objects.filter(ativo=True).values_list(
+        'pk', 'nome', 'ramal', 'whatsapp', 'departamento__nome'
+    ).order_by('nome', 'pk')
+    for pk, nome, ramal, whatsapp, departamento in linhas.iterator():
+        for tipo, numero in (('ramal', ramal), ('whatsapp', whatsapp)):
+            normalizado = normalizar_numero(numero)
+            if not normalizado:
+                continue
+            contato = {
+                'id': pk,
+                'nome': nome,
+                'ramal': ramal,
+                'whatsapp': whatsapp,
+                'departamento': departamento,
+                'tipo': tipo,
+            }
+            adicionar(exatos, normalizado, contato)
+            sem_nono = apelido(numero)
+            if sem_nono:
+                adicionar(apelidos, sem_nono, contato)
+    return exatos, apelidos
+
+
+def obter_indice(versao_dados):
+    return numeros_cache.obter('indice', versao_dados, construir_indice)
+
+
+def consultar(indice, numero):
+    """
+    Contatos do número (lista vazia se não houver) e o número normalizado.
+    Casamentos exatos vêm antes dos feitos pelo apelido sem o nono dígito.
+    """
+    exatos, apelidos = indice
+    normalizado = normalizar_numero(numero)
+    if not normalizado:
+        return [], normalizado
+    # Número exato; celular cadastrado com o nono dígito que chega sem ele;
+    # celular que chega com o nono dígito mas foi cadastrado sem ele
+    buscas = [(exatos, normalizado), (apelidos, normalizado)]
+    sem_nono = apelido(numero)
+    if sem_nono:
+        buscas.append((exatos, sem_nono))
+    contatos, vistos = [], set()
+    for dicionario, chave in buscas:
+        for contato in dicionario.get(chave, ()):
+            if contato['id'] not in vistos:
+                vistos.add(contato['id'])
+                contatos.append(contato)
+    return contatos, normalizado
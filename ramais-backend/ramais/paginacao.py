@@ -0,0 +1,119 @@
+"""
+Paginação por cursor (keyset) da listagem de funcionários.
+
+A página seguinte é buscada com ``WHERE (nome, id) > (último nome, último id)``
+ordenado por (nome, id), usando o índice ramais_func_ativo_nome_idx: o custo de
+cada página é constante, sem OFFSET nem COUNT. O total é opcional
+(``?count=exact|estimate|none``).
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+MODOS_CONTAGEM = ('exact', 'estimate', 'none')
+
+# Contagem estimada: conta no máximo até este limite ("1000+")
+LIMITE_ESTIMATIVA = 1000
+
+
+def codificar_cursor(nome, pk):
+    texto = json.dumps([nome, pk], ensure_ascii=False)
+    # Sem o padding "=" para não precisar de escape na URL
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (nome, id) do cursor ou levanta ValidationError"""
+    try:
+        cursor += '=' * (-len(cursor) % 4)
+        nome, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise ValidationError({'cursor': 'Cursor inválido.'})
+    if not isinstance(nome, str) or not isinstance(pk, int):
+        raise ValidationError({'cursor': 'Cursor inválido.'})
+    return nome, pk
+
+
+class FuncionarioCursorPagination(BasePagination):
+    """
+    Paginação keyset por (nome, id).
+
+    O total só é calculado quando pedido: ``exact`` faz o COUNT, ``estimate``
+    usa o snapshot em memória da listagem quando existe ou conta até
+    LIMITE_ESTIMATIVA linhas.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def __init__(self, contar_em_cache=None):
+        # Função opcional que devolve o total já conhecido (snapshot) ou None
+        self.contar_em_cache = contar_em_cache
+
+    def get_page_size(self, request):
+        tamanho = request.query_params.get(self.page_size_query_param)
+        try:
+            tamanho = int(tamanho) if tamanho else settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Informe um número inteiro.'})
+        return max(1, min(tamanho, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.modo_contagem = request.query_params.get('count', 'none')
+        if self.modo_contagem not in MODOS_CONTAGEM:
+            raise ValidationError({'count': f'Use um de: {", ".join(MODOS_CONTAGEM)}.'})
+
+        self.total, self.total_exato = self._contar(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            nome, pk = decodificar_cursor(cursor)
+            # Equivale a (nome, id) > (x, y); o "nome >= x" separado permite ao
+            # SQLite buscar direto no índice em vez de percorrê-lo
+            queryset = queryset.filter(Q(nome__gte=nome), Q(nome__gt=nome) | Q(pk__gt=pk))
+        linhas = list(queryset.order_by('nome', 'pk')[:self.page_size + 1])
+
+        self.tem_proxima = len(linhas) > self.page_size
+        linhas = linhas[:self.page_size]
+        self.proximo_cursor = (
+            codificar_cursor(linhas[-1].nome, linhas[-1].pk) if self.tem_proxima else None
+        )
+        return linhas
+
+    def _contar(self, queryset):
+        if self.modo_contagem == 'none':
+            return None, None
+        if self.modo_contagem == 'exact':
+            return queryset.order_by().count(), True
+        if self.contar_em_cache:
+            total = self.contar_em_cache()
+            if total is not None:
+                return total, True
+        total = queryset.order_by().values('pk')[:LIMITE_ESTIMATIVA + 1].count()
+        if total > LIMITE_ESTIMATIVA:
+            return LIMITE_ESTIMATIVA, False
+        return total, True
+
+    def get_next_link(self):
+        if not self.proximo_cursor:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.proximo_cursor
+        )
+
+    def get_paginated_response(self, data):
+        resposta = {'next': self.get_next_link()}
+        if self.total is not None:
+            resposta['count'] = self.total
+            resposta['count_exato'] = self.total_exato
+        resposta['results'] = data
+        return Response(resposta)
@@ -0,0 +1,226 @@
+"""
+Provisionamento de usuários em lote a partir de um CSV.
+
+O custo de criar um usuário está quase todo no hash da senha (PBKDF2 com
+centenas de milhares de iterações, lento de propósito). Aqui as linhas são
+validadas primeiro, os hashes das válidas são calculados e os usuários são
+gravados com um único ``bulk_create``, fora do qual fica todo o trabalho de
+CPU. Linhas inválidas são reportadas sem interromper o lote.
+
+No comando provisionar_usuarios os hashes são calculados em paralelo num
+pool de processos (um por núcleo, RAMAIS_PROVISIONAMENTO_PROCESSOS), criado
+uma vez por processo. O endpoint calcula em sequência: abrir processos
+dentro de uma requisição do servidor web é caro e frágil.
+"""
+import csv
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import banco, versao
+from .leitores import _chave_coluna
+from .models import Usuario
+
+# Nome de coluna (sem acento, minúsculo) -> campo do usuário
+COLUNAS = {
+    'username': 'username',
+    'usuario': 'username',
+    'login': 'username',
+    'email': 'email',
+    'e-mail': 'email',
+    'first_name': 'first_name',
+    'nome': 'first_name',
+    'last_name': 'last_name',
+    'sobrenome': 'last_name',
+    'password': 'password',
+    'senha': 'password',
+    'is_admin': 'is_admin',
+    'admin': 'is_admin',
+    'administrador': 'is_admin',
+    'can_edit': 'can_edit',
+    'pode_editar': 'can_edit',
+    'ativo': 'ativo',
+}
+
+# Valores em português aceitos nas colunas booleanas
+BOOLEANOS = {'sim': True, 's': True, 'nao': False, 'n': False}
+
+# Abaixo disso o pool custa mais do que economiza
+MINIMO_PARALELO = 4
+
+TAMANHO_LOTE = 500
+
+# Pool de processos reaproveitado entre chamadas: (processos, executor)
+_pool = None
+_lock_pool = threading.Lock()
+
+
+class ResultadoProvisionamento:
+    """Usuários criados e erros por linha de um provisionamento"""
+
+    def __init__(self):
+        self.lidos = 0
+        self.criados = []
+        # (linha do arquivo, {campo: [mensagens]})
+        self.erros = []
+        self.processos = 1
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def registrar_erro(self, linha, erros):
+        self.erros.append((linha, erros))
+
+    def finalizar(self):
+        self.fim = time.perf_counter()
+
+    @property
+    def duracao(self):
+        return (self.fim or time.perf_counter()) - self.inicio
+
+
+def ler_csv(arquivo):
+    """
+    Pares (linha do arquivo, dados) de um CSV de usuários (arquivo texto
+    aberto), com as colunas mapeadas para os campos do usuário; colunas
+    desconhecidas são ignoradas. A linha é a física em que o registro começa,
+    o que conta campos entre aspas com quebras de linha.
+    """
+    amostra = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t|')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(arquivo, dialect=dialeto)
+    leitor.fieldnames  # lê o cabeçalho
+    fim_anterior = leitor.line_num
+    for linha in leitor:
+        dados = {}
+        for coluna, valor in linha.items():
+            campo = COLUNAS.get(_chave_coluna(coluna))
+            valor = (valor or '').strip()
+            if campo and valor:
+                dados[campo] = BOOLEANOS.get(_chave_coluna(valor), valor)
+        yield fim_anterior + 1, dados
+        fim_anterior = leitor.line_num
+
+
+def processos_padrao():
+    return getattr(settings, 'RAMAIS_PROVISIONAMENTO_PROCESSOS', None) or os.cpu_count() or 1
+
+
+def _inicializar_processo():
+    # Com spawn/forkserver o processo filho começa sem o Django configurado
+    from django.apps import apps
+
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def processos_para(total, processos=None):
+    """Processos usados para ``total`` hashes (1: sem pool)"""
+    if total < MINIMO_PARALELO:
+        return 1
+    return max(1, min(processos or processos_padrao(), total))
+
+
+def _obter_pool(processos):
+    """Pool do processo, criado na primeira chamada (refeito se o tamanho mudar)"""
+    global _pool
+    with _lock_pool:
+        if _pool is not None and _pool[0] != processos:
+            _pool[1].shutdown()
+            _pool = None
+        if _pool is None:
+            _pool = (processos, ProcessPoolExecutor(
+                max_workers=processos, initializer=_inicializar_processo
+            ))
+        return _pool[1]
+
+
+def gerar_hashes(senhas, processos=None):
+    """Hashes das senhas (na mesma ordem), calculados em paralelo"""
+    processos = processos_para(len(senhas), processos)
+    if processos == 1:
+        return [make_password(senha) for senha in senhas]
+    # Poucos pedaços por processo: cada hash já leva centenas de ms
+    pedaco = max(1, len(senhas) // (processos * 4))
+    return list(_obter_pool(processos).map(make_password, senhas, chunksize=pedaco))
+
+
+def _separar_existentes(itens):
+    """(novos, já existentes no banco) de uma lista de (linha, usuário)"""
+    existentes = set(
+        Usuario.objects.filter(
+            username__in=[usuario.username for _, usuario in itens]
+        ).values_list('username', flat=True)
+    )
+    novos = [(numero, usuario) for numero, usuario in itens if usuario.username not in existentes]
+    repetidos = [numero for numero, usuario in itens if usuario.username in existentes]
+    return novos, repetidos
+
+
+def provisionar(linhas, processos=None, dry_run=False):
+    """
+    Valida as linhas (pares (número da linha, dados) de ``ler_csv``), cria
+    os usuários válidos e retorna um ResultadoProvisionamento.
+    """
+    from .serializers import ProvisionamentoUsuarioSerializer
+
+    resultado = ResultadoProvisionamento()
+    usuarios, senhas = [], {}
+    vistos = set()
+    for numero, dados in linhas:
+        resultado.lidos += 1
+        serializer = ProvisionamentoUsuarioSerializer(data=dados)
+        if not serializer.is_valid():
+            resultado.registrar_erro(numero, serializer.errors)
+            continue
+        campos = dict(serializer.validated_data)
+        campos.pop('password_confirm', None)
+        senha = campos.pop('password')
+        if campos['username'] in vistos:
+            resultado.registrar_erro(numero, {'username': ['Usuário repetido no arquivo.']})
+            continue
+        vistos.add(campos['username'])
+        usuarios.append((numero, Usuario(**campos)))
+        senhas[numero] = senha
+
+    def registrar_repetidos(numeros):
+        for numero in numeros:
+            resultado.registrar_erro(
+                numero, {'username': ['Já existe um usuário com este nome de usuário.']}
+            )
+
+    # Antes dos hashes, para não gastar CPU com linhas que vão falhar
+    novos, repetidos = _separar_existentes(usuarios)
+    registrar_repetidos(repetidos)
+    resultado.processos = processos_para(len(novos), processos)
+    hashes = gerar_hashes([senhas[numero] for numero, _ in novos], processos)
+    for (_, usuario), senha in zip(novos, hashes):
+        usuario.password = senha
+
+    def gravar():
+        # De novo dentro da transação: outro processo pode ter criado algum
+        restantes, repetidos = _separar_existentes(novos)
+        criados = Usuario.objects.bulk_create(
+            [usuario for _, usuario in restantes], batch_size=TAMANHO_LOTE
+        )
+        if criados:
+            # bulk_create não dispara os signals de Usuario
+            versao.incrementar_versao(versao.ESCOPO_USUARIOS)
+        if dry_run:
+            transaction.set_rollback(True)
+        return criados, repetidos
+
+    resultado.criados, repetidos = banco.executar_escrita(gravar)
+    registrar_repetidos(repetidos)
+    resultado.erros.sort(key=lambda erro: erro[0])
+    resultado.finalizar()
+    return resultado
@@ -0,0 +1,144 @@
+"""
+Réplica de leitura do diretório.
+
+Com ``RAMAIS_DB_REPLICA`` (ver settings) o banco ganha o alias ``replica``: um
+segundo arquivo SQLite copiado do principal pela API de backup do SQLite
+(comando ``atualizar_replica``). As ações de leitura dos viewsets do
+diretório (listagens, detalhes, exportações, agendas e identificação de
+chamadas) rodam com ``leitura_na_replica`` ativo e o RoteadorReplica manda
+as consultas dos modelos do diretório para a réplica; escritas, usuários e
+sessões continuam no ``default``.
+
+Aderência (read-your-writes): depois de uma escrita bem-sucedida a resposta
+leva o cookie RAMAIS_VERSAO_ESCRITA com a versão do diretório gravada, e
+enquanto a réplica estiver atrás dessa versão as leituras desse cliente vão
+para o ``default``.
+"""
+import contextvars
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_REPLICA = 'replica'
+COOKIE_VERSAO_ESCRITA = 'ramais_versao_escrita'
+
+_leitura_na_replica = contextvars.ContextVar('ramais_leitura_na_replica', default=False)
+
+
+def configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+@contextmanager
+def leitura_na_replica():
+    """Consultas de leitura do diretório feitas dentro do bloco vão para a réplica"""
+    token = _leitura_na_replica.set(True)
+    try:
+        yield
+    finally:
+        _leitura_na_replica.reset(token)
+
+
+def ativar_leitura():
+    """Como leitura_na_replica, para quem não tem um bloco (retorna o token do reset)"""
+    return _leitura_na_replica.set(True)
+
+
+def desativar_leitura(token):
+    _leitura_na_replica.reset(token)
+
+
+class RoteadorReplica:
+    """Leituras do diretório na réplica quando pedidas; todo o resto no default"""
+
+    @staticmethod
+    def _replicado(model):
+        return (
+            model._meta.app_label == 'ramais'
+            and model._meta.label != settings.AUTH_USER_MODEL
+        )
+
+    def db_for_read(self, model, **hints):
+        if _leitura_na_replica.get() and self._replicado(model):
+            return ALIAS_REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Os dois bancos têm o mesmo conteúdo (a réplica é uma cópia)
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe o esquema junto com os dados, na cópia
+        return db != ALIAS_REPLICA
+
+
+def versao_escrita(request):
+    """Versão gravada pelo cliente (cookie), ou None"""
+    try:
+        return int(request.COOKIES[COOKIE_VERSAO_ESCRITA])
+    except (KeyError, ValueError):
+        return None
+
+
+def pode_ler_da_replica(request):
+    """A réplica já contém as escritas deste cliente?"""
+    from . import versao
+
+    minima = versao_escrita(request)
+    if minima is None:
+        return True
+    with leitura_na_replica():
+        return versao.versao_atual()[0] >= minima
+
+
+def marcar_escrita(response):
+    """Grava na resposta o cookie de aderência com a versão atual do default"""
+    from . import versao
+
+    response.set_cookie(
+        COOKIE_VERSAO_ESCRITA, str(versao.versao_atual()[0]),
+        max_age=settings.RAMAIS_REPLICA_ADERENCIA, httponly=True, samesite='Lax',
+    )
+    return response
+
+
+def atualizar_replica(forcar=False):
+    """
+    Copia o banco principal sobre a réplica com a API de backup do SQLite.
+
+    A cópia é feita num passo só, dentro de uma transação da réplica: quem
+    lê a réplica espera o fim da cópia (timeout do driver) e passa a ver o
+    conteúdo novo inteiro. Sem ``forcar`` a cópia é pulada quando as versões
+    já coincidem. Retorna (copiou, versao, segundos).
+    """
+    from . import versao
+
+    principal = versao.versao_atual()
+    if not forcar:
+        try:
+            with leitura_na_replica():
+                atual = versao.versao_atual()
+        except Exception:
+            # Réplica ainda não criada, ou sem as tabelas
+            atual = None
+        if atual == principal:
+            return False, principal[0], 0.0
+
+    inicio = time.perf_counter()
+    origem = connections[DEFAULT_DB_ALIAS]
+    origem.ensure_connection()
+    destino_config = connections[ALIAS_REPLICA].settings_dict
+    destino = sqlite3.connect(
+        destino_config['NAME'], timeout=destino_config.get('OPTIONS', {}).get('timeout', 5)
+    )
+    try:
+        origem.connection.backup(destino)
+    finally:
+        destino.close()
+    return True, principal[0], time.perf_counter() - inicio
@@ -0,0 +1,199 @@
+"""
+Índice de busca textual (full-text) dos funcionários.
+
+No SQLite usamos uma tabela virtual FTS5 (``ramais_funcionario_busca``) cujo
+``rowid`` é o id do funcionário. O tokenizer ``unicode61 remove_diacritics 2``
+torna a busca insensível a acentos ("Adenilson" encontra "Adenílson") e a
+ordenação por relevância usa ``bm25``. Em outros bancos a busca cai no filtro
+``icontains`` antigo.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'ramais_funcionario_busca'
+
+# Pesos do bm25 por coluna: nome, contatos, organizacao
+PESOS_COLUNAS = (10.0, 5.0, 2.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Bancos (alias, NAME) onde o índice já foi encontrado
+_bancos_com_indice = set()
+
+
+def fts_disponivel(conn=None):
+    """Indica se o banco atual possui o índice FTS5"""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    chave = (conn.alias, str(conn.settings_dict['NAME']))
+    if chave in _bancos_com_indice:
+        return True
+    if FTS_TABLE in conn.introspection.table_names():
+        _bancos_com_indice.add(chave)
+        return True
+    return False
+
+
+def criar_indice(schema_editor):
+    """Cria a tabela virtual FTS5 (usado pela migration)"""
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "nome, contatos, organizacao, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def remover_indice(schema_editor):
+    """Remove a tabela virtual FTS5 (usado pela migration)"""
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _bancos_com_indice.clear()
+
+
+def montar_consulta(busca):
+    """
+    Converte o texto digitado em uma expressão MATCH do FTS5.
+
+    Cada palavra vira um termo de prefixo ("leo" -> "leo"*) e todos os termos
+    precisam casar. Retorna None se não sobrar nenhum termo.
+    """
+    termos = _TOKEN_RE.findall(busca or '')
+    if not termos:
+        return None
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def montar_documento(nome, ramal, email, whatsapp, teams,
+                     departamento, funcao, unidade):
+    """Monta as colunas indexadas (nome, contatos, organizacao)"""
+    whatsapp_digitos = ''.join(filter(str.isdigit, whatsapp or ''))
+    contatos = [ramal, email, whatsapp, whatsapp_digitos, teams]
+    organizacao = [departamento, funcao, unidade]
+    return (
+        nome or '',
+        ' '.join(valor for valor in contatos if valor),
+        ' '.join(valor for valor in organizacao if valor),
+    )
+
+
+def _documento(funcionario):
+    """Monta as colunas indexadas de um funcionário"""
+    return montar_documento(
+        funcionario.nome, funcionario.ramal, funcionario.email,
+        funcionario.whatsapp, funcionario.teams,
+        funcionario.departamento_nome, funcionario.funcao_nome,
+        funcionario.unidade_nome,
+    )
+
+
+def indexar_funcionarios(funcionarios):
+    """Insere ou atualiza funcionários no índice"""
+    if not fts_disponivel():
+        return
+    linhas = [(f.pk, *_documento(f)) for f in funcionarios]
+    if not linhas:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(linha[0],) for linha in linhas]
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, nome, contatos, organizacao) '
+            'VALUES (%s, %s, %s, %s)',
+            linhas
+        )
+
+
+def remover_funcionarios(ids):
+    """Remove funcionários do índice"""
+    ids = list(ids)
+    if not ids or not fts_disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in ids]
+        )
+
+
+def reindexar(ids=None, batch_size=2000):
+    """
+    Reindexa os funcionários informados (ou todos, se ids for None).
+
+    Usado após operações em massa que não disparam signals (bulk_create,
+    bulk_update, queryset.update).
+    """
+    from .models import Funcionario
+
+    if not fts_disponivel():
+        return
+    queryset = Funcionario.objects.select_related('departamento', 'funcao', 'unidade')
+    if ids is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        lote = []
+        for funcionario in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            lote.append(funcionario)
+            if len(lote) >= batch_size:
+                indexar_funcionarios(lote)
+                lote = []
+        indexar_funcionarios(lote)
+        return
+
+    ids = list(ids)
+    for inicio in range(0, len(ids), batch_size):
+        parte = ids[inicio:inicio + batch_size]
+        encontrados = list(queryset.filter(pk__in=parte))
+        indexar_funcionarios(encontrados)
+        faltando = set(parte) - {f.pk for f in encontrados}
+        remover_funcionarios(faltando)
+
+
+def filtro_icontains(busca):
+    """Filtro antigo por substring, usado quando não há índice FTS"""
+    return (
+        Q(nome__icontains=busca) |
+        Q(ramal__icontains=busca) |
+        Q(email__icontains=busca) |
+        Q(whatsapp__icontains=busca) |
+        Q(departamento__nome__icontains=busca) |
+        Q(funcao__nome__icontains=busca) |
+        Q(unidade__nome__icontains=busca)
+    )
+
+
+def aplicar_busca(queryset, busca, aproximada=False):
+    """
+    Filtra o queryset de funcionários pelo texto de busca.
+
+    Retorna uma tupla (queryset, ordenado_por_relevancia). Quando o índice FTS
+    está disponível o queryset recebe a anotação ``relevancia`` (bm25, menor é
+    melhor). Com ``aproximada`` usa o índice de trigramas em memória, que
+    tolera erros de digitação (ver busca_aproximada).
+    """
+    if aproximada:
+        from . import busca_aproximada
+
+        return busca_aproximada.aplicar_busca(queryset, busca), True
+
+    if not fts_disponivel():
+        return queryset.filter(filtro_icontains(busca)), False
+
+    consulta = montar_consulta(busca)
+    if consulta is None:
+        # Apenas pontuação (ex.: "@"): mantém o comportamento por substring
+        return queryset.filter(filtro_icontains(busca)), False
+
+    return aplicar_match(queryset, consulta), True
+
+
+def aplicar_match(queryset, consulta):
+    """Filtra pela expressão MATCH do FTS5 anotando ``relevancia`` (bm25)"""
+    pesos = ', '.join(str(peso) for peso in PESOS_COLUNAS)
+    return queryset.filter(indice_busca__documento__match=consulta).annotate(
+        relevancia=RawSQL(f'bm25("{FTS_TABLE}", {pesos})', [])
+    )
@@ -1,9 +1,73 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db.models.functions import Lower
 from .models import Usuario, Departamento, Funcao, Unidade, Funcionario
 
 
-class UsuarioSerializer(serializers.ModelSerializer):
+def _lista_parametro(request, nome):
+    """Valores de ?nome=a,b (aceita o parâmetro repetido)"""
+    valores = []
+    for valor in request.query_params.getlist(nome):
+        valores.extend(campo.strip() for campo in valor.split(',') if campo.strip())
+    return valores
+
+
+def campos_solicitados(request, disponiveis):
+    """
+    Campos pedidos via ?fields= e/ou ?omit=, ou None quando a resposta deve
+    trazer todos. Nomes desconhecidos geram erro 400.
+    """
+    if request is None:
+        return None
+    fields = _lista_parametro(request, 'fields')
+    omit = _lista_parametro(request, 'omit')
+    if not fields and not omit:
+        return None
+    disponiveis = list(disponiveis)
+    desconhecidos = sorted(set(fields + omit) - set(disponiveis))
+    if desconhecidos:
+        raise serializers.ValidationError({
+            'fields': f'Campos inválidos: {", ".join(desconhecidos)}. '
+                      f'Disponíveis: {", ".join(disponiveis)}.'
+        })
+    campos = set(fields) if fields else set(disponiveis)
+    return campos - set(omit)
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin de serializer que remove da resposta os campos não pedidos em
+    ?fields= / ?omit= (apenas em leituras)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        legiveis = [nome for nome, campo in self.fields.items() if not campo.write_only]
+        campos = campos_solicitados(request, legiveis)
+        if campos is None:
+            return
+        for nome in legiveis:
+            if nome not in campos:
+                self.fields.pop(nome)
+
+
+def contar_funcionarios_ativos(obj):
+    """
+    Quantidade de funcionários ativos de um cadastro.
+
+    Usa a anotação ``funcionarios_count`` feita pelos viewsets quando presente,
+    evitando uma query por linha na listagem.
+    """
+    if hasattr(obj, 'funcionarios_count'):
+        return obj.funcionarios_count
+    return obj.funcionarios.filter(ativo=True).count()
+
+
+class UsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para modelo Usuario
     """
@@ -56,6 +120,19 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ProvisionamentoUsuarioSerializer(UsuarioSerializer):
+    """
+    Linha do provisionamento em lote: a unicidade do username é verificada
+    para o lote inteiro numa consulta só (ramais.provisionamento)
+    """
+
+    class Meta(UsuarioSerializer.Meta):
+        extra_kwargs = {
+            **UsuarioSerializer.Meta.extra_kwargs,
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
+
+
 class LoginSerializer(serializers.Serializer):
     """
     Serializer para login de usuário
@@ -82,7 +159,7 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Username e password são obrigatórios.')
 
 
-class DepartamentoSerializer(serializers.ModelSerializer):
+class DepartamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para modelo Departamento
     """
@@ -94,7 +171,7 @@ class DepartamentoSerializer(serializers.ModelSerializer):
     
     def get_funcionarios_count(self, obj):
         """Retorna quantidade de funcionários ativos no departamento"""
-        return obj.funcionarios.filter(ativo=True).count()
+        return contar_funcionarios_ativos(obj)
     
     def validate_nome(self, value):
         """Validação para nome único (case insensitive)"""
@@ -107,7 +184,7 @@ class DepartamentoSerializer(serializers.ModelSerializer):
         return value
 
 
-class FuncaoSerializer(serializers.ModelSerializer):
+class FuncaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para modelo Funcao
     """
@@ -119,7 +196,7 @@ class FuncaoSerializer(serializers.ModelSerializer):
     
     def get_funcionarios_count(self, obj):
         """Retorna quantidade de funcionários ativos na função"""
-        return obj.funcionarios.filter(ativo=True).count()
+        return contar_funcionarios_ativos(obj)
     
     def validate_nome(self, value):
         """Validação para nome único (case insensitive)"""
@@ -131,7 +208,7 @@ class FuncaoSerializer(serializers.ModelSerializer):
         return value
 
 
-class UnidadeSerializer(serializers.ModelSerializer):
+class UnidadeSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para modelo Unidade
     """
@@ -143,7 +220,7 @@ class UnidadeSerializer(serializers.ModelSerializer):
     
     def get_funcionarios_count(self, obj):
         """Retorna quantidade de funcionários ativos na unidade"""
-        return obj.funcionarios.filter(ativo=True).count()
+        return contar_funcionarios_ativos(obj)
     
     def validate_nome(self, value):
         """Validação para nome único (case insensitive)"""
@@ -155,7 +232,7 @@ class UnidadeSerializer(serializers.ModelSerializer):
         return value
 
 
-class FuncionarioSerializer(serializers.ModelSerializer):
+class FuncionarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para modelo Funcionario - usado para CREATE/UPDATE
     """
@@ -172,29 +249,57 @@ class FuncionarioSerializer(serializers.ModelSerializer):
             'funcao', 'funcao_nome',
             'unidade', 'unidade_nome'
         ]
+        # A unicidade do ramal depende do ``ativo`` enviado: fica em validate()
+        extra_kwargs = {'ramal': {'validators': []}}
     
     def validate_email(self, value):
-        """Validação de email único se fornecido"""
-        if value:
-            instance = self.instance
-            if Funcionario.objects.filter(
-                email__iexact=value
-            ).exclude(pk=instance.pk if instance else None).exists():
-                raise serializers.ValidationError('Já existe um funcionário com este email.')
-        return value
+        """E-mail vazio é gravado como nulo (fora da restrição de unicidade)"""
+        return value or None
     
     def validate_ramal(self, value):
-        """Validação de ramal único se fornecido"""
-        if value:
-            instance = self.instance
-            if Funcionario.objects.filter(
-                ramal=value
-            ).exclude(pk=instance.pk if instance else None).exists():
-                raise serializers.ValidationError('Já existe um funcionário com este ramal.')
-        return value
+        """Ramal vazio é gravado como nulo (fora da restrição de unicidade)"""
+        return value or None
+
+    def validate(self, attrs):
+        """
+        Ramal e e-mail únicos entre os funcionários ativos, como as restrições
+        do banco (as consultas usam os mesmos índices parciais)
+        """
+        instance = self.instance
+        ativo = attrs.get('ativo', instance.ativo if instance else True)
+        if not ativo:
+            return attrs
+        outros = Funcionario.objects.filter(ativo=True).exclude(pk=instance.pk if instance else None)
+        ramal = attrs['ramal'] if 'ramal' in attrs else getattr(instance, 'ramal', None)
+        if ramal and outros.filter(ramal=ramal).exists():
+            raise serializers.ValidationError({'ramal': 'Já existe um funcionário com este ramal.'})
+        email = attrs['email'] if 'email' in attrs else getattr(instance, 'email', None)
+        if email and outros.alias(email_minusculo=Lower('email')).filter(
+            email_minusculo=email.lower()
+        ).exists():
+            raise serializers.ValidationError({'email': 'Já existe um funcionário com este email.'})
+        return attrs
 
 
-class FuncionarioListSerializer(serializers.ModelSerializer):
+class FuncionarioLoteSerializer(FuncionarioSerializer):
+    """
+    Item do POST /api/funcionarios/bulk/: só a validação dos campos. Existência
+    do funcionário e dos cadastros e unicidade de ramal/e-mail são verificadas
+    para o lote inteiro (ramais.gravacao_lote)
+    """
+    id = serializers.IntegerField(required=False)
+    departamento = serializers.IntegerField(required=False, allow_null=True)
+    funcao = serializers.IntegerField(required=False, allow_null=True)
+    unidade = serializers.IntegerField(required=False, allow_null=True)
+    departamento_nome = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    funcao_nome = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    unidade_nome = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate(self, attrs):
+        return attrs
+
+
+class FuncionarioListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer simplificado para listagem de funcionários
     """
@@ -221,4 +326,40 @@ class FuncionarioListSerializer(serializers.ModelSerializer):
     
     def get_unidade_nome(self, obj):
         """Retorna o nome da unidade ou None"""
-        return obj.unidade.nome if obj.unidade else None
\ No newline at end of file
+        return obj.unidade.nome if obj.unidade else None
+
+# Campos do FuncionarioListSerializer (mesma ordem) -> coluna no values_list
+CAMPOS_LISTAGEM_RAPIDA = (
+    ('id', 'id'),
+    ('nome', 'nome'),
+    ('ramal', 'ramal'),
+    ('email', 'email'),
+    ('whatsapp', 'whatsapp'),
+    ('teams', 'teams'),
+    ('departamento', 'departamento_id'),
+    ('departamento_nome', 'departamento__nome'),
+    ('funcao', 'funcao_id'),
+    ('funcao_nome', 'funcao__nome'),
+    ('unidade', 'unidade_id'),
+    ('unidade_nome', 'unidade__nome'),
+)
+
+
+def serializar_listagem_rapida(queryset, campos=None):
+    """
+    Caminho rápido (somente leitura) do FuncionarioListSerializer.
+
+    Lê tuplas planas com os nomes dos cadastros já no JOIN, sem instanciar
+    modelos nem passar pelos campos do DRF, e devolve exatamente a mesma
+    estrutura do serializer. Com ``campos`` (?fields=) só as colunas pedidas
+    são lidas, e os JOINs dos nomes não pedidos somem da query.
+    """
+    selecionados = [
+        (chave, coluna) for chave, coluna in CAMPOS_LISTAGEM_RAPIDA
+        if campos is None or chave in campos
+    ]
+    if not selecionados:
+        return [{} for _ in queryset.values_list('pk')]
+    chaves = [chave for chave, _ in selecionados]
+    colunas = [coluna for _, coluna in selecionados]
+    return [dict(zip(chaves, linha)) for linha in queryset.values_list(*colunas)]
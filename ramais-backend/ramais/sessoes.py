@@ -0,0 +1,48 @@
+"""
+Sessões em cache com gravação no banco (cached_db) e permanência limitada.
+
+O ``cached_db`` do Django guarda cada sessão no cache até ela expirar. Com
+o cache em memória, cada processo tem o seu: um logout feito num processo
+continuaria valendo nos outros até o fim da sessão. Aqui a entrada fica no
+cache no máximo RAMAIS_AUTH_CACHE_TTL segundos e depois é relida do banco.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+
+
+class _CacheLimitado:
+    """Cache com o tempo de permanência das entradas limitado"""
+
+    def __init__(self, cache, limite):
+        self.cache = cache
+        self.limite = limite
+
+    def _timeout(self, timeout):
+        return self.limite if timeout is None else min(timeout, self.limite)
+
+    # Todas as formas de gravar passam pelo limite, inclusive as assíncronas
+    # (o __getattr__ as entregaria direto ao cache, com o tempo da sessão)
+    def set(self, chave, valor, timeout=None):
+        return self.cache.set(chave, valor, self._timeout(timeout))
+
+    async def aset(self, chave, valor, timeout=None):
+        return await self.cache.aset(chave, valor, self._timeout(timeout))
+
+    def add(self, chave, valor, timeout=None):
+        return self.cache.add(chave, valor, self._timeout(timeout))
+
+    async def aadd(self, chave, valor, timeout=None):
+        return await self.cache.aadd(chave, valor, self._timeout(timeout))
+
+    def __getattr__(self, nome):
+        return getattr(self.cache, nome)
+
+    def __contains__(self, chave):
+        return chave in self.cache
+
+
+class SessionStore(cached_db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = _CacheLimitado(self._cache, settings.RAMAIS_AUTH_CACHE_TTL)
@@ -0,0 +1,106 @@
+"""
+Signals do app ramais - mantêm o índice de busca, a versão do diretório e o
+registro de alterações sincronizados com os dados
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import alteracoes, autenticacao, search, versao
+from .models import Usuario, Departamento, Funcao, Unidade, Funcionario
+
+MODELOS_DIRETORIO = (Departamento, Funcao, Unidade, Funcionario)
+
+
+@receiver(post_save, sender=Funcionario)
+def indexar_funcionario(sender, instance, raw=False, **kwargs):
+    """Atualiza o índice de busca ao salvar um funcionário"""
+    if raw:
+        return
+    search.indexar_funcionarios([instance])
+
+
+@receiver(post_delete, sender=Funcionario)
+def remover_funcionario_do_indice(sender, instance, **kwargs):
+    """Remove o funcionário excluído do índice de busca"""
+    search.remover_funcionarios([instance.pk])
+
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_save, sender=Funcao)
+@receiver(post_save, sender=Unidade)
+def reindexar_por_cadastro(sender, instance, created=False, raw=False, **kwargs):
+    """O nome do cadastro faz parte do índice dos funcionários vinculados"""
+    if raw or created:
+        return
+    vinculados = list(instance.funcionarios.values_list('pk', flat=True))
+    search.reindexar(vinculados)
+    # O nome do cadastro também aparece nos dados do funcionário
+    alteracoes.registrar(Funcionario, vinculados, alteracoes.ATUALIZADO)
+
+
+@receiver(pre_delete, sender=Departamento)
+@receiver(pre_delete, sender=Funcao)
+@receiver(pre_delete, sender=Unidade)
+def guardar_vinculados(sender, instance, **kwargs):
+    """Guarda os funcionários vinculados antes do SET_NULL da exclusão"""
+    instance._funcionarios_vinculados = list(
+        instance.funcionarios.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=Funcao)
+@receiver(post_delete, sender=Unidade)
+def reindexar_apos_exclusao(sender, instance, **kwargs):
+    """Reindexa os funcionários que perderam o vínculo"""
+    vinculados = getattr(instance, '_funcionarios_vinculados', [])
+    search.reindexar(vinculados)
+    alteracoes.registrar(Funcionario, vinculados, alteracoes.ATUALIZADO)
+
+
+def incrementar_versao_diretorio(sender, raw=False, **kwargs):
+    """Qualquer alteração no diretório invalida caches e ETags"""
+    if raw:
+        return
+    versao.incrementar_versao(versao.ESCOPO_DIRETORIO)
+
+
+def registrar_alteracao(sender, instance, created=False, raw=False, **kwargs):
+    """Registra criação, atualização ou desativação no feed de alterações"""
+    if raw:
+        return
+    alteracoes.registrar(
+        sender, [instance.pk], alteracoes.operacao_ao_salvar(instance, created)
+    )
+
+
+def registrar_exclusao(sender, instance, **kwargs):
+    """Exclusão definitiva vira um tombstone no feed de alterações"""
+    alteracoes.registrar(sender, [instance.pk], alteracoes.EXCLUIDO)
+
+
+for modelo in MODELOS_DIRETORIO:
+    post_save.connect(incrementar_versao_diretorio, sender=modelo)
+    post_delete.connect(incrementar_versao_diretorio, sender=modelo)
+    post_save.connect(registrar_alteracao, sender=modelo)
+    post_delete.connect(registrar_exclusao, sender=modelo)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def incrementar_versao_usuarios(sender, raw=False, **kwargs):
+    """Alterações em usuários invalidam os ETags de /api/usuarios/"""
+    if raw:
+        return
+    versao.incrementar_versao(versao.ESCOPO_USUARIOS)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_em_cache(sender, instance, **kwargs):
+    """Remove o usuário do cache de autenticação (ver ramais.autenticacao)"""
+    autenticacao.invalidar_usuario(instance.pk)
+    # De novo após o commit: uma requisição concorrente pode ter posto no
+    # cache a linha anterior enquanto a transação estava aberta
+    transaction.on_commit(lambda: autenticacao.invalidar_usuario(instance.pk))
@@ -0,0 +1,86 @@
+"""
+Cache em memória (por processo) de respostas já serializadas.
+
+Cada entrada guarda a versão do diretório com que foi gerada; quando a versão
+muda a entrada deixa de valer e é refeita na próxima leitura. O número de
+entradas é limitado (LRU) porque a chave inclui os filtros da requisição.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class SnapshotCache:
+    """Cache LRU versionado com contadores de acertos e falhas"""
+
+    def __init__(self, nome, max_entradas=256):
+        self.nome = nome
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, versao, construir):
+        """Retorna o valor da chave para a versão, construindo-o se preciso"""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versao:
+                self._entradas.move_to_end(chave)
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+
+        valor = construir()
+
+        with self._lock:
+            self._entradas[chave] = (versao, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def consultar(self, chave, versao):
+        """Valor da chave se já estiver em cache para a versão; senão None"""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versao:
+                return entrada[1]
+        return None
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entradas': len(self._entradas),
+            }
+
+
+# Caches registrados, expostos em /api/directory/cache/
+caches = {}
+
+
+def registrar_cache(nome, max_entradas=None):
+    """Cria (uma vez) e retorna o cache com o nome informado"""
+    if nome not in caches:
+        caches[nome] = SnapshotCache(
+            nome, max_entradas or getattr(settings, 'RAMAIS_SNAPSHOT_MAX_ENTRADAS', 256)
+        )
+    return caches[nome]
+
+
+def estatisticas():
+    return {nome: cache.estatisticas() for nome, cache in caches.items()}
+
+
+funcionarios_cache = registrar_cache('funcionarios')
+cadastros_cache = registrar_cache('cadastros')
+agenda_cache = registrar_cache('agenda')
@@ -1,3 +1,1461 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.admin.sites import site
+from django.contrib.auth.hashers import check_password
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import alteracoes, autocompletar, eventos, gravacao_lote, provisionamento, replica, snapshots, versao
+from .autenticacao import BackendUsuarioEmCache, chave_usuario
+from .banco import configurar_conexao, executar_escrita, pragmas_atuais
+from .benchmarks import ClienteSSE
+from .consulta import Termo, aplicar_consulta, analisar
+from .models import AlteracaoDiretorio, Usuario, Departamento, Funcao, Unidade, Funcionario
+from .numeros import normalizar_numero
+from .replica import RoteadorReplica, leitura_na_replica
+from .serializers import FuncionarioListSerializer, serializar_listagem_rapida
+from .sessoes import SessionStore
+
+
+def arquivo_temporario(teste, conteudo, sufixo='.csv'):
+    """Caminho de um arquivo com o conteúdo, removido ao fim do teste"""
+    descritor, caminho = tempfile.mkstemp(suffix=sufixo)
+    with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
+    teste.addCleanup(os.remove, caminho)
+    return caminho
+
+
+def executar_comando(nome, *args):
+    """Saída de um comando de gerenciamento"""
+    saida = StringIO()
+    call_command(nome, *args, stdout=saida)
+    return saida.getvalue()
+
+
+class RamaisAPITestCase(TestCase):
+    """Base com usuário autenticado e alguns cadastros"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='admin', password='senha123', is_admin=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+        self.assistencia = Departamento.objects.create(nome='Assistência Técnica')
+        self.compras = Departamento.objects.create(nome='Compras')
+        self.tecnico = Funcao.objects.create(nome='Assistente Técnico')
+        self.chiaperini = Unidade.objects.create(nome='Chiaperini')
+
+    def criar_funcionario(self, nome, **kwargs):
+        kwargs.setdefault('unidade', self.chiaperini)
+        return Funcionario.objects.create(nome=nome, **kwargs)
+
+    def listar(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class BuscaFuncionarioTests(RamaisAPITestCase):
+
+    def buscar(self, busca):
+        dados = self.listar('/api/funcionarios/', busca=busca)
+        return [item['nome'] for item in dados['results']]
+
+    def test_busca_ignora_acentos(self):
+        self.criar_funcionario('Adenílson', ramal='7243', departamento=self.assistencia)
+        self.criar_funcionario('Vera', ramal='7217', departamento=self.compras)
+
+        self.assertEqual(self.buscar('Adenilson'), ['Adenílson'])
+        self.assertEqual(self.buscar('assistencia'), ['Adenílson'])
+        self.assertEqual(self.buscar('721'), ['Vera'])
+
+    def test_busca_ordena_por_relevancia(self):
+        self.criar_funcionario('Ana', departamento=self.compras)
+        self.criar_funcionario('Zeca Compras', departamento=self.assistencia)
+
+        # Casar no nome pesa mais que casar no departamento
+        self.assertEqual(self.buscar('compras'), ['Zeca Compras', 'Ana'])
+
+    def test_indice_acompanha_alteracoes(self):
+        funcionario = self.criar_funcionario('Elaine', departamento=self.compras)
+
+        funcionario.nome = 'Elaine Ribeiro'
+        funcionario.save()
+        self.assertEqual(self.buscar('ribeiro'), ['Elaine Ribeiro'])
+
+        self.compras.nome = 'Suprimentos'
+        self.compras.save()
+        self.assertEqual(self.buscar('suprimentos'), ['Elaine Ribeiro'])
+
+        self.compras.delete()
+        self.assertEqual(self.buscar('suprimentos'), [])
+
+        funcionario.delete()
+        self.assertEqual(self.buscar('elaine'), [])
+
+
+class FuncionariosCountTests(RamaisAPITestCase):
+
+    def test_contagem_apenas_de_ativos(self):
+        self.criar_funcionario('Vera', departamento=self.compras)
+        self.criar_funcionario('Elaine', departamento=self.compras)
+        self.criar_funcionario('Antigo', departamento=self.compras, ativo=False)
+
+        dados = self.listar('/api/departamentos/')
+        contagens = {item['nome']: item['funcionarios_count'] for item in dados['results']}
+        self.assertEqual(contagens, {'Assistência Técnica': 0, 'Compras': 2})
+
+    def test_numero_de_queries_nao_depende_da_quantidade(self):
+        for url in ('/api/departamentos/', '/api/funcoes/', '/api/unidades/'):
+            with self.subTest(url=url):
+                # Versão (ETag) + COUNT da paginação + SELECT anotado
+                with self.assertNumQueries(3):
+                    self.listar(url)
+
+        for i in range(15):
+            departamento = Departamento.objects.create(nome=f'Departamento {i}')
+            funcao = Funcao.objects.create(nome=f'Função {i}')
+            unidade = Unidade.objects.create(nome=f'Unidade {i}')
+            self.criar_funcionario(
+                f'Funcionário {i}',
+                departamento=departamento, funcao=funcao, unidade=unidade
+            )
+
+        for url in ('/api/departamentos/', '/api/funcoes/', '/api/unidades/'):
+            with self.subTest(url=url):
+                with self.assertNumQueries(3):
+                    self.listar(url)
+
+
+class ImportacaoTests(TestCase):
+
+    def importar(self, *args):
+        return executar_comando('import_initial_data', *args)
+
+    def test_importacao_e_reimportacao(self):
+        saida = self.importar('--batch-size', '25')
+        total = Funcionario.objects.count()
+        self.assertGreater(total, 100)
+        self.assertIn(f'Funcionários criados: {total}', saida)
+        self.assertTrue(Funcionario.objects.filter(
+            nome='Adenílson', departamento__nome='Assistência Técnica'
+        ).exists())
+
+        saida = self.importar()
+        self.assertEqual(Funcionario.objects.count(), total)
+        self.assertIn('Funcionários criados: 0', saida)
+        self.assertIn('Funcionários atualizados: 0', saida)
+
+    def test_importacao_de_csv(self):
+        caminho = arquivo_temporario(self, (
+            'Nome;Ramal;E-mail;Função;Departamento;Unidade\n'
+            'Marília;7288;comex@chiaperini.com.br;ComÃ©rcio Exterior;Comex;Chiaperini\n'
+            ';7000;;;;\n'
+            'Yuri;7375;email-invalido;Custos;Compras;Chiaperini\n'
+        ))
+        saida = self.importar('--arquivo', caminho, '--progresso', '1')
+
+        self.assertIn('Linhas inválidas ignoradas: 1', saida)
+        self.assertIn('3 linhas lidas', saida)
+        marilia = Funcionario.objects.get(nome='Marília')
+        self.assertEqual(marilia.funcao.nome, 'Comércio Exterior')
+        self.assertIsNone(Funcionario.objects.get(nome='Yuri').email)
+
+    def test_importacao_de_dump_mysql(self):
+        caminho = arquivo_temporario(self, (
+            '-- Dump\n'
+            'INSERT INTO `outra` VALUES (1, \'x\');\n'
+            'INSERT INTO `pessoas` (`id`, `Ramal`, `Nome`, `Departamento`, `Skype`) VALUES\n'
+            "(1, '7010', 'Kall', 'TI-Infra', 'kall\\'s'),\n"
+            "(2, '7014', 'Lucas (TI; Infra)', 'TI-Infra', NULL);\n"
+        ), '.sql')
+        self.importar('--arquivo', caminho)
+
+        self.assertEqual(
+            sorted(Funcionario.objects.values_list('nome', 'teams')),
+            [('Kall', "kall's"), ('Lucas (TI; Infra)', None)]
+        )
+
+    def test_dry_run_nao_grava(self):
+        saida = self.importar('--dry-run')
+        self.assertIn('Dry-run', saida)
+        self.assertFalse(Funcionario.objects.exists())
+        self.assertFalse(Departamento.objects.exists())
+
+
+class SincronizacaoTests(TestCase):
+
+    CSV = (
+        'matricula,nome,ramal,departamento,unidade\n'
+        '100,Kall,7010,TI-Infra,Chiaperini\n'
+        '101,Leonardo,7254,TI-Infra,Chiaperini\n'
+        '102,José Jorge,7333,TI-Sistemas,Chiaperini\n'
+    )
+
+    def sincronizar(self, conteudo, sufixo='.csv'):
+        return executar_comando('sync_directory', arquivo_temporario(self, conteudo, sufixo))
+
+    def test_sincronizacao_sem_mudancas_nao_escreve(self):
+        self.sincronizar(self.CSV)
+        self.assertEqual(Funcionario.objects.filter(ativo=True).count(), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            saida = self.sincronizar(self.CSV)
+        escritas = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+        self.assertEqual(escritas, [])
+        self.assertIn('Inalterados: 3', saida)
+
+    def test_sincronizacao_altera_apenas_o_necessario(self):
+        self.sincronizar(self.CSV)
+        Funcionario.objects.create(nome='Cadastro manual')
+
+        saida = self.sincronizar(
+            'matricula,nome,ramal,departamento,unidade\n'
+            '100,Kall,7011,TI-Infra,Chiaperini\n'
+            '101,Leonardo,7254,TI-Infra,Chiaperini\n'
+            '103,Lucas Coelho,7014,TI-Infra,Chiaperini\n'
+        )
+        self.assertIn('Criados: 1', saida)
+        self.assertIn('Atualizados: 1', saida)
+        self.assertIn('Desativados: 1', saida)
+        self.assertIn('Inalterados: 1', saida)
+        self.assertEqual(Funcionario.objects.get(id_externo='100').ramal, '7011')
+        self.assertFalse(Funcionario.objects.get(id_externo='102').ativo)
+        # Cadastros sem id_externo não são afetados pela sincronização
+        self.assertTrue(Funcionario.objects.get(nome='Cadastro manual').ativo)
+
+    def test_sincronizacao_apos_importacao_inicial_vincula_cadastros(self):
+        executar_comando('import_initial_data', '--arquivo', arquivo_temporario(self, (
+            'Nome;Ramal;E-mail;Departamento;Unidade\n'
+            'Kall;7010;kall.ti@chiaperini.com.br;TI-Infra;Chiaperini\n'
+            'Leonardo;7254;;TI-Infra;Chiaperini\n'
+            'José Jorge;7333;;TI-Sistemas;Chiaperini\n'
+        )))
+        pks = set(Funcionario.objects.values_list('pk', flat=True))
+
+        saida = self.sincronizar(
+            'matricula,nome,ramal,email,departamento,unidade\n'
+            '100,Kall,7010,Kall.TI@chiaperini.com.br,TI-Infra,Chiaperini\n'
+            '101,Leonardo,7254,,TI-Infra,Chiaperini\n'
+            '102,José Jorge,7334,jose.jorge@chiaperini.com.br,TI-Sistemas,Chiaperini\n'
+        )
+        self.assertIn('Criados: 0', saida)
+        self.assertIn('Vinculados a cadastros sem ID externo: 3', saida)
+        self.assertNotIn('em conflito', saida)
+        self.assertEqual(set(Funcionario.objects.values_list('pk', flat=True)), pks)
+        self.assertEqual(
+            sorted(Funcionario.objects.filter(ativo=True).values_list('id_externo', 'ramal', 'email')),
+            [('100', '7010', 'Kall.TI@chiaperini.com.br'),
+             ('101', '7254', None),
+             ('102', '7334', 'jose.jorge@chiaperini.com.br')]
+        )
+
+        saida = self.sincronizar(
+            'matricula,nome,ramal,email,departamento,unidade\n'
+            '100,Kall,7010,Kall.TI@chiaperini.com.br,TI-Infra,Chiaperini\n'
+            '101,Leonardo,7254,,TI-Infra,Chiaperini\n'
+        )
+        self.assertIn('Inalterados: 2', saida)
+        self.assertIn('Desativados: 1', saida)
+        self.assertFalse(Funcionario.objects.get(id_externo='102').ativo)
+
+    def test_vinculo_respeita_email_diferente(self):
+        Funcionario.objects.create(nome='Kall', email='kall.antigo@chiaperini.com.br')
+        saida = self.sincronizar(
+            'matricula,nome,ramal,email,departamento,unidade\n'
+            '100,Kall,7010,kall.ti@chiaperini.com.br,TI-Infra,Chiaperini\n'
+        )
+        self.assertIn('Criados: 1', saida)
+        self.assertEqual(Funcionario.objects.filter(nome='Kall').count(), 2)
+
+    def test_sincronizacao_ldif(self):
+        self.sincronizar(
+            '# Exportação do AD\n'
+            'dn: CN=Kall,OU=TI,DC=chiaperini,DC=local\n'
+            'objectClass: user\n'
+            'displayName: Kall\n'
+            'ipPhone: 7010\n'
+            'mail: kall.ti@chiaperini.com.br\n'
+            'department: TI-\n'
+            ' Infra\n'
+            'sAMAccountName: kall\n'
+            '\n'
+            'dn: CN=Grupo TI,DC=chiaperini,DC=local\n'
+            'objectClass: group\n'
+            'cn: Grupo TI\n',
+            sufixo='.ldif'
+        )
+        kall = Funcionario.objects.get()
+        self.assertEqual(kall.id_externo, 'kall')
+        self.assertEqual(kall.departamento.nome, 'TI-Infra')
+
+
+class SnapshotCacheTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = snapshots.funcionarios_cache
+        self.cache.limpar()
+
+    def test_cache_e_invalidado_por_alteracoes(self):
+        funcionario = self.criar_funcionario('Vera', departamento=self.compras)
+        self.listar('/api/funcionarios/')
+
+        # Acerto no cache: apenas a leitura da versão
+        with self.assertNumQueries(1):
+            dados = self.listar('/api/funcionarios/', page=1)
+        self.assertEqual([f['nome'] for f in dados['results']], ['Vera'])
+        self.assertEqual(self.cache.estatisticas()['hits'], 1)
+
+        funcionario.nome = 'Vera Lúcia'
+        funcionario.save()
+        dados = self.listar('/api/funcionarios/')
+        self.assertEqual([f['nome'] for f in dados['results']], ['Vera Lúcia'])
+
+        self.compras.nome = 'Suprimentos'
+        self.compras.save()
+        dados = self.listar('/api/funcionarios/')
+        self.assertEqual(dados['results'][0]['departamento_nome'], 'Suprimentos')
+        self.assertEqual(self.cache.estatisticas()['misses'], 3)
+
+    def test_filtros_tem_entradas_proprias(self):
+        self.criar_funcionario('Vera', departamento=self.compras)
+        self.criar_funcionario('Adenílson', departamento=self.assistencia)
+
+        dados = self.listar('/api/funcionarios/', departamento_id=self.compras.pk)
+        self.assertEqual([f['nome'] for f in dados['results']], ['Vera'])
+        dados = self.listar('/api/funcionarios/')
+        self.assertEqual(len(dados['results']), 2)
+
+        estatisticas = self.listar('/api/directory/cache/')
+        self.assertEqual(estatisticas['caches']['funcionarios']['entradas'], 2)
+
+
+class ConditionalGetTests(RamaisAPITestCase):
+
+    def test_listagem_e_detalhe_respondem_304(self):
+        funcionario = self.criar_funcionario('Vera', departamento=self.compras)
+        for url in ('/api/funcionarios/', f'/api/funcionarios/{funcionario.pk}/',
+                    '/api/departamentos/', f'/api/unidades/{self.chiaperini.pk}/',
+                    '/api/usuarios/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+                # Apenas a leitura da versão, sem queryset nem serializer
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_muda_com_alteracoes_e_parametros(self):
+        funcionario = self.criar_funcionario('Vera', departamento=self.compras)
+        etag = self.client.get('/api/funcionarios/')['ETag']
+        self.assertNotEqual(
+            self.client.get('/api/funcionarios/', {'busca': 'vera'})['ETag'], etag
+        )
+
+        funcionario.ramal = '7217'
+        funcionario.save()
+        response = self.client.get('/api/funcionarios/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['ramal'], '7217')
+
+    def test_etag_por_usuario_so_onde_a_resposta_depende_dele(self):
+        outro = Usuario.objects.create_user(username='maria', password='senha123')
+        cliente = APIClient()
+        cliente.force_authenticate(outro)
+
+        for url in ('/api/funcionarios/', '/api/departamentos/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['ETag'], cliente.get(url)['ETag'])
+                self.assertIn('Cookie', response['Vary'])
+                self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        response = self.client.get('/api/usuarios/')
+        self.assertNotEqual(response['ETag'], cliente.get('/api/usuarios/')['ETag'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+
+class BootstrapTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for cache_snapshot in snapshots.caches.values():
+            cache_snapshot.limpar()
+
+    def test_bootstrap_traz_funcionarios_e_cadastros(self):
+        self.criar_funcionario('Vera', departamento=self.compras)
+        self.criar_funcionario('Adenílson', departamento=self.assistencia)
+
+        # Versão + funcionários + um SELECT anotado por cadastro
+        with self.assertNumQueries(5):
+            dados = self.listar('/api/directory/bootstrap/')
+        self.assertEqual([f['nome'] for f in dados['funcionarios']], ['Adenílson', 'Vera'])
+        contagens = {d['nome']: d['funcionarios_count'] for d in dados['departamentos']}
+        self.assertEqual(contagens, {'Assistência Técnica': 1, 'Compras': 1})
+        self.assertEqual(len(dados['funcoes']), 1)
+        self.assertEqual(dados['unidades'][0]['funcionarios_count'], 2)
+
+    def test_filtros_e_lookups_false(self):
+        self.criar_funcionario('Vera', departamento=self.compras)
+        self.criar_funcionario('Adenílson', departamento=self.assistencia)
+
+        dados = self.listar(
+            '/api/directory/bootstrap/',
+            departamento_id=self.compras.pk, lookups='false'
+        )
+        self.assertEqual([f['nome'] for f in dados['funcionarios']], ['Vera'])
+        self.assertNotIn('departamentos', dados)
+
+        dados = self.listar('/api/directory/bootstrap/', busca='adenilson')
+        self.assertEqual([f['nome'] for f in dados['funcionarios']], ['Adenílson'])
+
+
+class FeedAlteracoesTests(RamaisAPITestCase):
+
+    def feed(self, since=0, **params):
+        return self.listar('/api/funcionarios/changes/', since=since, **params)
+
+    def test_feed_retorna_apenas_o_que_mudou(self):
+        vera = self.criar_funcionario('Vera', departamento=self.compras)
+        cursor = self.feed()['cursor']
+
+        kall = self.criar_funcionario('Kall')
+        vera.ativo = False
+        vera.save()
+        dados = self.feed(cursor)
+        self.assertEqual(
+            [(a['modelo'], a['id'], a['operacao']) for a in dados['alteracoes']],
+            [('funcionario', kall.pk, 'criado'), ('funcionario', vera.pk, 'desativado')]
+        )
+        self.assertEqual(dados['alteracoes'][1]['dados']['ativo'], False)
+
+        # Exclusão definitiva gera tombstone
+        cursor = dados['cursor']
+        kall_id = kall.pk
+        self.client.delete(f'/api/funcionarios/{kall_id}/')
+        dados = self.feed(cursor)
+        self.assertEqual(
+            [(a['id'], a['operacao'], a['dados']) for a in dados['alteracoes']],
+            [(kall_id, 'excluido', None)]
+        )
+        self.assertEqual(self.feed(dados['cursor'])['alteracoes'], [])
+
+    def test_paginacao_por_cursor(self):
+        for i in range(5):
+            self.criar_funcionario(f'Funcionário {i}')
+
+        dados = self.feed(modelos='funcionario', limit=3)
+        self.assertTrue(dados['mais'])
+        self.assertEqual(len(dados['alteracoes']), 3)
+        dados = self.feed(dados['cursor'], modelos='funcionario', limit=3)
+        self.assertFalse(dados['mais'])
+        self.assertEqual(len(dados['alteracoes']), 2)
+
+        response = self.client.get('/api/funcionarios/changes/', {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_compactacao_mantem_ultima_entrada_de_cada_objeto(self):
+        vera = self.criar_funcionario('Vera')
+        for ramal in ('7217', '7218'):
+            vera.ramal = ramal
+            vera.save()
+        AlteracaoDiretorio.objects.update(alterado_em=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(alteracoes.compactar(30), 2)
+        self.assertEqual(
+            list(AlteracaoDiretorio.objects.filter(modelo='funcionario').values_list(
+                'objeto_id', 'operacao'
+            )),
+            [(vera.pk, 'atualizado')]
+        )
+        self.assertEqual(self.feed(modelos='funcionario')['alteracoes'][0]['dados']['ramal'], '7218')
+
+
+class EventosDiretorioTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Como o Client do Django: o request_started das conexões ASGI simuladas
+        # não pode fechar a conexão com o banco da transação do teste
+
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+
+        cliente = Client()
+        cliente.force_login(self.usuario)
+        self.cookie = f'sessionid={cliente.cookies["sessionid"].value}'
+
+    def conectar_e_aguardar(self, acao, cookie=None):
+        """Abre um stream, executa ``acao`` e devolve (status, eventos recebidos)"""
+
+        async def cenario():
+            cliente = ClienteSSE(get_asgi_application(), cookie or self.cookie).conectar()
+            await asyncio.wait_for(cliente.pronto.wait(), 5)
+            if cliente.status != 200:
+                await cliente.tarefa
+                return cliente.status, []
+            await sync_to_async(acao)()
+            recebidos = []
+            while True:
+                try:
+                    _, dados = await asyncio.wait_for(cliente.eventos.get(), 0.5)
+                except asyncio.TimeoutError:
+                    break
+                recebidos.append(dados)
+            await cliente.fechar()
+            return cliente.status, recebidos
+
+        return async_to_sync(cenario)()
+
+    def test_evento_publicado_apos_commit(self):
+        def alterar():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.criar_funcionario('Vera', departamento=self.compras)
+
+        status, recebidos = self.conectar_e_aguardar(alterar)
+        self.assertEqual(status, 200)
+        vera = Funcionario.objects.get(nome='Vera')
+        self.assertEqual(
+            [(e['entidade'], e['id'], e['operacao']) for e in recebidos],
+            [('funcionario', vera.pk, 'criado')]
+        )
+        self.assertIsNotNone(recebidos[0]['versao'])
+        # Desconexão cancela a assinatura
+        self.assertEqual(eventos.broadcaster.quantidade, 0)
+
+    def test_publicacao_usa_a_versao_gravada_sem_consulta(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.criar_funcionario('Vera')
+        publicadas = []
+        with mock.patch.object(eventos.Broadcaster, 'quantidade', new_callable=mock.PropertyMock,
+                               return_value=1), \
+                mock.patch.object(eventos.broadcaster, 'publicar', side_effect=publicadas.append), \
+                self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+        self.assertIn(f'"versao": {versao.versao_atual()[0]}', publicadas[0])
+
+    def test_sem_commit_nao_publica(self):
+        status, recebidos = self.conectar_e_aguardar(
+            lambda: self.criar_funcionario('Vera')
+        )
+        self.assertEqual((status, recebidos), (200, []))
+
+    def test_exige_autenticacao(self):
+        status, _ = self.conectar_e_aguardar(lambda: None, cookie='sessionid=invalida')
+        self.assertEqual(status, 403)
+
+
+class PaginacaoCursorTests(RamaisAPITestCase):
+
+    @staticmethod
+    def cursor(url):
+        return parse_qs(urlparse(url).query)['cursor'][0]
+
+    def setUp(self):
+        super().setUp()
+        snapshots.funcionarios_cache.limpar()
+        # Nomes repetidos: o desempate é pelo id
+        for i in range(12):
+            self.criar_funcionario(f'Funcionário {i // 2:02d}')
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        vistos = []
+        params = {'paginacao': 'cursor', 'page_size': 5}
+        while True:
+            dados = self.listar('/api/funcionarios/', **params)
+            self.assertNotIn('count', dados)
+            vistos.extend(item['id'] for item in dados['results'])
+            if not dados['next']:
+                break
+            params['cursor'] = self.cursor(dados['next'])
+
+        esperado = list(Funcionario.objects.order_by('nome', 'pk').values_list('pk', flat=True))
+        self.assertEqual(vistos, esperado)
+
+    def test_custo_constante_sem_contagem(self):
+        dados = self.listar('/api/funcionarios/', paginacao='cursor', page_size=5)
+        cursor = self.cursor(dados['next'])
+        # Versão (ETag) + SELECT da página, sem COUNT nem OFFSET
+        with self.assertNumQueries(2):
+            self.listar('/api/funcionarios/', cursor=cursor, page_size=5)
+
+    def test_modos_de_contagem(self):
+        dados = self.listar('/api/funcionarios/', paginacao='cursor', count='exact')
+        self.assertEqual((dados['count'], dados['count_exato']), (12, True))
+
+        with mock.patch('ramais.paginacao.LIMITE_ESTIMATIVA', 10):
+            dados = self.listar('/api/funcionarios/', paginacao='cursor', count='estimate')
+        self.assertEqual((dados['count'], dados['count_exato']), (10, False))
+
+        # Com o snapshot da listagem em cache a estimativa é exata e sem COUNT
+        self.listar('/api/funcionarios/')
+        with self.assertNumQueries(2):
+            dados = self.listar('/api/funcionarios/', paginacao='cursor', count='estimate')
+        self.assertEqual((dados['count'], dados['count_exato']), (12, True))
+
+        response = self.client.get('/api/funcionarios/', {'cursor': 'inválido'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SerializacaoRapidaTests(RamaisAPITestCase):
+
+    def test_mesmo_formato_do_serializer(self):
+        self.criar_funcionario(
+            'Vera', ramal='7217', email='compras@chiaperini.com.br',
+            whatsapp='(16) 99999-0000', teams='vera', departamento=self.compras,
+            funcao=self.tecnico
+        )
+        self.criar_funcionario('Sem Cadastros', unidade=None)
+
+        queryset = Funcionario.objects.select_related(
+            'departamento', 'funcao', 'unidade'
+        ).order_by('nome')
+        esperado = FuncionarioListSerializer(queryset, many=True).data
+        rapido = serializar_listagem_rapida(queryset)
+        self.assertEqual(rapido, [dict(item) for item in esperado])
+        self.assertEqual([list(item) for item in rapido], [list(item) for item in esperado])
+
+
+class CamposEsparsosTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        snapshots.funcionarios_cache.limpar()
+        self.vera = self.criar_funcionario('Vera', ramal='7217', departamento=self.compras)
+
+    def test_fields_e_omit(self):
+        dados = self.listar('/api/funcionarios/', fields='nome,ramal')
+        self.assertEqual(dados['results'], [{'nome': 'Vera', 'ramal': '7217'}])
+
+        dados = self.listar(f'/api/funcionarios/{self.vera.pk}/', omit='email,whatsapp,teams')
+        self.assertNotIn('email', dados)
+        self.assertEqual(dados['departamento_nome'], 'Compras')
+
+        dados = self.listar('/api/usuarios/', fields='username')
+        self.assertEqual(dados['results'], [{'username': 'admin'}])
+
+        response = self.client.get('/api/funcionarios/', {'fields': 'nome,senha'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_poda_joins_e_contagem(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.listar('/api/funcionarios/', fields='nome,ramal')
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            dados = self.listar('/api/departamentos/', omit='funcionarios_count')
+        self.assertNotIn('funcionarios_count', dados['results'][0])
+        self.assertFalse(any('JOIN' in q['sql'] for q in queries.captured_queries))
+
+    def test_escrita_ignora_fields(self):
+        response = self.client.post(
+            '/api/departamentos/?fields=nome', {'nome': 'Logística'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('funcionarios_count', response.json())
+
+
+class AgendaTelefonicaTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.criar_funcionario(
+            'Vera', ramal='72-17', departamento=self.compras, whatsapp='(16) 99999-0000'
+        )
+        self.criar_funcionario('Adenílson & Cia', ramal='7243', departamento=self.assistencia)
+        self.criar_funcionario('Sem Ramal', departamento=self.compras)
+
+    def baixar(self, formato, cliente=None, **params):
+        response = (cliente or self.client).get(f'/api/directory/phonebook/{formato}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_formatos(self):
+        raiz = ET.fromstring(self.baixar('yealink').content)
+        grupos = {menu.get('Name'): [u.get('Phone1') for u in menu] for menu in raiz.iter('Menu')}
+        self.assertEqual(grupos, {'Assistência Técnica': ['7243'], 'Compras': ['7217']})
+
+        raiz = ET.fromstring(self.baixar('grandstream').content)
+        self.assertEqual(len(raiz.findall('pbgroup')), 2)
+        self.assertEqual(len(raiz.findall('Contact')), 2)
+
+        raiz = ET.fromstring(self.baixar('microsip', agrupar='unidade').content)
+        self.assertEqual(
+            sorted((c.get('name'), c.get('number'), c.get('comment')) for c in raiz),
+            [('Adenílson & Cia', '7243', 'Chiaperini'), ('Vera', '7217', 'Chiaperini')]
+        )
+
+        response = self.baixar('vcard')
+        self.assertTrue(response['Content-Type'].startswith('text/vcard'))
+        texto = response.content.decode()
+        self.assertEqual(texto.count('BEGIN:VCARD'), 2)
+        self.assertIn('TEL;TYPE=CELL:16999990000\r\n', texto)
+
+        response = self.client.get('/api/directory/phonebook/csv/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_gerada_uma_vez_por_versao_e_get_condicional(self):
+        snapshots.agenda_cache.limpar()
+
+        etag = self.baixar('yealink')['ETag']
+        self.baixar('yealink')
+        self.assertEqual(snapshots.agenda_cache.estatisticas()['hits'], 1)
+        response = self.client.get('/api/directory/phonebook/yealink/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.criar_funcionario('Kall', ramal='7010')
+        self.assertIn(b'7010', self.baixar('yealink').content)
+
+    def test_acesso_por_token_ou_basic(self):
+        anonimo = APIClient()
+        response = anonimo.get('/api/directory/phonebook/microsip/', {'token': 'segredo'})
+        self.assertIn(response.status_code, (401, 403))
+
+        with self.settings(RAMAIS_AGENDA_TOKEN='segredo'):
+            self.baixar('microsip', cliente=anonimo, token='segredo')
+
+        credenciais = base64.b64encode(b'admin:senha123').decode()
+        anonimo.credentials(HTTP_AUTHORIZATION=f'Basic {credenciais}')
+        self.baixar('microsip', cliente=anonimo)
+
+
+class IdentificacaoChamadaTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.vera = self.criar_funcionario(
+            'Vera', ramal='7217', whatsapp='16981181872', departamento=self.compras
+        )
+        self.criar_funcionario('Recepção', ramal='16 3954 9420')
+
+    def test_normalizacao(self):
+        for numero in ('+55 (16) 98118-1872', '016 98118-1872', '0 15 16 98118-1872',
+                       '16981181872', '981181872', '0055 16 981181872'):
+            with self.subTest(numero=numero):
+                self.assertEqual(normalizar_numero(numero), '981181872')
+        self.assertEqual(normalizar_numero('72-17'), '7217')
+        self.assertEqual(normalizar_numero('(16) 3954-9420'), '39549420')
+
+    def consultar(self, numero):
+        return self.client.get(f'/api/lookup/number/{numero}/')
+
+    def test_consulta_por_ramal_e_whatsapp(self):
+        for numero in ('7217', '+5516981181872', '81181872'):
+            with self.subTest(numero=numero):
+                response = self.consultar(numero)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['nome'], 'Vera')
+        self.assertEqual(self.consultar('1639549420').json()['nome'], 'Recepção')
+        self.assertEqual(self.consultar('7999').status_code, 404)
+
+    def test_nono_digito_so_para_celulares(self):
+        self.criar_funcionario('Portaria', ramal='(16) 8118-1872')
+        self.criar_funcionario('Sem DDD', whatsapp='912345678')
+        # O fixo de 8 dígitos casa exatamente e vem antes do celular
+        for numero in ('81181872', '1681181872'):
+            with self.subTest(numero=numero):
+                resultados = self.consultar(numero).json()['resultados']
+                self.assertEqual([r['nome'] for r in resultados], ['Portaria', 'Vera'])
+        self.assertEqual(
+            [r['nome'] for r in self.consultar('16981181872').json()['resultados']], ['Vera', 'Portaria']
+        )
+        # 9 dígitos sem DDD não são tratados como celular
+        self.assertEqual(self.consultar('12345678').status_code, 404)
+        self.assertEqual(self.consultar('912345678').json()['nome'], 'Sem DDD')
+
+    def test_indice_refeito_quando_o_diretorio_muda(self):
+        self.assertEqual(self.consultar('7217').json()['resultados'][0]['tipo'], 'ramal')
+        self.vera.ramal = '7218'
+        self.vera.save()
+        self.assertEqual(self.consultar('7217').status_code, 404)
+        self.assertEqual(self.consultar('7218').json()['nome'], 'Vera')
+
+
+class AutocompletarTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # A trie é por processo: cada teste começa de uma carga completa
+        autocompletar.indice.versao = None
+        self.leo = self.criar_funcionario('Leonardo Gomes', ramal='7243', departamento=self.assistencia)
+        self.criar_funcionario('Letícia Braga', ramal='7217', departamento=self.compras)
+        self.criar_funcionario('Marcos Leão', ramal='7300', departamento=self.compras)
+
+    def sugerir(self, texto, **params):
+        dados = self.listar('/api/funcionarios/autocomplete/', q=texto, **params)
+        return [item['nome'] for item in dados['resultados']]
+
+    def test_prefixos_de_nome_departamento_e_ramal(self):
+        # Primeiro nome antes de sobrenome; sem acentos
+        self.assertEqual(self.sugerir('le'), ['Leonardo Gomes', 'Letícia Braga', 'Marcos Leão'])
+        self.assertEqual(self.sugerir('leao'), ['Marcos Leão'])
+        self.assertEqual(self.sugerir('assist'), ['Leonardo Gomes'])
+        self.assertEqual(self.sugerir('72'), ['Leonardo Gomes', 'Letícia Braga'])
+        self.assertEqual(self.sugerir('le comp'), ['Letícia Braga', 'Marcos Leão'])
+        self.assertEqual(self.sugerir('le', limit=1), ['Leonardo Gomes'])
+        self.assertEqual(self.sugerir('xyz'), [])
+        self.assertEqual(self.sugerir(''), [])
+
+    def test_atualizacao_incremental(self):
+        self.assertEqual(self.sugerir('leon'), ['Leonardo Gomes'])
+        remontagens = []
+        original = autocompletar.indice._remontar
+        autocompletar.indice._remontar = lambda: remontagens.append(1) or original()
+        try:
+            self.leo.nome = 'Leandro Gomes'
+            self.leo.save()
+            self.assertEqual(self.sugerir('leon'), [])
+            self.assertEqual(self.sugerir('lea'), ['Leandro Gomes', 'Marcos Leão'])
+
+            self.compras.nome = 'Suprimentos'
+            self.compras.save()
+            self.assertEqual(self.sugerir('supr'), ['Letícia Braga', 'Marcos Leão'])
+
+            self.leo.delete()
+            self.assertEqual(self.sugerir('gomes'), [])
+        finally:
+            del autocompletar.indice._remontar
+        self.assertEqual(remontagens, [])
+
+
+class BuscaAproximadaTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calderaria = Departamento.objects.create(nome='Caldeiraria')
+        self.supply = Departamento.objects.create(nome='Suppy chain')
+        self.criar_funcionario('Marília Gomes', departamento=self.compras)
+        self.criar_funcionario('Adenílson Pereira', departamento=self.assistencia, funcao=self.tecnico)
+        self.criar_funcionario('Rodrigo Lima', departamento=self.calderaria)
+        self.criar_funcionario('Caroline Braga', departamento=self.supply)
+
+    def buscar(self, busca):
+        dados = self.listar('/api/funcionarios/', busca=busca, fuzzy='true')
+        return [item['nome'] for item in dados['results']]
+
+    def test_tolera_erros_de_digitacao(self):
+        self.assertEqual(self.buscar('Marilia'), ['Marília Gomes'])
+        self.assertEqual(self.buscar('Adenilsom'), ['Adenílson Pereira'])
+        self.assertEqual(self.buscar('Calderaria'), ['Rodrigo Lima'])
+        self.assertEqual(self.buscar('Supply chain'), ['Caroline Braga'])
+        self.assertEqual(self.buscar('xpto'), [])
+
+    def test_nome_pesa_mais_que_departamento_e_funcao(self):
+        self.criar_funcionario('Técnico Silva', departamento=self.compras)
+        self.assertEqual(self.buscar('tecnico'), ['Técnico Silva', 'Adenílson Pereira'])
+
+    def test_sem_corte_antes_dos_filtros_e_da_paginacao(self):
+        Funcionario.objects.bulk_create([
+            Funcionario(nome=f'Rodrigo {n:03}', departamento=self.assistencia) for n in range(210)
+        ])
+        rodrigo_compras = self.criar_funcionario('Rodrigo Compras', departamento=self.compras)
+        dados = self.listar('/api/funcionarios/', busca='Rodrgo', fuzzy='true',
+                            departamento_id=self.compras.pk)
+        self.assertEqual([item['id'] for item in dados['results']], [rodrigo_compras.pk])
+        dados = self.listar('/api/funcionarios/', busca='Rodrgo', fuzzy='true')
+        self.assertEqual(dados['count'], 212)
+
+    def test_indice_refeito_quando_o_diretorio_muda(self):
+        self.assertEqual(self.buscar('Rodrigo'), ['Rodrigo Lima'])
+        self.criar_funcionario('Rodrigues Lima', departamento=self.compras)
+        self.assertEqual(self.buscar('Rodrigo'), ['Rodrigo Lima', 'Rodrigues Lima'])
+
+
+class LinguagemConsultaTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.infra = Departamento.objects.create(nome='TI-Infra')
+        self.techto = Unidade.objects.create(nome='Techto')
+        self.criar_funcionario('Leonardo Gomes', ramal='7243', email='Leonardo.Gomes@chiaperini.com.br',
+                               departamento=self.infra)
+        self.criar_funcionario('Letícia Braga', ramal='7217', departamento=self.compras, funcao=self.tecnico)
+        self.criar_funcionario('Marcos Leão', ramal='8120', departamento=self.compras, unidade=self.techto)
+
+    def buscar(self, busca):
+        dados = self.listar('/api/funcionarios/', busca=busca)
+        return sorted(item['nome'] for item in dados['results'])
+
+    def test_analisar(self):
+        self.assertEqual(analisar('ramal:72* -dept:"TI-Infra" leo 10:30'), [
+            Termo('ramal', '72', True, False),
+            Termo('departamento', 'TI-Infra', False, True),
+            Termo(None, 'leo', False, False),
+            Termo(None, '10:30', False, False),
+        ])
+
+    def test_termos_por_campo(self):
+        self.assertEqual(self.buscar('ramal:72*'), ['Leonardo Gomes', 'Letícia Braga'])
+        self.assertEqual(self.buscar('ramal:7217'), ['Letícia Braga'])
+        self.assertEqual(self.buscar('dept:"ti-infra"'), ['Leonardo Gomes'])
+        self.assertEqual(self.buscar('unidade:Chiaperini dept:Compras'), ['Letícia Braga'])
+        self.assertEqual(self.buscar('funcao:assistente*'), ['Letícia Braga'])
+        self.assertEqual(self.buscar('email:leonardo.gomes@CHIAPERINI.com.br'), ['Leonardo Gomes'])
+        # Prefixo de qualquer palavra do nome
+        self.assertEqual(self.buscar('nome:le*'), ['Leonardo Gomes', 'Letícia Braga', 'Marcos Leão'])
+        self.assertEqual(self.buscar('nome:go*'), ['Leonardo Gomes'])
+        self.assertEqual(self.buscar('nome:"leticia braga"'), ['Letícia Braga'])
+        self.assertEqual(self.buscar('dept:inexistente'), [])
+
+    def test_negacao_e_texto_livre(self):
+        self.assertEqual(self.buscar('-dept:compras'), ['Leonardo Gomes'])
+        self.assertEqual(self.buscar('ramal:7* -nome:leonardo'), ['Letícia Braga'])
+        self.assertEqual(self.buscar('le -gomes'), ['Letícia Braga', 'Marcos Leão'])
+        self.assertEqual(self.buscar('compras ramal:8*'), ['Marcos Leão'])
+
+    def test_negacao_mantem_campos_nulos(self):
+        self.criar_funcionario('Sem Ramal', ramal=None, email=None)
+        self.assertEqual(self.buscar('-ramal:72*'), ['Marcos Leão', 'Sem Ramal'])
+        self.assertEqual(self.buscar('-ramal:7217'), ['Leonardo Gomes', 'Marcos Leão', 'Sem Ramal'])
+        self.assertEqual(self.buscar('-email:leonardo*'), ['Letícia Braga', 'Marcos Leão', 'Sem Ramal'])
+        self.assertEqual(self.buscar('-email:leonardo.gomes@chiaperini.com.br'),
+                         ['Letícia Braga', 'Marcos Leão', 'Sem Ramal'])
+
+    def plano(self, busca):
+        queryset, _ = aplicar_consulta(Funcionario.objects.filter(ativo=True), busca)
+        return queryset.order_by('nome').explain()
+
+    def test_planos_usam_indices(self):
+        esperados = {
+            'ramal:72*': 'USING INDEX ramais_func_ramal_ativo_uniq (ramal>? AND ramal<?)',
+            'ramal:7217': 'USING INDEX ramais_func_ramal_ativo_uniq (ramal=?)',
+            'email:leonardo*': 'USING INDEX ramais_func_email_ativo_uniq',
+            'dept:"TI-Infra"': 'USING INDEX ramais_func_ativo_depto_idx',
+            'funcao:assistente*': 'USING INDEX ramais_func_ativo_funcao_idx',
+            'unidade:techto': 'USING INDEX ramais_func_ativo_unidade_idx',
+            'nome:leo*': 'VIRTUAL TABLE INDEX',
+            'ramal:7* -nome:leonardo': 'USING INDEX ramais_func_ramal_ativo_uniq',
+            'ramal:7* -dept:compras': 'USING INDEX ramais_func_ramal_ativo_uniq',
+        }
+        for busca, indice in esperados.items():
+            with self.subTest(busca=busca):
+                plano = self.plano(busca)
+                self.assertIn(indice, plano)
+                # Nenhuma varredura completa da tabela de funcionários
+                for linha in plano.splitlines():
+                    if 'SCAN' in linha:
+                        self.assertIn('VIRTUAL TABLE INDEX', linha)
+
+
+class UnicidadeRamalEmailTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.kall = self.criar_funcionario('Kall', ramal='7010', email='kall@chiaperini.com.br',
+                                           departamento=self.compras)
+
+    def test_restricao_vale_apenas_entre_ativos(self):
+        for campos in ({'ramal': '7010'}, {'email': 'KALL@chiaperini.com.br'}):
+            with self.subTest(campos=campos), self.assertRaises(IntegrityError), transaction.atomic():
+                self.criar_funcionario('Outro', **campos)
+        self.criar_funcionario('Antigo', ramal='7010', email='kall@chiaperini.com.br', ativo=False)
+        # Vários funcionários sem ramal/e-mail
+        self.criar_funcionario('Sem ramal 1')
+        self.criar_funcionario('Sem ramal 2')
+
+    def test_api_recusa_duplicados(self):
+        for campos in ({'ramal': '7010'}, {'email': 'Kall@Chiaperini.com.br'}):
+            with self.subTest(campos=campos):
+                response = self.client.post('/api/funcionarios/', {'nome': 'Outro', **campos}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(campos)), response.json())
+        response = self.client.patch(f'/api/funcionarios/{self.kall.pk}/', {'ramal': '7010'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # Cadastro inativo pode repetir o ramal de um ativo
+        response = self.client.post('/api/funcionarios/', {'nome': 'Antigo', 'ramal': '7010', 'ativo': False},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_sincronizacao_deixa_conflito_em_branco(self):
+        saida = executar_comando('sync_directory', arquivo_temporario(self, (
+            'matricula,nome,ramal,email\n'
+            '100,Kall AD,7010,outro@chiaperini.com.br\n'
+            '101,Leonardo,7254,outro@chiaperini.com.br\n'
+        )))
+
+        self.assertIn('Ramais/e-mails em conflito deixados em branco: 2', saida)
+        kall_ad = Funcionario.objects.get(id_externo='100')
+        self.assertIsNone(kall_ad.ramal)
+        self.assertEqual(kall_ad.email, 'outro@chiaperini.com.br')
+        self.assertIsNone(Funcionario.objects.get(id_externo='101').email)
+        # Sem assinatura a linha é reaplicada na próxima sincronização
+        self.assertEqual(kall_ad.assinatura, '')
+
+    def test_planos_usam_indices_parciais(self):
+        ativos = Funcionario.objects.filter(ativo=True)
+        planos = {
+            'ramais_func_ativo_nome_idx': ativos.order_by('nome', 'id'),
+            'ramais_func_ativo_depto_idx': ativos.filter(departamento=self.compras).order_by('nome'),
+            'ramais_func_ramal_ativo_uniq': ativos.filter(ramal='7010').exclude(pk=self.kall.pk),
+        }
+        for indice, queryset in planos.items():
+            with self.subTest(indice=indice):
+                plano = queryset.explain()
+                self.assertIn(f'USING INDEX {indice}', plano)
+                self.assertNotIn('TEMP B-TREE', plano)
+
+
+class ExportacaoTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.criar_funcionario('Marília', ramal='07288', email='comex@chiaperini.com.br',
+                               departamento=self.compras)
+        self.criar_funcionario('Kall <TI>', ramal='7010', departamento=self.assistencia, funcao=self.tecnico)
+        self.criar_funcionario('Antigo', ramal='7011', ativo=False)
+
+    def baixar(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv_com_filtros_da_listagem(self):
+        conteudo = self.baixar('/api/funcionarios/export.csv').decode('utf-8-sig')
+        linhas = list(csv.reader(io.StringIO(conteudo), delimiter=';'))
+        self.assertEqual(linhas[0][:3], ['Nome', 'Ramal', 'E-mail'])
+        self.assertEqual(linhas[1:], [
+            ['Kall <TI>', '7010', '', '', '', 'Assistência Técnica', 'Assistente Técnico', 'Chiaperini'],
+            ['Marília', '07288', 'comex@chiaperini.com.br', '', '', 'Compras', '', 'Chiaperini'],
+        ])
+
+        conteudo = self.baixar('/api/funcionarios/export.csv', departamento_id=self.compras.pk)
+        self.assertEqual(len(conteudo.decode('utf-8-sig').splitlines()), 2)
+        conteudo = self.baixar('/api/funcionarios/export.csv', busca='ramal:70*')
+        self.assertIn('Kall', conteudo.decode('utf-8-sig'))
+        self.assertNotIn('Marília', conteudo.decode('utf-8-sig'))
+
+    def test_xlsx(self):
+        conteudo = self.baixar('/api/funcionarios/export.xlsx')
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            self.assertIsNone(arquivo.testzip())
+            planilha = arquivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(planilha.count('<row>'), 3)
+        self.assertIn('<t xml:space="preserve">Kall &lt;TI&gt;</t>', planilha)
+        self.assertIn('<t xml:space="preserve">07288</t>', planilha)
+
+    def test_formato_desconhecido(self):
+        self.assertEqual(self.client.get('/api/funcionarios/export.pdf').status_code, 404)
+
+    def test_acao_do_admin(self):
+        admin_funcionario = site._registry[Funcionario]
+        resposta = admin_funcionario.exportar_csv(None, Funcionario.objects.filter(ramal__startswith='70'))
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        self.assertEqual([linha.split(';')[0] for linha in conteudo.splitlines()], ['Nome', 'Antigo', 'Kall <TI>'])
+
+
+class MigracaoUnicidadeTests(TransactionTestCase):
+    """A migration das restrições de unicidade para diante de repetidos, sem apagar contatos"""
+
+    ANTES = [('ramais', '0008_funcionario_nome_id_idx')]
+    DEPOIS = [('ramais', '0009_funcionario_indices_parciais')]
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def tearDown(self):
+        self.migrar(self.DEPOIS)
+
+    def test_migration_lista_repetidos_e_nao_altera_contatos(self):
+        Funcionario = self.migrar(self.ANTES).get_model('ramais', 'Funcionario')
+        interno = Funcionario.objects.create(nome='Leandro Interno', ramal='', email='leandroferrari@chiaperini.com.br')
+        externo = Funcionario.objects.create(nome='Leandro Externo', email='LeandroFerrari@chiaperini.com.br')
+
+        with self.assertRaises(CommandError) as erro:
+            self.migrar(self.DEPOIS)
+        self.assertIn(f'Leandro Interno (id {interno.pk}), Leandro Externo (id {externo.pk})',
+                      str(erro.exception))
+        with self.assertRaises(CommandError):
+            call_command('verificar_unicidade', stdout=StringIO())
+        self.assertEqual(
+            sorted(Funcionario.objects.values_list('email', flat=True)),
+            ['LeandroFerrari@chiaperini.com.br', 'leandroferrari@chiaperini.com.br']
+        )
+
+        # Resolvido pelo operador, a migration passa
+        Funcionario.objects.filter(pk=externo.pk).update(ativo=False)
+        self.migrar(self.DEPOIS)
+        self.assertIsNone(Funcionario.objects.get(pk=interno.pk).ramal)
+        self.assertIn('Nenhum', executar_comando('verificar_unicidade'))
+
+
+class PerfilBancoTests(TransactionTestCase):
+    """Fora da transação do TestCase: executar_escrita só repete sem transação externa"""
+
+    def test_pragmas_aplicados_em_conexoes_novas(self):
+        with self.settings(RAMAIS_SQLITE_PRAGMAS={'synchronous': 'OFF', 'cache_size': -1234}):
+            configurar_conexao(sender=None, connection=connection)
+            self.assertEqual(pragmas_atuais(), {'synchronous': 0, 'cache_size': -1234})
+        with self.settings(RAMAIS_SQLITE_PRAGMAS={'synchronous': 'FULL', 'cache_size': -2000}):
+            configurar_conexao(sender=None, connection=connection)
+
+    def test_escrita_repetida_enquanto_ocupado(self):
+        chamadas = []
+
+        def gravar():
+            chamadas.append(1)
+            Departamento.objects.create(nome=f'Tentativa {len(chamadas)}')
+            if len(chamadas) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        with self.settings(RAMAIS_ESCRITA_ESPERA=0):
+            self.assertEqual(executar_escrita(gravar), 'ok')
+        self.assertEqual(len(chamadas), 3)
+        # As tentativas que falharam foram desfeitas
+        self.assertEqual(list(Departamento.objects.values_list('nome', flat=True)), ['Tentativa 3'])
+
+    def test_sem_repeticao_para_outros_erros_e_dentro_de_transacao(self):
+        chamadas = []
+
+        def gravar(mensagem):
+            chamadas.append(1)
+            raise OperationalError(mensagem)
+
+        with self.assertRaises(OperationalError):
+            executar_escrita(gravar, 'no such table: x')
+        with self.assertRaises(OperationalError), transaction.atomic():
+            executar_escrita(gravar, 'database is locked')
+        self.assertEqual(len(chamadas), 2)
+
+
+class ReplicaLeituraTests(RamaisAPITestCase):
+
+    def test_roteador_manda_leituras_do_diretorio_para_a_replica(self):
+        roteador = RoteadorReplica()
+        self.assertEqual(roteador.db_for_read(Funcionario), 'default')
+        with leitura_na_replica():
+            self.assertEqual(roteador.db_for_read(Funcionario), 'replica')
+            # Usuários (e sessões) ficam no banco principal
+            self.assertEqual(roteador.db_for_read(Usuario), 'default')
+            self.assertEqual(roteador.db_for_write(Funcionario), 'default')
+        self.assertFalse(roteador.allow_migrate('replica', 'ramais'))
+
+    def test_escrita_grava_cookie_de_aderencia(self):
+        with mock.patch('ramais.replica.configurada', return_value=True):
+            response = self.client.post('/api/departamentos/', {'nome': 'Vendas'}, format='json')
+            self.assertEqual(response.status_code, 201)
+            cookie = response.cookies[replica.COOKIE_VERSAO_ESCRITA]
+            self.assertEqual(int(cookie.value), versao.versao_atual()[0])
+
+            # Leitura não grava o cookie
+            response = self.client.get('/api/departamentos/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(replica.COOKIE_VERSAO_ESCRITA, response.cookies)
+
+    def test_sem_replica_nao_ha_cookie(self):
+        response = self.client.post('/api/departamentos/', {'nome': 'Vendas'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(replica.COOKIE_VERSAO_ESCRITA, response.cookies)
+
+    def test_cliente_le_do_principal_ate_a_replica_alcancar_sua_escrita(self):
+        request = RequestFactory().get('/api/funcionarios/')
+        self.assertTrue(replica.pode_ler_da_replica(request))
+
+        request.COOKIES[replica.COOKIE_VERSAO_ESCRITA] = '10'
+        with mock.patch('ramais.versao.versao_atual', return_value=(9, None)):
+            self.assertFalse(replica.pode_ler_da_replica(request))
+        with mock.patch('ramais.versao.versao_atual', return_value=(10, None)):
+            self.assertTrue(replica.pode_ler_da_replica(request))
+
+
+class AutenticacaoEmCacheTests(RamaisAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.comum = Usuario.objects.create_user(username='comum', password='senha123')
+        self.sessao = APIClient()
+        self.sessao.login(username='comum', password='senha123')
+
+    def test_usuario_da_sessao_vem_do_cache(self):
+        backend = BackendUsuarioEmCache()
+        self.assertEqual(backend.get_user(self.comum.pk), self.comum)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.comum.pk), self.comum)
+
+        # Depois da primeira requisição nem sessão nem usuário vão ao banco
+        self.assertEqual(self.sessao.get('/api/auth/me/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sessao.get('/api/auth/me/').json()['username'], 'comum')
+
+    def test_cache_nao_guarda_o_hash_da_senha(self):
+        backend = BackendUsuarioEmCache()
+        backend.get_user(self.comum.pk)
+        entrada = cache.get(chave_usuario(self.comum.pk))
+        self.assertNotIn('password', entrada['valores'])
+        self.assertNotIn(self.comum.password, repr(entrada))
+
+        # A senha do usuário vindo do cache é lida do banco só quando usada
+        usuario = backend.get_user(self.comum.pk)
+        self.assertEqual(usuario.get_deferred_fields(), {'password'})
+        self.assertTrue(usuario.check_password('senha123'))
+
+        # Trocar a senha encerra a sessão
+        self.assertEqual(self.sessao.get('/api/departamentos/').status_code, 200)
+        self.comum.set_password('outra-senha')
+        self.comum.save()
+        self.assertEqual(self.sessao.get('/api/departamentos/').status_code, 403)
+
+    def test_alteracao_e_desativacao_invalidam_o_cache(self):
+        self.assertFalse(self.sessao.get('/api/auth/me/').json()['is_admin'])
+
+        response = self.client.patch(f'/api/usuarios/{self.comum.pk}/', {'is_admin': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.sessao.get('/api/auth/me/').json()['is_admin'])
+
+        response = self.client.delete(f'/api/usuarios/{self.comum.pk}/')
+        self.assertEqual(response.status_code, 204)
+        # Usuário desativado perde a sessão
+        self.assertEqual(self.sessao.get('/api/departamentos/').status_code, 403)
+
+    def test_sessao_fica_no_cache_no_maximo_o_ttl(self):
+        sessao = SessionStore()
+        with mock.patch.object(sessao._cache.cache, 'set') as gravar:
+            sessao._cache.set('chave', {}, 1209600)
+        gravar.assert_called_once_with('chave', {}, 60)
+
+        for metodo in ('aset', 'aadd'):
+            with self.subTest(metodo=metodo), \
+                    mock.patch.object(sessao._cache.cache, metodo, new_callable=mock.AsyncMock) as gravar:
+                async_to_sync(getattr(sessao._cache, metodo))('chave', {}, 1209600)
+            gravar.assert_awaited_once_with('chave', {}, 60)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionamentoUsuariosTests(RamaisAPITestCase):
+
+    CSV = (
+        'usuario;senha;email;nome;admin;pode_editar\n'
+        'ana;senha-ana;ana@chiaperini.com.br;Ana;não;sim\n'
+        'bruno;123;bruno@chiaperini.com.br;Bruno;não;não\n'
+        'carla;senha-carla;carla@chiaperini.com.br;Carla;sim;sim\n'
+        'ana;outra-senha;;Ana 2;não;não\n'
+        'admin;senha-admin;;;não;não\n'
+        'davi;senha-davi;davi@chiaperini.com.br;Davi;não;sim\n'
+        'eva;senha-eva;email-invalido;Eva;não;sim\n'
+    )
+
+    def enviar(self, conteudo, cliente=None):
+        arquivo = SimpleUploadedFile('usuarios.csv', conteudo.encode('utf-8'), content_type='text/csv')
+        return (cliente or self.client).post('/api/usuarios/bulk/', {'arquivo': arquivo}, format='multipart')
+
+    def test_cria_validos_e_reporta_erros_por_linha(self):
+        response = self.enviar(self.CSV)
+        self.assertEqual(response.status_code, 201)
+        dados = response.json()
+        self.assertEqual(dados['lidos'], 7)
+        self.assertEqual(sorted(u['username'] for u in dados['usuarios']), ['ana', 'carla', 'davi'])
+        erros = {erro['linha']: erro['erros'] for erro in dados['erros']}
+        self.assertEqual(sorted(erros), [3, 5, 6, 8])
+        self.assertIn('password', erros[3])
+        self.assertIn('repetido', erros[5]['username'][0])
+        self.assertIn('username', erros[6])
+        self.assertIn('email', erros[8])
+
+        carla = Usuario.objects.get(username='carla')
+        self.assertTrue(carla.check_password('senha-carla'))
+        self.assertTrue(carla.is_admin)
+        self.assertFalse(Usuario.objects.get(username='ana').is_admin)
+
+    def test_hashes_em_paralelo_na_ordem(self):
+        senhas = [f'senha-{numero}' for numero in range(8)]
+        hashes = provisionamento.gerar_hashes(senhas, processos=2)
+        self.assertTrue(all(check_password(senha, h) for senha, h in zip(senhas, hashes)))
+        # O pool é do processo: a próxima chamada reaproveita o mesmo
+        self.assertIs(provisionamento._obter_pool(2), provisionamento._obter_pool(2))
+
+    def test_endpoint_calcula_hashes_sem_pool(self):
+        csv = 'usuario;senha\n' + ''.join(f'user{n};senha-user-{n}\n' for n in range(6))
+        with mock.patch.object(provisionamento, '_obter_pool', side_effect=AssertionError):
+            response = self.enviar(csv)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['criados'], 6)
+
+    def test_linhas_com_campo_de_varias_linhas(self):
+        response = self.enviar(
+            'usuario;senha;nome\n'
+            'ana;senha-ana;"Ana\nMaria"\n'
+            'bruno;123;Bruno\n'
+        )
+        erros = {erro['linha']: erro['erros'] for erro in response.json()['erros']}
+        self.assertEqual(list(erros), [4])
+
+    def test_apenas_administradores(self):
+        comum = Usuario.objects.create_user(username='comum', password='senha123')
+        cliente = APIClient()
+        cliente.force_authenticate(comum)
+        self.assertEqual(self.enviar(self.CSV, cliente).status_code, 403)
+        self.assertFalse(Usuario.objects.filter(username='ana').exists())
+
+    def test_comando_dry_run_nao_grava(self):
+        saida = executar_comando('provisionar_usuarios', arquivo_temporario(self, self.CSV), '--dry-run')
+        self.assertIn('Usuários criados: 3', saida)
+        self.assertIn('linha 3', saida)
+        self.assertFalse(Usuario.objects.filter(username='ana').exists())
+
+
+class GravacaoLoteTests(RamaisAPITestCase):
+
+    def enviar(self, itens):
+        return self.client.post('/api/funcionarios/bulk/', {'itens': itens}, format='json')
+
+    def test_cria_atualiza_e_desativa_numa_chamada(self):
+        vera = self.criar_funcionario('Vera', ramal='7217', departamento=self.compras)
+        eder = self.criar_funcionario('Eder', ramal='7282')
+        response = self.enviar([
+            {'nome': 'Adenílson', 'ramal': '7243', 'departamento': self.assistencia.pk},
+            {'nome': 'Davi', 'ramal': '7211', 'departamento_nome': 'Compras'},
+            {'id': vera.pk, 'email': 'compras@chiaperini.com.br'},
+            {'id': eder.pk, 'ativo': False},
+        ])
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(
+            (dados['criado'], dados['atualizado'], dados['desativado']), (2, 1, 1)
+        )
+        self.assertEqual([item['operacao'] for item in dados['resultados']],
+                         ['criado', 'criado', 'atualizado', 'desativado'])
+
+        davi = Funcionario.objects.get(pk=dados['resultados'][1]['id'])
+        self.assertEqual(davi.departamento, self.compras)
+        vera.refresh_from_db()
+        self.assertEqual((vera.ramal, vera.email), ('7217', 'compras@chiaperini.com.br'))
+        self.assertFalse(Funcionario.objects.get(pk=eder.pk).ativo)
+        self.assertTrue(AlteracaoDiretorio.objects.filter(
+            objeto_id=eder.pk, operacao=AlteracaoDiretorio.DESATIVADO
+        ).exists())
+        busca = self.listar('/api/funcionarios/', busca='adenilson')
+        self.assertEqual([item['nome'] for item in busca['results']], ['Adenílson'])
+
+    def test_troca_de_ramais_dentro_do_lote(self):
+        vera = self.criar_funcionario('Vera', ramal='7217')
+        eder = self.criar_funcionario('Eder', ramal='7282')
+        response = self.enviar([
+            {'id': vera.pk, 'ramal': '7282'},
+            {'id': eder.pk, 'ramal': '7217'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        vera.refresh_from_db()
+        eder.refresh_from_db()
+        self.assertEqual((vera.ramal, eder.ramal), ('7282', '7217'))
+
+    def test_erro_em_um_item_nao_grava_nada(self):
+        self.criar_funcionario('Vera', ramal='7217', email='compras@chiaperini.com.br')
+        response = self.enviar([
+            {'nome': 'Novo 1', 'ramal': '7300'},
+            {'nome': 'Novo 2', 'ramal': '7217'},
+            {'nome': 'Novo 3', 'email': 'COMPRAS@chiaperini.com.br'},
+            {'nome': 'Novo 4', 'ramal': '7300'},
+            {'nome': 'Novo 5', 'departamento': 999999},
+            {'id': 999999, 'ativo': False},
+            {'ramal': '7301'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        erros = {erro['indice']: erro['erros'] for erro in response.json()['erros']}
+        self.assertEqual(sorted(erros), [1, 2, 3, 4, 5, 6])
+        self.assertIn('ramal', erros[1])
+        self.assertIn('email', erros[2])
+        self.assertIn('repetido', erros[3]['ramal'][0])
+        self.assertIn('departamento', erros[4])
+        self.assertIn('id', erros[5])
+        self.assertIn('nome', erros[6])
+        self.assertFalse(Funcionario.objects.filter(nome__startswith='Novo').exists())
+
+    def test_conflito_na_gravacao_vira_erro_por_item(self):
+        with mock.patch.object(gravacao_lote, '_gravar', side_effect=IntegrityError('UNIQUE')):
+            response = self.enviar([
+                {'nome': 'Novo 1', 'ramal': '7300'},
+                {'nome': 'Novo 2'},
+            ])
+        self.assertEqual(response.status_code, 400)
+        erros = {erro['indice']: erro['erros'] for erro in response.json()['erros']}
+        self.assertEqual(list(erros), [0])
+        self.assertIn('simultânea', erros[0]['ramal'][0])
+        self.assertFalse(Funcionario.objects.filter(nome__startswith='Novo').exists())
+
+    def test_validacao_e_gravacao_no_caminho_de_escrita(self):
+        etapas = []
+        executar = gravacao_lote.banco.executar_escrita
+        verificar = gravacao_lote._verificar_unicidade
+
+        def executar_registrando(*args, **kwargs):
+            etapas.append('inicio')
+            try:
+                return executar(*args, **kwargs)
+            finally:
+                etapas.append('fim')
+
+        def verificar_registrando(*args):
+            etapas.append('validacao')
+            return verificar(*args)
+
+        with mock.patch.object(gravacao_lote.banco, 'executar_escrita', side_effect=executar_registrando), \
+                mock.patch.object(gravacao_lote, '_verificar_unicidade', side_effect=verificar_registrando):
+            self.assertEqual(self.enviar([{'nome': 'Novo', 'ramal': '7300'}]).status_code, 200)
+        self.assertEqual(etapas, ['inicio', 'validacao', 'fim'])
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        def consultas(inicio, quantidade):
+            itens = [
+                {'nome': f'Pessoa {n}', 'ramal': str(8000 + n), 'departamento': self.compras.pk,
+                 'unidade_nome': 'Chiaperini', 'email': f'pessoa{n}@chiaperini.com.br'}
+                for n in range(inicio, inicio + quantidade)
+            ]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.enviar(itens).status_code, 200)
+            return len(capturadas)
+
+        # A primeira gravação ainda verifica se há FTS (resultado guardado)
+        consultas(200, 1)
+        # Uma consulta por etapa, não por item
+        self.assertEqual(consultas(100, 50), consultas(0, 5))
+
+    def test_sem_permissao_de_edicao(self):
+        leitor = Usuario.objects.create_user(username='leitor', password='senha123', can_edit=False)
+        self.client.force_authenticate(leitor)
+        self.assertEqual(self.enviar([{'nome': 'Novo'}]).status_code, 403)
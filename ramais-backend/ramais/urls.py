@@ -9,9 +9,21 @@ router.register(r'departamentos', views.DepartamentoViewSet)
 router.register(r'funcoes', views.FuncaoViewSet)
 router.register(r'unidades', views.UnidadeViewSet)
 router.register(r'funcionarios', views.FuncionarioViewSet)
+router.register(r'directory', views.DiretorioViewSet, basename='directory')
+router.register(r'lookup', views.LookupViewSet, basename='lookup')
 
 # URLs do app ramais
 urlpatterns = [
+    # Stream SSE de alterações do diretório (ASGI)
+    path('directory/events/', views.eventos_diretorio, name='directory-events'),
+
+    # Exportação sem a barra final (export.csv / export.xlsx)
+    path(
+        'funcionarios/export.<str:formato>',
+        views.FuncionarioViewSet.as_view({'get': 'export'}),
+        name='funcionario-export-arquivo',
+    ),
+
     # URLs da API REST (CRUD automático)
     path('', include(router.urls)),
     
@@ -0,0 +1,74 @@
+"""
+Versão dos dados do diretório.
+
+Toda alteração em Funcionario, Departamento, Funcao ou Unidade incrementa a
+versão do escopo ``diretorio`` (via signals ou explicitamente nas operações
+em massa); alterações em Usuario incrementam o escopo ``usuarios``. Ler a
+versão custa uma consulta por chave primária.
+"""
+import threading
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import VersaoDados
+
+ESCOPO_DIRETORIO = 'diretorio'
+ESCOPO_USUARIOS = 'usuarios'
+
+
+_SQL_VERSAO = (
+    f'SELECT versao, atualizado_em FROM {VersaoDados._meta.db_table} WHERE escopo = %s'
+)
+
+_SQL_INCREMENTAR = (
+    f'UPDATE {VersaoDados._meta.db_table} SET versao = versao + 1, atualizado_em = %s '
+    'WHERE escopo = %s RETURNING versao'
+)
+
+# Última versão gravada por incrementar_versao em cada thread, por escopo
+_gravadas = threading.local()
+
+
+def versao_atual(escopo=ESCOPO_DIRETORIO):
+    """Retorna (versao, atualizado_em) do escopo; (0, None) se nunca alterado"""
+    # SQL direto: é lido em toda requisição e o ORM custa ~10x mais que a query.
+    # O banco segue o roteador (réplica de leitura), como os dados versionados
+    with connections[router.db_for_read(VersaoDados)].cursor() as cursor:
+        cursor.execute(_SQL_VERSAO, [escopo])
+        registro = cursor.fetchone()
+    if registro is None:
+        return (0, None)
+    versao, atualizado_em = registro
+    if isinstance(atualizado_em, str):
+        atualizado_em = VersaoDados._meta.get_field('atualizado_em').to_python(atualizado_em)
+    if settings.USE_TZ and atualizado_em is not None and timezone.is_naive(atualizado_em):
+        atualizado_em = timezone.make_aware(atualizado_em, dt_timezone.utc)
+    return (versao, atualizado_em)
+
+
+def incrementar_versao(escopo=ESCOPO_DIRETORIO):
+    """Incrementa a versão do escopo (na transação corrente) e retorna a nova"""
+    connection = connections[router.db_for_write(VersaoDados)]
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_INCREMENTAR, [
+            connection.ops.adapt_datetimefield_value(timezone.now()), escopo
+        ])
+        registro = cursor.fetchone()
+    if registro is None:
+        nova = VersaoDados.objects.get_or_create(pk=escopo, defaults={'versao': 1})[0].versao
+    else:
+        nova = registro[0]
+    setattr(_gravadas, escopo, nova)
+    return nova
+
+
+def versao_gravada(escopo=ESCOPO_DIRETORIO):
+    """
+    Versão gravada pelo último incrementar_versao desta thread (None se não
+    houve): nos callbacks de on_commit é a versão que a transação deixou,
+    sem consultar o banco de novo
+    """
+    return getattr(_gravadas, escopo, None)
@@ -1,29 +1,221 @@
+import hashlib
+import io
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAuthenticated, AllowAny
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import login, logout
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django.views import View
 
+from . import (
+    agenda, alteracoes, autocompletar, banco, consulta, eventos, exportacao, gravacao_lote,
+    numeros, provisionamento, replica, search, snapshots, versao,
+)
+from .paginacao import FuncionarioCursorPagination
 from .models import Usuario, Departamento, Funcao, Unidade, Funcionario
 from .serializers import (
     UsuarioSerializer, LoginSerializer, DepartamentoSerializer,
     FuncaoSerializer, UnidadeSerializer, FuncionarioSerializer,
-    FuncionarioListSerializer
+    FuncionarioListSerializer, serializar_listagem_rapida, campos_solicitados
 )
 
 
+class AcessoTelefonia(BasePermission):
+    """
+    Agendas telefônicas e identificação de chamadas: usuário autenticado
+    (sessão ou HTTP Basic, que telefones e PBX suportam) ou ?token= igual a
+    RAMAIS_AGENDA_TOKEN
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return True
+        token_configurado = getattr(settings, 'RAMAIS_AGENDA_TOKEN', '')
+        token = request.query_params.get('token', '')
+        return bool(token_configurado) and constant_time_compare(token, token_configurado)
+
+
 def check_edit_permission(user):
     """Verifica se o usuário tem permissão para editar"""
     return user.is_admin or user.can_edit
 
 
+def anotar_funcionarios_count(queryset):
+    """Anota a quantidade de funcionários ativos em uma única query agregada"""
+    return queryset.annotate(
+        funcionarios_count=Count('funcionarios', filter=Q(funcionarios__ativo=True))
+    )
+
+
+class LeituraReplicaMixin:
+    """
+    Executa as ações de ``acoes_replica`` na réplica de leitura (quando
+    configurada e já com as escritas do cliente) e grava o cookie de
+    aderência após escritas bem-sucedidas. Ver ramais.replica.
+    """
+    acoes_replica = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            replica.configurada() and self.action in self.acoes_replica
+            and replica.pode_ler_da_replica(request)
+        ):
+            self._token_replica = replica.ativar_leitura()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            self._token_replica = None
+            replica.desativar_leitura(token)
+        elif (
+            replica.configurada() and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            replica.marcar_escrita(response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class RespostaCondicionalMixin:
+    """
+    Responde GETs condicionais (If-None-Match / If-Modified-Since) com 304
+    antes de executar queryset ou serializer.
+
+    O ETag é derivado da versão do escopo (uma leitura por chave primária)
+    e da URL com os parâmetros. O usuário só entra quando a resposta depende
+    de quem consulta (``etag_por_usuario``); nos demais casos o mesmo ETag
+    vale para todos e o ``Vary: Cookie`` separa as sessões nos caches.
+    """
+    escopo_versao = versao.ESCOPO_DIRETORIO
+    etag_por_usuario = False
+
+    def _etag(self, request, versao_dados):
+        parametros = sorted(request.query_params.lists())
+        conteudo = f'{request.path}|{parametros}'
+        if self.etag_por_usuario:
+            conteudo = f'{conteudo}|{request.user.pk}'
+        resumo = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+        return quote_etag(f'{self.escopo_versao}-{versao_dados}-{resumo}')
+
+    def _resposta_condicional(self, request, resposta_completa):
+        # Guardada na view para que a resposta completa não releia a versão
+        self.versao_dados = versao.versao_atual(self.escopo_versao)
+        versao_dados, atualizado_em = self.versao_dados
+        etag = self._etag(request, versao_dados)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        if if_none_match:
+            nao_modificado = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+        else:
+            nao_modificado = bool(
+                if_modified_since and atualizado_em
+                and int(atualizado_em.timestamp()) <= if_modified_since
+            )
+
+        response = (
+            Response(status=status.HTTP_304_NOT_MODIFIED)
+            if nao_modificado else resposta_completa()
+        )
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if atualizado_em:
+                response['Last-Modified'] = http_date(atualizado_em.timestamp())
+            response['Cache-Control'] = (
+                'private, no-cache' if self.etag_por_usuario else 'no-cache'
+            )
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+
+class ConditionalGetMixin(RespostaCondicionalMixin):
+    """Mixin que aplica o GET condicional ao list e ao retrieve"""
+
+    def list(self, request, *args, **kwargs):
+        return self._resposta_condicional(
+            request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._resposta_condicional(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+
+# Parâmetros que não mudam o conteúdo da lista de funcionários
+PARAMETROS_FORA_DO_SNAPSHOT = ('page', 'page_size', 'lookups', 'cursor', 'paginacao', 'count')
+
+
+# Modelos do feed de alterações: nome -> (queryset, serializer)
+FEED_MODELOS = {
+    'funcionario': lambda: (
+        Funcionario.objects.select_related('departamento', 'funcao', 'unidade'),
+        FuncionarioSerializer,
+    ),
+    'departamento': lambda: (anotar_funcionarios_count(Departamento.objects.all()), DepartamentoSerializer),
+    'funcao': lambda: (anotar_funcionarios_count(Funcao.objects.all()), FuncaoSerializer),
+    'unidade': lambda: (anotar_funcionarios_count(Unidade.objects.all()), UnidadeSerializer),
+}
+
+
+def campos_da_resposta(view):
+    """
+    Campos pedidos via ?fields= / ?omit= numa leitura, ou None para todos.
+    Usado para podar JOINs e anotações que a resposta não vai usar.
+    """
+    if view.request.method not in ('GET', 'HEAD'):
+        return None
+    return campos_solicitados(view.request, view.get_serializer_class().Meta.fields)
+
+
+class FuncionariosCountMixin:
+    """
+    Mixin para os viewsets de Departamento, Função e Unidade: o
+    funcionarios_count vem anotado no queryset em vez de uma query por linha
+    (e não é calculado quando omitido via ?fields= / ?omit=)
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        campos = campos_da_resposta(self)
+        if campos is not None and 'funcionarios_count' not in campos:
+            return queryset
+        return anotar_funcionarios_count(queryset)
+
+
+async def eventos_diretorio(request):
+    """
+    Stream SSE com os eventos de alteração do diretório (entidade, id,
+    operação, versão e cursor). Deve ser servido via ASGI.
+    """
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return JsonResponse(
+            {'detail': 'As credenciais de autenticação não foram fornecidas.'}, status=403
+        )
+    response = StreamingHttpResponse(eventos.transmitir(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que proxies (nginx) segurem o stream em buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @method_decorator(ensure_csrf_cookie, name='dispatch')
 class CSRFTokenView(View):
     """
@@ -70,10 +262,13 @@ class AuthViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar usuários
     """
+    escopo_versao = versao.ESCOPO_USUARIOS
+    # Não-admins só veem o próprio cadastro
+    etag_por_usuario = True
     queryset = Usuario.objects.filter(ativo=True)
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated]
@@ -93,13 +288,13 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         """Apenas admins podem criar usuários"""
         if not self.request.user.is_admin:
             raise PermissionDenied('Apenas administradores podem criar usuários')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_update(self, serializer):
         """Usuários podem editar apenas seus próprios dados, admins podem editar todos"""
         if not self.request.user.is_admin and self.get_object() != self.request.user:
             raise PermissionDenied('Você só pode editar seus próprios dados')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_destroy(self, serializer):
         """Apenas admins podem excluir usuários (soft delete)"""
@@ -108,10 +303,48 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         # Soft delete - apenas marca como inativo
         usuario = self.get_object()
         usuario.ativo = False
-        usuario.save()
+        banco.executar_escrita(usuario.save)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def bulk(self, request):
+        """
+        Provisionamento em lote: CSV enviado em ``arquivo`` (colunas username,
+        password, email, first_name, last_name, is_admin, can_edit, ativo ou
+        os nomes em português). Cria as linhas válidas e lista os erros das
+        demais, por linha do arquivo.
+        """
+        if not request.user.is_admin:
+            raise PermissionDenied('Apenas administradores podem criar usuários')
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            raise ValidationError({'arquivo': 'Envie o CSV de usuários no campo "arquivo".'})
+
+        texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+        try:
+            # Hashes em sequência: nada de pool de processos dentro da requisição
+            # (lotes grandes: comando provisionar_usuarios)
+            resultado = provisionamento.provisionar(provisionamento.ler_csv(texto), processos=1)
+        except UnicodeDecodeError:
+            raise ValidationError({'arquivo': 'O CSV deve estar em UTF-8.'})
 
+        if resultado.criados:
+            codigo = status.HTTP_201_CREATED
+        elif resultado.erros:
+            codigo = status.HTTP_400_BAD_REQUEST
+        else:
+            codigo = status.HTTP_200_OK
+        return Response({
+            'lidos': resultado.lidos,
+            'criados': len(resultado.criados),
+            'usuarios': [
+                {'id': usuario.pk, 'username': usuario.username}
+                for usuario in resultado.criados
+            ],
+            'erros': [{'linha': linha, 'erros': erros} for linha, erros in resultado.erros],
+        }, status=codigo)
 
-class DepartamentoViewSet(viewsets.ModelViewSet):
+
+class DepartamentoViewSet(LeituraReplicaMixin, ConditionalGetMixin, FuncionariosCountMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar departamentos
     """
@@ -128,13 +361,13 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
         """Verificar se usuário pode editar antes de criar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para criar departamentos')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_update(self, serializer):
         """Verificar se usuário pode editar antes de atualizar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para editar departamentos')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_destroy(self, instance):
         """Verificar se tem funcionários vinculados antes de excluir"""
@@ -142,10 +375,10 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
             raise PermissionDenied('Você não tem permissão para excluir departamentos')
         if instance.funcionarios.filter(ativo=True).exists():
             raise ValidationError('Não é possível excluir departamento com funcionários vinculados')
-        instance.delete()
+        banco.executar_escrita(instance.delete)
 
 
-class FuncaoViewSet(viewsets.ModelViewSet):
+class FuncaoViewSet(LeituraReplicaMixin, ConditionalGetMixin, FuncionariosCountMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar funções
     """
@@ -162,13 +395,13 @@ class FuncaoViewSet(viewsets.ModelViewSet):
         """Verificar se usuário pode editar antes de criar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para criar funções')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_update(self, serializer):
         """Verificar se usuário pode editar antes de atualizar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para editar funções')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_destroy(self, instance):
         """Verificar se tem funcionários vinculados antes de excluir"""
@@ -176,10 +409,10 @@ class FuncaoViewSet(viewsets.ModelViewSet):
             raise PermissionDenied('Você não tem permissão para excluir funções')
         if instance.funcionarios.filter(ativo=True).exists():
             raise ValidationError('Não é possível excluir função com funcionários vinculados')
-        instance.delete()
+        banco.executar_escrita(instance.delete)
 
 
-class UnidadeViewSet(viewsets.ModelViewSet):
+class UnidadeViewSet(LeituraReplicaMixin, ConditionalGetMixin, FuncionariosCountMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar unidades
     """
@@ -196,13 +429,13 @@ class UnidadeViewSet(viewsets.ModelViewSet):
         """Verificar se usuário pode editar antes de criar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para criar unidades')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_update(self, serializer):
         """Verificar se usuário pode editar antes de atualizar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para editar unidades')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
     def perform_destroy(self, instance):
         """Verificar se tem funcionários vinculados antes de excluir"""
@@ -210,10 +443,10 @@ class UnidadeViewSet(viewsets.ModelViewSet):
             raise PermissionDenied('Você não tem permissão para excluir unidades')
         if instance.funcionarios.filter(ativo=True).exists():
             raise ValidationError('Não é possível excluir unidade com funcionários vinculados')
-        instance.delete()
+        banco.executar_escrita(instance.delete)
 
 
-class FuncionarioViewSet(viewsets.ModelViewSet):
+class FuncionarioViewSet(LeituraReplicaMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar funcionários
     """
@@ -225,6 +458,7 @@ class FuncionarioViewSet(viewsets.ModelViewSet):
     search_fields = ['nome', 'ramal', 'email', 'whatsapp']
     ordering_fields = ['nome', 'ramal']
     ordering = ['nome']
+    acoes_replica = ('list', 'retrieve', 'export')
     
     def create(self, request, *args, **kwargs):
         """Override do método create para adicionar logs de debug"""
@@ -252,7 +486,7 @@ class FuncionarioViewSet(viewsets.ModelViewSet):
         print("Dados recebidos:", self.request.data)
         
         try:
-            serializer.save()
+            banco.executar_escrita(serializer.save)
             print("Funcionário criado com sucesso!")
         except Exception as e:
             print("Erro ao salvar:", str(e))
@@ -263,8 +497,173 @@ class FuncionarioViewSet(viewsets.ModelViewSet):
         """Verificar se usuário pode editar antes de atualizar"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para editar funcionários')
-        serializer.save()
+        banco.executar_escrita(serializer.save)
     
+    def list(self, request, *args, **kwargs):
+        """
+        Listagem servida do cache de snapshots: a resposta serializada de cada
+        combinação de filtros é reaproveitada enquanto a versão do diretório
+        não mudar. Com ?paginacao=cursor (ou ?cursor=) usa paginação keyset
+        por (nome, id) direto no banco
+        """
+        if request.query_params.get('paginacao') == 'cursor' or 'cursor' in request.query_params:
+            return self._resposta_condicional(request, lambda: self._listar_cursor(request))
+        return self._resposta_condicional(request, lambda: self._listar_snapshot(request))
+
+    def _listar_snapshot(self, request):
+        dados = self.snapshot_listagem(request)
+        page = self.paginate_queryset(dados)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(dados)
+
+    def _listar_cursor(self, request):
+        """Página keyset; a ordenação é sempre (nome, id), mesmo com busca"""
+        def contar_em_cache():
+            dados = snapshots.funcionarios_cache.consultar(
+                self._chave_snapshot(request), self.versao_dados
+            )
+            return None if dados is None else len(dados)
+
+        paginador = FuncionarioCursorPagination(contar_em_cache)
+        queryset = self.filter_queryset(self.get_queryset())
+        pagina = paginador.paginate_queryset(queryset, request, view=self)
+        return paginador.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
+    @staticmethod
+    def _chave_snapshot(request):
+        return tuple(sorted(
+            (parametro, tuple(valores))
+            for parametro, valores in request.query_params.lists()
+            if parametro not in PARAMETROS_FORA_DO_SNAPSHOT
+        ))
+
+    def snapshot_listagem(self, request):
+        """Lista serializada (sem paginação) dos funcionários filtrados"""
+        def serializar():
+            queryset = self.filter_queryset(self.get_queryset())
+            if self.get_serializer_class() is FuncionarioListSerializer:
+                return serializar_listagem_rapida(queryset, campos_da_resposta(self))
+            return self.get_serializer(queryset, many=True).data
+
+        # (versão, atualizado_em): o horário protege contra versões repetidas
+        # após um rollback ou restauração de backup
+        return snapshots.funcionarios_cache.obter(
+            self._chave_snapshot(request), self.versao_dados, serializar
+        )
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Feed incremental de alterações do diretório.
+
+        ?since=<cursor> devolve só o que mudou depois do cursor (0 = tudo), com o
+        estado atual de cada objeto; exclusões vêm com dados null. O cliente
+        repete a chamada com o cursor retornado enquanto ``mais`` for true.
+        """
+        since = self._parametro_inteiro(request, 'since', 0)
+        limite = min(
+            self._parametro_inteiro(request, 'limit', alteracoes.LIMITE_PADRAO) or 1,
+            alteracoes.LIMITE_MAXIMO
+        )
+        modelos = None
+        if request.query_params.get('modelos'):
+            modelos = set(request.query_params['modelos'].split(','))
+            desconhecidos = modelos - FEED_MODELOS.keys()
+            if desconhecidos:
+                raise ValidationError({'modelos': f'Modelos inválidos: {", ".join(sorted(desconhecidos))}'})
+
+        entradas, cursor, mais = alteracoes.alteracoes_desde(since, limite, modelos)
+
+        ids_por_modelo = {}
+        for entrada in entradas:
+            ids_por_modelo.setdefault(entrada.modelo, []).append(entrada.objeto_id)
+        atuais = {}
+        for modelo, ids in ids_por_modelo.items():
+            queryset, serializer_class = FEED_MODELOS[modelo]()
+            for dados in serializer_class(queryset.filter(pk__in=ids), many=True).data:
+                atuais[(modelo, dados['id'])] = dados
+
+        resultado = []
+        for entrada in entradas:
+            dados = atuais.get((entrada.modelo, entrada.objeto_id))
+            resultado.append({
+                'cursor': entrada.id,
+                'modelo': entrada.modelo,
+                'id': entrada.objeto_id,
+                # Objeto excluído depois desta entrada: o estado atual é a exclusão
+                'operacao': entrada.operacao if dados is not None else alteracoes.EXCLUIDO,
+                'alterado_em': entrada.alterado_em,
+                'dados': dados,
+            })
+        return Response({'cursor': cursor, 'mais': mais, 'alteracoes': resultado})
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Sugestões para a caixa de busca (?q=, ?limit=): id, nome, ramal e
+        departamento, servidas da trie em memória sem consultar o banco
+        """
+        limite = min(
+            self._parametro_inteiro(request, 'limit', autocompletar.LIMITE_PADRAO) or 1,
+            autocompletar.LIMITE_MAXIMO
+        )
+        texto = request.query_params.get('q', '')
+        indice = autocompletar.obter_indice()
+        return Response({'q': texto, 'resultados': indice.buscar(texto, limite)})
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Cria, atualiza e desativa funcionários em lote numa transação:
+        {"itens": [...]} (ou a lista direto), itens como no POST/PATCH com
+        ``id`` para atualizar. Com erro em algum item nada é gravado e a
+        resposta (400) traz os erros por índice.
+        """
+        if not check_edit_permission(request.user):
+            raise PermissionDenied('Você não tem permissão para editar funcionários')
+        itens = request.data if isinstance(request.data, list) else request.data.get('itens')
+        if not isinstance(itens, list) or not itens:
+            raise ValidationError({'itens': 'Envie uma lista de funcionários em "itens".'})
+        if len(itens) > gravacao_lote.LIMITE_ITENS:
+            raise ValidationError({'itens': f'No máximo {gravacao_lote.LIMITE_ITENS} itens por lote.'})
+
+        resultado = gravacao_lote.aplicar(itens)
+        if not resultado.valido:
+            return Response({
+                'erros': [
+                    {'indice': indice, 'erros': erros}
+                    for indice, erros in sorted(resultado.erros.items())
+                ],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**resultado.contagem(), 'resultados': resultado.itens})
+
+    @action(detail=False, methods=['get'], url_path=r'export\.(?P<formato>[a-z]+)')
+    def export(self, request, formato=None):
+        """
+        Exportação em CSV ou XLSX (export.csv / export.xlsx) com os mesmos
+        filtros e ordenação da listagem, enviada por streaming
+        """
+        if formato not in exportacao.FORMATOS:
+            raise Http404
+        queryset = self.filter_queryset(self.get_queryset())
+        # Fixa o banco escolhido agora (réplica ou default): o streaming só
+        # consulta depois que a view termina
+        return exportacao.resposta(queryset.using(queryset.db), formato)
+
+    @staticmethod
+    def _parametro_inteiro(request, nome, padrao):
+        valor = request.query_params.get(nome)
+        if valor in (None, ''):
+            return padrao
+        try:
+            valor = int(valor)
+        except ValueError:
+            raise ValidationError({nome: 'Informe um número inteiro.'})
+        if valor < 0:
+            raise ValidationError({nome: 'Informe um número não negativo.'})
+        return valor
+
     def get_serializer_class(self):
         """Usar serializer simplificado para listagem"""
         if self.action == 'list':
@@ -273,23 +672,30 @@ class FuncionarioViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Aplicar filtros de busca customizada"""
-        # Começar com queryset base
-        queryset = Funcionario.objects.filter(ativo=True).select_related('departamento', 'funcao', 'unidade')
+        # Começar com queryset base, com JOIN apenas dos cadastros cujo nome
+        # faz parte da resposta (?fields= / ?omit=)
+        campos = campos_da_resposta(self)
+        relacionados = [
+            relacionado for relacionado in ('departamento', 'funcao', 'unidade')
+            if campos is None or f'{relacionado}_nome' in campos
+        ]
+        queryset = Funcionario.objects.filter(ativo=True)
+        if relacionados:
+            queryset = queryset.select_related(*relacionados)
         
         # Aplicar filtros apenas se existirem
         try:
             # Busca customizada
             busca = self.request.query_params.get('busca')
             if busca and busca.strip():
-                queryset = queryset.filter(
-                    Q(nome__icontains=busca) |
-                    Q(ramal__icontains=busca) |
-                    Q(email__icontains=busca) |
-                    Q(whatsapp__icontains=busca) |
-                    Q(departamento__nome__icontains=busca) |
-                    Q(funcao__nome__icontains=busca) |
-                    Q(unidade__nome__icontains=busca)
+                # ?fuzzy=true: busca tolerante a erros de digitação
+                aproximada = self.request.query_params.get('fuzzy', '').lower() in ('true', '1')
+                queryset, por_relevancia = consulta.aplicar_consulta(
+                    queryset, busca.strip(), aproximada=aproximada
                 )
+                if por_relevancia:
+                    # Ordenação padrão passa a ser pela relevância do índice
+                    self.ordering = ['relevancia', 'nome']
             
             # Filtros específicos
             departamento_id = self.request.query_params.get('departamento_id')
@@ -315,4 +721,122 @@ class FuncionarioViewSet(viewsets.ModelViewSet):
         """Excluir funcionário do banco de dados"""
         if not check_edit_permission(self.request.user):
             raise PermissionDenied('Você não tem permissão para excluir funcionários')
-        instance.delete()
\ No newline at end of file
+        banco.executar_escrita(instance.delete)
+
+
+class DiretorioViewSet(LeituraReplicaMixin, RespostaCondicionalMixin, viewsets.ViewSet):
+    """
+    ViewSet com informações gerais do diretório
+    """
+    permission_classes = [IsAuthenticated]
+    acoes_replica = ('bootstrap', 'phonebook')
+
+    # Cadastros devolvidos pelo bootstrap: chave -> (modelo, serializer)
+    CADASTROS_BOOTSTRAP = (
+        ('departamentos', Departamento, DepartamentoSerializer),
+        ('funcoes', Funcao, FuncaoSerializer),
+        ('unidades', Unidade, UnidadeSerializer),
+    )
+
+    @action(detail=False, methods=['get'])
+    def bootstrap(self, request):
+        """
+        Dados do painel em uma única requisição: funcionários (aceita os mesmos
+        filtros de /api/funcionarios/, sem paginação) e os cadastros com
+        funcionarios_count. Com ?lookups=false os cadastros são omitidos.
+        """
+        return self._resposta_condicional(
+            request, lambda: Response(self._montar_bootstrap(request))
+        )
+
+    def _montar_bootstrap(self, request):
+        listagem = FuncionarioViewSet(
+            request=request, action='list', format_kwarg=None,
+            args=(), kwargs={}, versao_dados=self.versao_dados,
+        )
+        dados = {
+            'versao': self.versao_dados[0],
+            'funcionarios': listagem.snapshot_listagem(request),
+        }
+        if request.query_params.get('lookups', 'true').lower() not in ('false', '0'):
+            dados.update(snapshots.cadastros_cache.obter(
+                'bootstrap', self.versao_dados, self._serializar_cadastros
+            ))
+        return dados
+
+    @action(
+        detail=False, methods=['get'], url_path=r'phonebook/(?P<formato>[a-z]+)',
+        authentication_classes=[SessionAuthentication, BasicAuthentication],
+        permission_classes=[AcessoTelefonia],
+    )
+    def phonebook(self, request, formato=None):
+        """
+        Agenda telefônica (yealink, grandstream, microsip ou vcard) dos
+        funcionários ativos com ramal; ?agrupar=departamento|unidade.
+        Gerada uma vez por versão do diretório e com suporte a GET condicional,
+        já que os telefones consultam periodicamente.
+        """
+        if formato not in agenda.FORMATOS:
+            raise Http404
+        agrupar = request.query_params.get('agrupar', 'departamento')
+        if agrupar not in agenda.AGRUPAMENTOS:
+            raise ValidationError({'agrupar': f'Use um de: {", ".join(agenda.AGRUPAMENTOS)}.'})
+
+        def gerar_resposta():
+            conteudo = snapshots.agenda_cache.obter(
+                (formato, agrupar), self.versao_dados, lambda: agenda.gerar(formato, agrupar)
+            )
+            response = HttpResponse(conteudo, content_type=agenda.CONTENT_TYPES[formato])
+            response['Content-Disposition'] = f'inline; filename="{agenda.NOMES_ARQUIVO[formato]}"'
+            return response
+
+        return self._resposta_condicional(request, gerar_resposta)
+
+    def _serializar_cadastros(self):
+        return {
+            chave: serializer(
+                anotar_funcionarios_count(model.objects.filter(ativo=True)), many=True
+            ).data
+            for chave, model, serializer in self.CADASTROS_BOOTSTRAP
+        }
+
+    @action(detail=False, methods=['get'])
+    def cache(self, request):
+        """Versão do diretório e contadores dos caches em memória (admins)"""
+        if not request.user.is_admin:
+            raise PermissionDenied('Apenas administradores podem ver os caches')
+        versao_diretorio, atualizado_em = versao.versao_atual()
+        return Response({
+            'versao': versao_diretorio,
+            'atualizado_em': atualizado_em,
+            'caches': snapshots.estatisticas(),
+        })
+
+
+class LookupViewSet(LeituraReplicaMixin, viewsets.ViewSet):
+    """
+    ViewSet de consultas rápidas para integrações (PBX)
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [AcessoTelefonia]
+    acoes_replica = ('number',)
+
+    @action(detail=False, methods=['get'], url_path=r'number/(?P<numero>[^/]+)')
+    def number(self, request, numero=None):
+        """
+        Identificação de chamada: funcionários cujo ramal ou WhatsApp
+        corresponde ao número (formatação, país, operadora e DDD ignorados)
+        """
+        indice = numeros.obter_indice(versao.versao_atual())
+        contatos, normalizado = numeros.consultar(indice, numero)
+        if not contatos:
+            return Response(
+                {'detail': 'Número não encontrado.', 'normalizado': normalizado},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            'numero': numero,
+            'normalizado': normalizado,
+            'nome': contatos[0]['nome'],
+            'resultados': contatos,
+        })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -85,6 +86,53 @@ DATABASES = {
     }
 }
 
+# Perfil do banco (RAMAIS_DB_PERFIL): "padrao" para desenvolvimento ou
+# "producao" (WAL, conexões persistentes e espera pelo lock). Os PRAGMAs são
+# aplicados a cada conexão nova por ramais.banco.configurar_conexao.
+RAMAIS_DB_PERFIL = os.environ.get('RAMAIS_DB_PERFIL', 'padrao')
+RAMAIS_SQLITE_PRAGMAS = {}
+RAMAIS_SQLITE_PRAGMAS_PRODUCAO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
+}
+
+if RAMAIS_DB_PERFIL == 'producao':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('RAMAIS_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # Segundos esperando o lock de escrita antes de "database is locked"
+        'OPTIONS': {'timeout': int(os.environ.get('RAMAIS_DB_TIMEOUT', 20))},
+    })
+    RAMAIS_SQLITE_PRAGMAS = RAMAIS_SQLITE_PRAGMAS_PRODUCAO
+elif RAMAIS_DB_PERFIL != 'padrao':
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(f'RAMAIS_DB_PERFIL desconhecido: {RAMAIS_DB_PERFIL!r}')
+
+# Réplica de leitura (RAMAIS_DB_REPLICA): caminho de um segundo arquivo SQLite,
+# copiado do principal pelo comando atualizar_replica. Listagens, exportações,
+# agendas e identificação de chamadas passam a ler dela (ver ramais.replica).
+RAMAIS_DB_REPLICA = os.environ.get('RAMAIS_DB_REPLICA', '')
+
+if RAMAIS_DB_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': RAMAIS_DB_REPLICA,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['ramais.replica.RoteadorReplica']
+
+# Segundos que um cliente que acabou de gravar pode continuar lendo do
+# banco principal enquanto a réplica não alcança a versão gravada
+RAMAIS_REPLICA_ADERENCIA = 300
+
+# Escritas com o banco ocupado: tentativas e espera inicial (s) entre elas
+RAMAIS_ESCRITA_TENTATIVAS = 5
+RAMAIS_ESCRITA_ESPERA = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -179,6 +227,40 @@ LOGOUT_URL = '/api-auth/logout/'
 # Modelo de usuário customizado
 AUTH_USER_MODEL = 'ramais.Usuario'
 
+# Usuário da sessão resolvido pelo cache (ramais.autenticacao)
+AUTHENTICATION_BACKENDS = ['ramais.autenticacao.BackendUsuarioEmCache']
+
+# Sessões no cache com gravação no banco (ramais.sessoes)
+SESSION_ENGINE = 'ramais.sessoes'
+
+# Cache de sessões e usuários. Em memória é por processo: com vários
+# processos (gunicorn -w N) defina RAMAIS_CACHE_DIR para que todos usem o
+# mesmo cache em arquivos e vejam as invalidações na hora; sem ele cada
+# processo vê alterações de usuários e logouts em até RAMAIS_AUTH_CACHE_TTL.
+RAMAIS_CACHE_DIR = os.environ.get('RAMAIS_CACHE_DIR', '')
+
+if RAMAIS_CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': RAMAIS_CACHE_DIR,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ramais',
+        },
+    }
+
+# Segundos que sessões e usuários ficam no cache antes de serem relidos
+RAMAIS_AUTH_CACHE_TTL = 60
+
+# Processos que calculam os hashes de senha no provisionamento em lote de
+# usuários (ramais.provisionamento); vazio: um por núcleo
+RAMAIS_PROVISIONAMENTO_PROCESSOS = int(os.environ.get('RAMAIS_PROVISIONAMENTO_PROCESSOS') or 0) or None
+
 # CSRF settings para desenvolvimento - Aceitar qualquer origem local
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
@@ -193,4 +275,18 @@ CSRF_TRUSTED_ORIGINS = [
 CSRF_COOKIE_SECURE = False
 CSRF_COOKIE_HTTPONLY = False
 CSRF_COOKIE_SAMESITE = 'Lax'
-CSRF_COOKIE_DOMAIN = None
\ No newline at end of file
+CSRF_COOKIE_DOMAIN = None
+
+# Cache em memória das listagens do diretório (entradas por processo)
+RAMAIS_SNAPSHOT_MAX_ENTRADAS = 256
+
+# Retenção (dias) do registro de alterações antes da compactação
+RAMAIS_ALTERACOES_RETENCAO_DIAS = 30
+
+# Eventos SSE do diretório: intervalo de keepalive (s) e fila por conexão
+RAMAIS_EVENTOS_KEEPALIVE = 15
+RAMAIS_EVENTOS_TAMANHO_FILA = 100
+
+# Token opcional (?token=) para os telefones baixarem as agendas sem login;
+# vazio desabilita o acesso por token
+RAMAIS_AGENDA_TOKEN = os.environ.get('RAMAIS_AGENDA_TOKEN', '')
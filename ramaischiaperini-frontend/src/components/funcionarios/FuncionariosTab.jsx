@@ -1,6 +1,7 @@
 import { iniciarLigacao } from '../../utils/microSipHelper';
 import { abrirOutlookCompose } from '../../utils/outlookHelper';
 import { abrirTeamsChat } from '../../utils/teamsHelper';
+import { funcionarioService } from '../../services/api';
 
 function FuncionariosTab({ 
   funcionarios, 
@@ -9,6 +10,7 @@ function FuncionariosTab({
   unidades, 
   busca, 
   setBusca, 
+  sugestoes = [],
   filtros, 
   setFiltros, 
   clearFilters, 
@@ -20,6 +22,11 @@ function FuncionariosTab({
 
   const canEdit = user.is_admin || user.can_edit;
 
+  // Exportação com a busca e os filtros atuais
+  const paramsExportacao = Object.fromEntries(
+    Object.entries({ busca: busca.trim(), ...filtros }).filter(([, valor]) => valor)
+  );
+
   return (
     <>
       <div className="search-filters">
@@ -31,7 +38,15 @@ function FuncionariosTab({
               placeholder="🔍 Buscar Colaborador..."
               value={busca}
               onChange={(e) => setBusca(e.target.value)}
+              list="sugestoes-busca"
             />
+            <datalist id="sugestoes-busca">
+              {sugestoes.map(sugestao => (
+                <option key={sugestao.id} value={sugestao.nome}>
+                  {[sugestao.ramal, sugestao.departamento].filter(Boolean).join(' · ')}
+                </option>
+              ))}
+            </datalist>
           </div>
 
           <div className="filter-group">
@@ -83,11 +98,19 @@ function FuncionariosTab({
 
       <div style={{marginBottom: '1rem', display: 'flex', justifyContent: 'space-between', alignItems: 'center'}}>
         <h2>Colaboradores ({funcionarios.length})</h2>
-        {canEdit && (
-          <button className="btn btn-primary" onClick={onAdd}>
-            + Adicionar Colaborador
-          </button>
-        )}
+        <div style={{display: 'flex', gap: '0.5rem'}}>
+          <a className="btn btn-outline" href={funcionarioService.exportUrl('csv', paramsExportacao)}>
+            ⬇️ CSV
+          </a>
+          <a className="btn btn-outline" href={funcionarioService.exportUrl('xlsx', paramsExportacao)}>
+            ⬇️ Excel
+          </a>
+          {canEdit && (
+            <button className="btn btn-primary" onClick={onAdd}>
+              + Adicionar Colaborador
+            </button>
+          )}
+        </div>
       </div>
 
       <div className="table-container">
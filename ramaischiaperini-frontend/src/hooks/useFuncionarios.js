@@ -1,9 +1,10 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { 
   funcionarioService, 
   departamentoService, 
   funcaoService, 
-  unidadeService 
+  unidadeService,
+  diretorioService
 } from '../services/api'
 
 export function useFuncionarios() {
@@ -15,20 +16,26 @@ export function useFuncionarios() {
   
   // Estados para filtros e busca
   const [busca, setBusca] = useState('')
+  // Busca aplicada à listagem completa: acompanha a digitação com atraso
+  const [buscaAplicada, setBuscaAplicada] = useState('')
+  const [sugestoes, setSugestoes] = useState([])
   const [filtros, setFiltros] = useState({
     departamento_id: '',
     funcao_id: '',
     unidade_id: ''
   })
 
+  // Cadastros só precisam ser recarregados na carga inicial e após alterações
+  const cadastrosCarregados = useRef(false)
+
   // Carregar todos os dados
-  const loadAllData = async () => {
+  const loadAllData = async (incluirCadastros = true) => {
     try {
       // Construir parâmetros de busca - apenas incluir se não estiverem vazios
       const queryParams = {}
       
-      if (busca.trim()) {
-        queryParams.busca = busca.trim()
+      if (buscaAplicada.trim()) {
+        queryParams.busca = buscaAplicada.trim()
       }
       
       if (filtros.departamento_id) {
@@ -43,30 +50,53 @@ export function useFuncionarios() {
         queryParams.unidade_id = filtros.unidade_id
       }
 
-      const [funcData, deptData, funcaoData, unidData] = await Promise.all([
-        funcionarioService.getAll(queryParams),
-        departamentoService.getAll(),
-        funcaoService.getAll(),
-        unidadeService.getAll()
-      ])
+      const data = await diretorioService.bootstrap(queryParams, incluirCadastros)
+
+      // Nada encontrado: tenta a busca tolerante a erros de digitação
+      if (queryParams.busca && data.funcionarios.length === 0) {
+        const aproximada = await diretorioService.bootstrap({ ...queryParams, fuzzy: 'true' }, false)
+        data.funcionarios = aproximada.funcionarios
+      }
 
-      setFuncionarios(funcData)
-      setDepartamentos(deptData)
-      setFuncoes(funcaoData)
-      setUnidades(unidData)
+      setFuncionarios(data.funcionarios)
+      if (incluirCadastros) {
+        setDepartamentos(data.departamentos)
+        setFuncoes(data.funcoes)
+        setUnidades(data.unidades)
+        cadastrosCarregados.current = true
+      }
     } catch (error) {
       console.error('Erro ao carregar dados:', error)
       throw new Error('Erro ao carregar dados')
     }
   }
 
+  // Sugestões a cada tecla; a listagem completa só depois de uma pausa
+  useEffect(() => {
+    const termo = busca.trim()
+    let cancelado = false
+    if (termo) {
+      funcionarioService.autocomplete(termo)
+        .then(resultados => { if (!cancelado) setSugestoes(resultados) })
+        .catch(() => {})
+    } else {
+      setSugestoes([])
+    }
+    const timer = setTimeout(() => setBuscaAplicada(busca), 300)
+    return () => {
+      cancelado = true
+      clearTimeout(timer)
+    }
+  }, [busca])
+
   // Recarregar dados quando filtros mudarem
   useEffect(() => {
-    loadAllData()
-  }, [busca, filtros])
+    loadAllData(!cadastrosCarregados.current)
+  }, [buscaAplicada, filtros])
 
   const clearFilters = () => {
     setBusca('')
+    setBuscaAplicada('')
     setFiltros({ departamento_id: '', funcao_id: '', unidade_id: '' })
   }
 
@@ -304,6 +334,7 @@ export function useFuncionarios() {
     unidades,
     busca,
     setBusca,
+    sugestoes,
     filtros,
     setFiltros,
     
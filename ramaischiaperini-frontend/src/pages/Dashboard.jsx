@@ -25,6 +25,7 @@ function Dashboard({ user, onLogout, message, clearMessage, showMessage }) {
     unidades,
     busca,
     setBusca,
+    sugestoes,
     filtros,
     setFiltros,
     clearFilters,
@@ -179,6 +180,7 @@ function Dashboard({ user, onLogout, message, clearMessage, showMessage }) {
           unidades={unidades}
           busca={busca}
           setBusca={setBusca}
+          sugestoes={sugestoes}
           filtros={filtros}
           setFiltros={setFiltros}
           clearFilters={clearFilters}
@@ -85,6 +85,23 @@ export const funcionarioService = {
     return []
   },
 
+  // Sugestões da caixa de busca (trie em memória no backend)
+  async autocomplete(q, limit = 8) {
+    const queryParams = new URLSearchParams({ q, limit })
+    const response = await authenticatedFetch(`${API_BASE}/funcionarios/autocomplete/?${queryParams}`)
+    if (response.ok) {
+      const data = await response.json()
+      return data.resultados || []
+    }
+    return []
+  },
+
+  // Link de exportação (csv ou xlsx) com os mesmos filtros da listagem
+  exportUrl(formato, params = {}) {
+    const queryParams = new URLSearchParams(params)
+    return `${API_BASE}/funcionarios/export.${formato}?${queryParams}`
+  },
+
   async create(data) {
     return await authenticatedFetch(`${API_BASE}/funcionarios/`, {
       method: 'POST',
@@ -103,6 +120,15 @@ export const funcionarioService = {
     return await authenticatedFetch(`${API_BASE}/funcionarios/${id}/`, {
       method: 'DELETE'
     })
+  },
+
+  // Várias criações/atualizações/desativações numa transação: itens sem id
+  // são criados, com id são atualizados ({ id, ativo: false } desativa)
+  async bulk(itens) {
+    return await authenticatedFetch(`${API_BASE}/funcionarios/bulk/`, {
+      method: 'POST',
+      body: JSON.stringify({ itens })
+    })
   }
 }
 
@@ -197,4 +223,18 @@ export const unidadeService = {
       method: 'DELETE'
     })
   }
-}
\ No newline at end of file
+}
+export const diretorioService = {
+  // Funcionários filtrados e cadastros (com contagens) em uma única requisição
+  async bootstrap(params = {}, incluirCadastros = true) {
+    const queryParams = new URLSearchParams(params)
+    if (!incluirCadastros) {
+      queryParams.set('lookups', 'false')
+    }
+    const response = await authenticatedFetch(`${API_BASE}/directory/bootstrap/?${queryParams}`)
+    if (response.ok) {
+      return await response.json()
+    }
+    throw new Error('Erro ao carregar diretório')
+  }
+}